@@ -0,0 +1,214 @@
+from urllib.parse import urlsplit
+import tempfile
+import zipfile
+import asyncio
+import time
+import aiohttp
+from BiomodelsDownloader import BiomodelsDownloader
+import config
+
+
+class HostRateLimiter:
+    """
+    Token bucket per host: at most `rate` requests per second to each host, with bursts of up to `burst` requests
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}  # host -> [tokens, time of last refill]
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, host):
+        """Wait until a request to host is allowed"""
+
+        if not self.rate:
+            return
+
+        while True:
+            async with self.lock:
+                tokens, last = self.buckets.get(host, (self.burst, time.monotonic()))
+                now = time.monotonic()
+                tokens = min(self.burst, tokens + (now - last) * self.rate)
+
+                if tokens >= 1:
+                    self.buckets[host] = (tokens - 1, now)
+                    return
+
+                self.buckets[host] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+
+            await asyncio.sleep(wait)
+
+
+class AsyncBiomodelsDownloader(BiomodelsDownloader):
+    """
+    Downloader running all downloads on a single asyncio event loop instead of a thread pool.
+    At most `concurrency` downloads are in flight at once and requests to each host are rate limited.
+
+    Every response is streamed to a temporary file and the XML entries are extracted from there,
+    so a zip archive is never held in memory. Model lists, verification and download_results
+    are shared with BiomodelsDownloader; only run() is replaced.
+    """
+
+    def __init__(self, concurrency=config.ASYNC_DOWNLOAD_CONCURRENCY, rate_limit=config.DOWNLOAD_RATE_LIMIT, **kwargs):
+        """
+        concurrency (int): Maximum number of downloads in flight at once.
+        rate_limit (float): Maximum requests per second to a host, 0 for no limit.
+        All other arguments are the same as BiomodelsDownloader.
+        """
+        super().__init__(**kwargs)
+        self.concurrency = concurrency
+        self.rate_limit = rate_limit
+        self.retries = kwargs.get("retries", config.DOWNLOAD_RETRIES)
+
+
+    async def fetch_to_file(self, session, limiter, url, file):
+        """
+        Stream the body of a GET request into an open file
+            -- retries connection errors, 429 and 5xx responses with exponential backoff, waiting for Retry-After when sent
+
+        Returns:
+            int: HTTP status code of the last response
+        """
+
+        host = urlsplit(url).netloc
+
+        for attempt in range(self.retries + 1):
+            await limiter.acquire(host)
+            backoff = config.DOWNLOAD_BACKOFF * (2 ** attempt)
+
+            try:
+                async with session.get(url) as response:
+                    if response.status == 429 or response.status >= 500:
+                        retry_after = response.headers.get("Retry-After")
+                        if attempt < self.retries:
+                            await asyncio.sleep(float(retry_after) if retry_after and retry_after.isdigit() else backoff)
+                            continue
+                        return response.status
+
+                    if response.status == 200:
+                        file.seek(0)
+                        file.truncate()
+                        async for chunk in response.content.iter_chunked(config.DOWNLOAD_CHUNK_SIZE):
+                            file.write(chunk)
+
+                    return response.status
+
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(backoff)
+
+
+    def extract_xml(self, file, model_id):
+        """
+        Extract the SBML files of a model from a zip file to the output directory (or model store)
+            -- same checks as a batch download, refer to BiomodelsDownloader.extract_models()
+        """
+
+        with zipfile.ZipFile(file) as zip_file:
+            return self.extract_models(zip_file, [model_id]).get(model_id, [])
+
+
+    async def download_and_extract_async(self, session, limiter, semaphore, model_id):
+        """Async version of BiomodelsDownloader.download_and_extract(), same outcome in download_results"""
+
+        url = f"{self.base_url}?models={model_id}"
+        outcome = {"ok": False, "status": None, "files": [], "error": None}
+        self.download_results[model_id] = outcome
+
+        async with semaphore:
+            with tempfile.TemporaryFile() as file:
+                try:
+                    outcome["status"] = await self.fetch_to_file(session, limiter, url, file)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    outcome["error"] = str(e) or type(e).__name__
+                    return False
+
+                if outcome["status"] != 200:
+                    outcome["error"] = f"Status code: {outcome['status']}"
+                    return False
+
+                try:
+                    # Disk heavy, so kept off the event loop
+                    outcome["files"] = await asyncio.to_thread(self.extract_xml, file, model_id)
+                except zipfile.BadZipFile as e:
+                    outcome["error"] = str(e)
+                    return False
+
+                if not outcome["files"]:
+                    outcome["error"] = "No valid SBML file in the archive"
+                    return False
+
+        outcome["ok"] = True
+        return True
+
+
+    async def download_batch_async(self, session, limiter, semaphore, models):
+        """Async version of BiomodelsDownloader.download_batch(), returns the models to download on their own"""
+
+        if len(models) == 1:
+            await self.download_and_extract_async(session, limiter, semaphore, models[0])
+            return []
+
+        url = f"{self.base_url}?models={','.join(models)}"
+
+        async with semaphore:
+            with tempfile.TemporaryFile() as file:
+                try:
+                    status = await self.fetch_to_file(session, limiter, url, file)
+                    if status != 200:
+                        return models
+                    extracted = await asyncio.to_thread(self.extract_batch_file, file, models)
+                except (aiohttp.ClientError, asyncio.TimeoutError, zipfile.BadZipFile):
+                    return models
+
+        for model, files in extracted.items():
+            self.download_results[model] = {"ok": True, "status": status, "files": files, "error": None}
+
+        return [model for model in models if model not in extracted]
+
+
+    def extract_batch_file(self, file, models):
+        """Split and verify a multi-model zip file on disk"""
+
+        with zipfile.ZipFile(file) as zip_file:
+            return self.extract_models(zip_file, models)
+
+
+    async def run_async(self, models):
+        """
+        Download all models concurrently on the running event loop
+            -- batch_size models per request, models that fail in a batch are downloaded on their own
+        """
+
+        connect_timeout, read_timeout = self.timeout
+        timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        limiter = HostRateLimiter(self.rate_limit, burst=self.concurrency)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            retry = await asyncio.gather(*(self.download_batch_async(session, limiter, semaphore, batch) for batch in self.batches(models)))
+            await asyncio.gather(*(self.download_and_extract_async(session, limiter, semaphore, model) for batch in retry for model in batch))
+
+
+    def run(self):
+        """
+        Same as BiomodelsDownloader.run(), with the asyncio engine
+            -- downloads missing_damaged_models and returns their outcomes
+        """
+
+        downloadable_models = self.missing_damaged_models
+        asyncio.run(self.run_async(downloadable_models))
+
+        return {model: self.download_results[model] for model in downloadable_models}
+
+
+# Usage this is an example of how the async downloader should be called
+
+if __name__ == "__main__":
+
+    downloader = AsyncBiomodelsDownloader(concurrency=20, rate_limit=10)
+    downloader.verifiy_models(50)
@@ -1,8 +1,18 @@
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import xml.etree.ElementTree as ET
 import requests
+import threading
 import zipfile
+import shutil
+import json
+import time
 import io
 import os
+from ModelManifest import ModelManifest
+from ModelStore import ModelStore
+import config
 
 
 class BiomodelsDownloader:
@@ -12,8 +22,15 @@ class BiomodelsDownloader:
     This can be done in parallel depending on the number of threads allocated
     """
 
+    # SERVER ISSUES WITH FEW PROBLAMATIC MODELS - can be removed if resolved
+    # According to docs these models do not contain sbml/xml files 
+    PROBLEMATIC_MODELS = frozenset(["BIOMD0000001069", "BIOMD0000001075", "BIOMD0000001066", "BIOMD0000001067", "BIOMD0000001068", "BIOMD0000001070", 
+                                    "BIOMD0000001071", "BIOMD0000001073", "BIOMD0000001074", "BIOMD0000001076"])
+
     def __init__(self, base_url="https://www.ebi.ac.uk/biomodels/search/download", meta_data_url = "https://www.ebi.ac.uk/biomodels/model/files/{model}?format=json",
-                  threads=10, output_dir="biomodels", curatedOnly=True):
+                  threads=10, output_dir="biomodels", curatedOnly=True, retries=config.DOWNLOAD_RETRIES, timeout=config.DOWNLOAD_TIMEOUT,
+                  batch_size=config.DOWNLOAD_BATCH_SIZE, check_updates=config.CHECK_UPDATED_BIOMODELS,
+                  identifiers_url=config.IDENTIFIERS_URL, identifiers_ttl=config.IDENTIFIERS_TTL, use_store=config.MODEL_STORE):
         """
         Initialize the downloader with the base URL and configuration for downloading.
 
@@ -21,6 +38,13 @@ class BiomodelsDownloader:
         threads (int): The number of threads to use for parallel downloading. Default is 10.
         output_dir (str): The directory where the downloaded models will be stored. Default is "biomodels".
         curatedOnly (bool):Only adds curated models to the database.  
+        retries (int): Number of times a request is retried after a connection error, 429 or 5xx response.
+        timeout (tuple): (connect, read) timeout in seconds of every request.
+        batch_size (int): Number of models requested in one zip file, 1 downloads every model on its own.
+        check_updates (bool): Redownload models whose metadata changed upstream, see ModelManifest.
+        identifiers_url (str): URL listing the identifiers of all models.
+        identifiers_ttl (float): Seconds the cached identifier list is used before it is refreshed in the background.
+        use_store (bool): Keep models in the compressed ModelStore of output_dir instead of loose XML files.
 
         """
         self.base_url = base_url
@@ -28,18 +52,57 @@ class BiomodelsDownloader:
         self.max_workers = threads
         self.output_dir = output_dir
         self.curatedOnly = curatedOnly
+        self.timeout = timeout
+        self.batch_size = max(1, batch_size)
+        self.identifiers_url = identifiers_url
+        self.identifiers_ttl = identifiers_ttl
+        self.identifiers_cache = os.path.join(output_dir, config.IDENTIFIERS_CACHE)
+        self.refresh_thread = None
+        self.refresh_lock = threading.Lock()
         self.curated_models = []
         self.uncurated_models = []
+        self.curated_set = set()
+        self.uncurated_set = set()
         self.missing_damaged_models = [] 
+        self.download_results = {} # model -> outcome of its last download, see download_and_extract()
+        self.session = self.create_session(retries)
+        self.check_updates = check_updates
 
         # Ensure output directory exists
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
 
+        self.store = ModelStore.from_folder(self.output_dir) if use_store else None
+        self.manifest = ModelManifest(self.output_dir, metadata_url=self.metadata_url, threads=self.max_workers, timeout=self.timeout, store=self.store)
+
         
+    def create_session(self, retries):
+        """
+        One HTTP session shared by all downloading threads
+            -- keeps up to one connection per thread alive, so each download does not pay for a new TLS handshake
+            -- retries connection errors, 429 and 5xx responses with exponential backoff, waiting for Retry-After when sent
+        """
+
+        retry = Retry(total=retries,
+                      backoff_factor=config.DOWNLOAD_BACKOFF,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      respect_retry_after_header=True,
+                      raise_on_status=False)
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers, max_retries=retry)
+
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        return session
+
+
     def download_and_extract(self, model_id):
         """
         Download the zip file for a given model ID and extract the XML file.
+        The outcome is stored in download_results[model_id] as a dict:
+            ok (bool), status (HTTP status code or None), files (extracted files), error (str or None)
 
         Args:
             model_id (str): The ID of the model to download.
@@ -49,35 +112,160 @@ class BiomodelsDownloader:
         """
         
         url = f"{self.base_url}?models={model_id}"
-        response = requests.get(url)
-        
-        # OK response - File downloaded
-        if response.status_code == 200:
-            
+        outcome = {"ok": False, "status": None, "files": [], "error": None}
+        self.download_results[model_id] = outcome
+
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        except requests.RequestException as e:
+            outcome["error"] = str(e)
+            return False
+
+        outcome["status"] = response.status_code
+
+        # Non OK response - Error downloading file (after retries)
+        if response.status_code != 200:
+            outcome["error"] = f"Status code: {response.status_code}"
+            return False
+
+        try:
             zip_file = zipfile.ZipFile(io.BytesIO(response.content))
+        except zipfile.BadZipFile as e:
+            outcome["error"] = str(e)
+            return False
+
+        # Extract xml from downloaded zip file 
+        for file_info in zip_file.infolist():
             
-            # Extract xml from downloaded zip file 
-            for file_info in zip_file.infolist():
-                
-                if file_info.filename.endswith('.xml'):
-                    xml_content = zip_file.read(file_info.filename)
-                    output_path = os.path.join(self.output_dir, file_info.filename)
-
-                    with open(output_path, 'wb') as xml_file:
-                        xml_file.write(xml_content)
-                    print(f"Extracted {file_info.filename} to {self.output_dir}")
-
-            return True
-        
-        # Non OK response - Error downloading file
+            if file_info.filename.endswith('.xml'):
+                xml_content = zip_file.read(file_info.filename)
+                self.save_xml(file_info.filename, xml_content)
+                outcome["files"].append(file_info.filename)
+
+        outcome["ok"] = True
+        return True
+
+
+    def save_xml(self, filename, data):
+        """Keep a downloaded XML file, in the model store (under its name without .xml) or in output_dir"""
+
+        if self.store is not None:
+            self.store.put(os.path.basename(filename)[:-4], data)
+            return
+
+        with open(os.path.join(self.output_dir, filename), 'wb') as xml_file:
+            xml_file.write(data)
+
+
+    def keep_file(self, part_path, filename):
+        """Keep an extracted (and verified) file, moving it into the model store or to its final path"""
+
+        if self.store is not None:
+            self.store.put_file(os.path.basename(filename)[:-4], part_path)
+            os.remove(part_path)
         else:
-            print(f"Failed to download {model_id}. Status code: {response.status_code}")
+            os.replace(part_path, os.path.join(self.output_dir, filename))
+
+
+    @staticmethod
+    def is_sbml(path):
+        """True if the file is well formed XML with an sbml root element, parsed incrementally (truncated files fail)"""
+
+        root = None
+        try:
+            with open(path, 'rb') as xml_file:
+                for event, element in ET.iterparse(xml_file, events=("start", "end")):
+                    if root is None:
+                        root = element.tag.rsplit("}", 1)[-1]
+                    elif event == "end":
+                        element.clear()
+        except ET.ParseError:
             return False
 
+        return root == "sbml"
+
+
+    def extract_models(self, zip_file, models):
+        """
+        Split the XML files of a multi-model zip file by model and verify them
+            -- a file belongs to the model its name starts with
+            -- files are written next to their final path and only moved there once they are valid SBML
+
+        Returns:
+            dict: model -> extracted files, for every model with at least one valid file
+        """
+
+        extracted = {}
+
+        for file_info in zip_file.infolist():
+            filename = os.path.basename(file_info.filename)
+            if not filename.endswith('.xml'):
+                continue
+
+            owners = [model for model in models if filename.startswith(model)]
+            if not owners:
+                continue
+            model = max(owners, key=len) # BIOMD..1 must not claim the files of BIOMD..10
+
+            output_path = os.path.join(self.output_dir, filename)
+            with zip_file.open(file_info) as source, open(output_path + ".part", 'wb') as xml_file:
+                shutil.copyfileobj(source, xml_file)
+
+            if self.is_sbml(output_path + ".part"):
+                self.keep_file(output_path + ".part", filename)
+                extracted.setdefault(model, []).append(filename)
+            else:
+                os.remove(output_path + ".part")
+
+        return extracted
+
+
+    def download_batch(self, models):
+        """
+        Download several models in one request (search/download?models=a,b,c) and extract them.
+        Every model found in the zip file gets an outcome in download_results.
+
+        Returns:
+            list: models that were not in the zip file, or whose files were invalid, to be downloaded on their own
+        """
+
+        if len(models) == 1:
+            self.download_and_extract(models[0])
+            return []
+
+        url = f"{self.base_url}?models={','.join(models)}"
+
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            if response.status_code != 200:
+                return models
+            zip_file = zipfile.ZipFile(io.BytesIO(response.content))
+        except (requests.RequestException, zipfile.BadZipFile):
+            return models
+
+        with zip_file:
+            extracted = self.extract_models(zip_file, models)
+
+        for model, files in extracted.items():
+            self.download_results[model] = {"ok": True, "status": response.status_code, "files": files, "error": None}
+
+        return [model for model in models if model not in extracted]
+
+
+    def batches(self, models):
+        """Split a list of models into lists of at most batch_size models"""
+        return [models[i:i + self.batch_size] for i in range(0, len(models), self.batch_size)]
+
+
+    def failed_downloads(self):
+        """Returns {model: outcome} of every model whose last download failed"""
+        return {model: outcome for model, outcome in self.download_results.items() if not outcome["ok"]}
+
 
     def run(self):
         """
         Start the download and extraction process for all models in parallel.
+        Models are requested batch_size at a time, models that fail in a batch are downloaded on their own.
         Based on parameter data - a select number of models will be downloaded
         download_missing_models=False : all missing models will be downloaded
         """
@@ -93,11 +281,21 @@ class BiomodelsDownloader:
 
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
 
+            futures = [executor.submit(self.download_batch, batch) 
+                       for batch in self.batches(downloadable_models)]
+            
+            # Models missing from a batch (or from a failed batch) are retried on their own
+            retry = []
+            for future in as_completed(futures):
+                retry += future.result()  # Re-raise any Unsuccesful Download that was caught during execution
+
             futures = [executor.submit(self.download_and_extract, model) 
-                       for model in downloadable_models]
+                       for model in retry]
             
             for future in as_completed(futures):
-                future.result()  # Re-raise any Unsuccesful Download that was caught during execution
+                future.result()
+
+        return {model: self.download_results[model] for model in downloadable_models}
     
 
     def verifiy_models(self, MODEL_LIMIT=-1): 
@@ -108,76 +306,161 @@ class BiomodelsDownloader:
 
         returns: list of new/updated models -> to be added/readded to database (manage collsions)
         """
+
+        self.find_missing_models(MODEL_LIMIT)
+
+        # redownload missing models in parallel
+        self.run()
+        self.record_downloads(self.missing_damaged_models)
+
+        failed = self.failed_downloads()
+        if failed:
+            print(f"[{len(failed)}/{len(self.missing_damaged_models)}] - downloads failed, see download_results")
+
+        # returns new/updated models
+        return self.missing_damaged_models
+
+
+    def find_missing_models(self, MODEL_LIMIT=-1):
+        """
+        The verify stage of verifiy_models() without downloading
+
+        returns: list of missing/damaged/updated models, also stored in missing_damaged_models
+        """
         
         # update current models
         self.check_available_models()
         
         self.missing_damaged_models = []
-        path = self.output_dir
 
-        # Check if models exists
+        # Check if models exists and are undamaged (one stat per unchanged file)
         counter = 0
+        present_models = []
         for model in self.curated_models:
             
             counter += 1
             if (MODEL_LIMIT != -1) and (counter > MODEL_LIMIT):break
 
-            model_file = f"{path}/{model}.xml"
-            if not os.path.isfile(model_file):
+            if self.manifest.is_damaged(model):
                 self.missing_damaged_models.append(model)
-
             else:
-                pass
-                """ Check that the model is latest version according to biomodels api 
-                    This is done by checking file size on machine vs api file size
-                    Model will be redownloaded if not latest version
-                    Slows down the verify stage a bit
-                """
-                """  
-                self.metadata_url = f"https://www.ebi.ac.uk/biomodels/model/files/{model}?format=json"
-                response = requests.get(self.metadata_url).json()
-                url_file_size = response["main"][0]["fileSize"]
-                os_file_size = str(os.path.getsize(model_file))
-                
-                if url_file_size != os_file_size:
-                    self.missing_damaged_models.append(model)
-                    print(f"{model} version not up to date")
-                """  
-        
+                present_models.append(model)
+
+        # Check that present models are the latest version according to the biomodels api
+        # Conditional metadata requests in parallel - only models changed upstream are redownloaded
+        if self.check_updates and present_models:
+            updated_models = self.manifest.refresh(self.session, present_models)
+            for model in updated_models:
+                print(f"{model} version not up to date")
+            self.missing_damaged_models += updated_models
+
         if MODEL_LIMIT == -1:
             print(f"[{len(self.missing_damaged_models)}/{len(self.curated_models)}] - models damaged or lost")
         else:
             print(f"[{len(self.missing_damaged_models)}/{MODEL_LIMIT}] - model damaged or lost")
-        # redownload missing models in parallel
-        self.run()
 
-        # returns new/updated models
         return self.missing_damaged_models
 
+
+    def record_downloads(self, models):
+        """Add the successfully downloaded models to the manifest and save it"""
+
+        for model in models:
+            if self.download_results.get(model, {}).get("ok") and self.manifest.has_model(model):
+                self.manifest.record_download(model)
+        self.manifest.save()
+
+    def fetch_identifiers(self):
+        """
+        Queries the restful biomodels api for the identifiers of all models and caches them on disk
+
+        Returns:
+            list: all model identifiers
+        """
+
+        model_names = self.session.get(self.identifiers_url, timeout=self.timeout).json()["models"]
+
+        with open(self.identifiers_cache + ".part", "w") as cache:
+            json.dump({"fetched": time.time(), "models": model_names}, cache)
+        os.replace(self.identifiers_cache + ".part", self.identifiers_cache)
+
+        return model_names
+
+
+    def load_identifiers(self):
+        """
+        Identifiers from the on disk cache
+
+        Returns:
+            (list, float): model identifiers and the time they were fetched, (None, 0) without a readable cache
+        """
+
+        try:
+            with open(self.identifiers_cache) as cache:
+                cached = json.load(cache)
+            return cached["models"], cached["fetched"]
+        except (OSError, ValueError, KeyError):
+            return None, 0
+
+
+    def set_available_models(self, model_names):
+        """
+        Split identifiers into curated and uncurated models - removes problematic models
+            -- all curated models are prefixed with BIOMD, all non-curated models with MODEL
+            -- lists keep the api order (used by MODEL_LIMIT), sets are used for membership
+        """
+
+        curated_models = [model for model in model_names if model.startswith("BIOMD") and model not in self.PROBLEMATIC_MODELS]
+        uncurated_models = [model for model in model_names if model.startswith("MODEL")]
+
+        # Assigned last, so a background refresh never exposes a half built list
+        self.curated_set, self.uncurated_set = set(curated_models), set(uncurated_models)
+        self.curated_models, self.uncurated_models = curated_models, uncurated_models
+
+
+    def refresh_available_models(self):
+        """Fetch the identifiers in the background, the cached models stay in use until the new list arrives"""
+
+        def refresh():
+            try:
+                self.set_available_models(self.fetch_identifiers())
+            except (requests.RequestException, ValueError, KeyError, OSError) as e:
+                print(f"Model identifiers could not be refreshed: {e}")
+
+        with self.refresh_lock:
+            if self.refresh_thread is None or not self.refresh_thread.is_alive():
+                self.refresh_thread = threading.Thread(target=refresh, name="identifiers-refresh", daemon=True)
+                self.refresh_thread.start()
+
+        return self.refresh_thread
+
+
     def check_available_models(self):
         """
-        Queries the restful biomodels api and returns a list of all curated and non curated models - removes problematic models 
+        Sets the lists of all curated and non curated models - removes problematic models
+            -- the identifiers are read from the on disk cache, so startup does not wait for (or need) the network
+            -- a cache older than identifiers_ttl is refreshed in the background
+            -- the api is only queried in the foreground when there is no cache yet
         """
 
-        url = "https://www.ebi.ac.uk/biomodels/model/identifiers?format=json"
-        response = requests.get(url).json()
+        model_names, fetched = self.load_identifiers()
 
-        # Extract list of avaialble models from json 
-        model_names = response["models"]
+        if model_names is None:
+            self.set_available_models(self.fetch_identifiers())
+            return
 
-        # Split models into curated and uncurated using list comprehensions 
-        # All curated models are prefixed with BIOMD
-        # All non-curated models are prefixed with MODEL
-        self.curated_models = [model for model in model_names if model.startswith("BIOMD")]
-        self.uncurated_models = [model for model in model_names if model.startswith("MODEL")]
+        # The cached list is set before the refresh starts, so it can never replace the refreshed list
+        self.set_available_models(model_names)
+        if time.time() - fetched > self.identifiers_ttl:
+            self.refresh_available_models()
 
-        # SERVER ISSUES WITH FEW PROBLAMATIC MODELS - can be removed if resolved
-        # According to docs these models do not contain sbml/xml files 
-        curated_problematic_models = ["BIOMD0000001069", "BIOMD0000001075", "BIOMD0000001066", "BIOMD0000001067", "BIOMD0000001068", "BIOMD0000001070", 
-                              "BIOMD0000001071", "BIOMD0000001073", "BIOMD0000001074", "BIOMD0000001076"]
-        
-        for p in curated_problematic_models:
-            self.curated_models.remove(p)
+
+    def is_curated(self, model):
+        return model in self.curated_set
+
+
+    def is_available(self, model):
+        return model in self.curated_set or model in self.uncurated_set
 
 
 # Usage this is an example of how the downloader should be called
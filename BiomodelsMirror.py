@@ -0,0 +1,245 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from collections import Counter
+import threading
+import zipfile
+import hashlib
+import random
+import json
+import time
+import io
+import os
+import config
+
+"""Local stand-in for the BioModels REST API, serves fixture XML files so downloads can be benchmarked without ebi.ac.uk"""
+
+class BiomodelsMirror():
+    """
+    HTTP server emulating the endpoints used by BiomodelsDownloader:
+        /biomodels/search/download?models=a,b,c   zip file with the XML of every known model
+        /biomodels/model/identifiers?format=json   {"models": [...]}
+        /biomodels/model/files/{model}?format=json  {"main": [{"name", "fileSize", "checksum"}]}, with ETag / 304 support
+
+    Models are the XML files of a fixture folder. replicate adds that many extra models
+    (copies of the fixtures under generated ids) to benchmark with a larger corpus.
+
+    Faults can be injected for every request:
+        latency: seconds added before answering, jitter: up to this many extra seconds
+        error_rate: fraction of requests answered with 503
+        throttle: requests per second served, the rest are answered with 429 and Retry-After
+
+    Methods:
+    ------------
+
+    start(), stop():
+        Serve on a background thread (also used as a context manager).
+
+    base_url, metadata_url, identifiers_url:
+        URLs to pass to BiomodelsDownloader.
+
+    statistics():
+        Requests served per endpoint, errors and throttled requests.
+    """
+
+    def __init__(self, fixtures=config.BIOMODELS_DATABASE_FOLDER, host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, throttle=0, replicate=0, seed=None):
+        """
+        fixtures (str): folder of XML files served as models, named {model}.xml
+        port (int): 0 picks a free port
+        seed (int): seed of the error injection, for reproducible runs
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle = throttle
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.window = (0, 0)  # (second, requests served in it)
+        self.server = None
+        self.thread = None
+
+        self.models = {}  # model -> XML bytes
+        for filename in sorted(os.listdir(fixtures)):
+            if filename.endswith(".xml"):
+                with open(os.path.join(fixtures, filename), "rb") as xml_file:
+                    self.models[filename[:-4]] = xml_file.read()
+
+        fixture_data = list(self.models.values())
+        for i in range(replicate):
+            self.models[f"BIOMD9{i:09d}"] = fixture_data[i % len(fixture_data)]
+
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/biomodels"
+
+    @property
+    def base_url(self):
+        return f"{self.url}/search/download"
+
+    @property
+    def metadata_url(self):
+        return f"{self.url}/model/files/{{model}}?format=json"
+
+    @property
+    def identifiers_url(self):
+        return f"{self.url}/model/identifiers?format=json"
+
+
+    def start(self):
+        """Start serving on a background thread, returns the mirror"""
+
+        mirror = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+
+            def do_GET(self):
+                mirror.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="biomodels-mirror", daemon=True)
+        self.thread.start()
+
+        return self
+
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+    def statistics(self):
+        with self.lock:
+            return dict(self.counts)
+
+
+    def is_throttled(self):
+        """True if the request is over the requests per second limit"""
+
+        if not self.throttle:
+            return False
+
+        with self.lock:
+            second = int(time.monotonic())
+            window_second, served = self.window
+            served = served + 1 if window_second == second else 1
+            self.window = (second, served)
+
+        return served > self.throttle
+
+
+    def handle(self, request):
+        """Answer one request, after the injected latency and faults"""
+
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self.random.uniform(0, self.jitter))
+
+        if self.is_throttled():
+            self.count("throttled")
+            return self.send(request, 429, b"", headers={"Retry-After": "1"})
+
+        with self.lock:
+            failed = self.random.random() < self.error_rate
+        if failed:
+            self.count("errors")
+            return self.send(request, 503, b"")
+
+        url = urlsplit(request.path)
+        query = parse_qs(url.query)
+
+        if url.path.endswith("/search/download"):
+            self.count("download")
+            return self.download(request, query.get("models", [""])[0].split(","))
+
+        if url.path.endswith("/model/identifiers"):
+            self.count("identifiers")
+            return self.send_json(request, {"models": list(self.models)})
+
+        if "/model/files/" in url.path:
+            self.count("files")
+            return self.files(request, url.path.rsplit("/", 1)[-1])
+
+        self.count("not_found")
+        self.send(request, 404, b"")
+
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+
+    def download(self, request, models):
+        """Zip file of all requested models that exist, 404 if none does"""
+
+        found = [model for model in models if model in self.models]
+        if not found:
+            return self.send(request, 404, b"")
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            for model in found:
+                zip_file.writestr(f"{model}.xml", self.models[model])
+
+        self.send(request, 200, buffer.getvalue(), content_type="application/zip")
+
+
+    def files(self, request, model):
+        """Metadata of a model, 304 when the client already has the current version"""
+
+        if model not in self.models:
+            return self.send(request, 404, b"")
+
+        data = self.models[model]
+        etag = f'"{hashlib.sha1(data).hexdigest()}"'
+
+        if request.headers.get("If-None-Match") == etag:
+            return self.send(request, 304, b"", headers={"ETag": etag})
+
+        main = {"name": f"{model}.xml", "fileSize": str(len(data)), "checksum": hashlib.sha256(data).hexdigest()}
+        self.send_json(request, {"main": [main], "additional": []}, headers={"ETag": etag})
+
+
+    def send_json(self, request, value, headers=None):
+        self.send(request, 200, json.dumps(value).encode(), content_type="application/json", headers=headers)
+
+
+    def send(self, request, status, body, content_type="text/plain", headers=None):
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(body)
+
+
+# Usage this is an example of how the mirror should be used
+
+if __name__ == "__main__":
+
+    from BiomodelsDownloader import BiomodelsDownloader
+    import tempfile
+
+    with BiomodelsMirror(latency=0.05, error_rate=0.05, replicate=100) as mirror:
+        downloader = BiomodelsDownloader(base_url=mirror.base_url, meta_data_url=mirror.metadata_url, identifiers_url=mirror.identifiers_url,
+                                         output_dir=tempfile.mkdtemp())
+        downloader.verifiy_models()
+        print(mirror.statistics())
@@ -0,0 +1,196 @@
+from neo4jsbml import connect
+from py2neo import Graph
+import neo4j
+from QueryProfiler import query_profiler
+import configparser
+import threading
+import time
+import config
+
+"""Shared Neo4j connections for SbmlDatabase, SbmlDatabaseQueries and GraphVisualizer"""
+
+class Neo4jConnectionPool():
+    """
+    One pool per configuration (.ini) file, shared by every component of the application.
+    The configuration file is only parsed once, and the neo4jsbml connection and py2neo graph
+    are created on first use and then reused, so opening a visualization or creating a
+    database does not pay for a new TCP/Bolt handshake.
+
+    Connections that have been idle for longer than the liveness check interval are pinged
+    before being handed out and are recreated if the server no longer answers.
+
+    The pool can be tuned in the [pool] section of the configuration file:
+        max_size: maximum number of connections kept open by the py2neo graph
+        max_age: seconds after which a connection is closed and replaced
+        liveness_check: seconds a connection may be idle before it is pinged
+
+    Reads can be routed to a cluster's followers through the uri in the [routing] section,
+    which defaults to neo4j:// on the url and port of the [connection] section.
+
+    Methods:
+    ------------
+
+    from_config(config_file):
+        Returns the shared pool of a configuration file.
+
+    connection():
+        Shared neo4jsbml connection, used for imports and queries.
+
+    graph():
+        Shared py2neo graph, used for visualization.
+
+    driver():
+        Shared routing neo4j driver, used for concurrent reads.
+
+    close():
+        Close all connections of the pool.
+    """
+
+    pools = {}  # config_file -> Neo4jConnectionPool
+    pools_lock = threading.Lock()
+
+    def __init__(self, config_file):
+        """Parse the configuration file, connections are opened lazily"""
+
+        parser = configparser.ConfigParser()
+        parser.read(config_file)
+
+        self.config_file = config_file
+        self.uri = f"{parser.get('connection', 'protocol')}://{parser.get('connection', 'url')}:{parser.get('connection', 'port')}"
+        self.auth = (parser.get('database', 'user'), parser.get('database', 'password'))
+        self.database = parser.get('database', 'name', fallback='neo4j')
+
+        self.max_size = parser.getint('pool', 'max_size', fallback=config.CONNECTION_POOL_SIZE)
+        self.max_age = parser.getint('pool', 'max_age', fallback=config.CONNECTION_MAX_AGE)
+        self.liveness_check = parser.getint('pool', 'liveness_check', fallback=config.CONNECTION_LIVENESS_CHECK)
+
+        self.routing_uri = parser.get('routing', 'uri', fallback=f"neo4j://{parser.get('connection', 'url')}:{parser.get('connection', 'port')}")
+
+        self.lock = threading.Lock()
+        self._connection = None
+        self._graph = None
+        self._driver = None
+        self.last_used = {}  # "connection" / "graph" -> time of last use
+        self.shared_connection = query_profiler.wrap_connection(PooledConnection(self))
+
+
+    @classmethod
+    def from_config(cls, config_file=config.CONFIGURATION_FILE):
+        """Returns the pool of a configuration file, creating it the first time it is requested"""
+
+        with cls.pools_lock:
+            if config_file not in cls.pools:
+                cls.pools[config_file] = cls(config_file)
+
+            return cls.pools[config_file]
+
+
+    def is_stale(self, name):
+        """True if a connection has been idle long enough that it should be checked before use"""
+        return time.monotonic() - self.last_used.get(name, 0) > self.liveness_check
+
+
+    def connection(self):
+        """
+        Shared neo4jsbml connection (wrapped by the query profiler)
+            -- every use goes through the pool, so holders never keep a dead connection
+        """
+        return self.shared_connection
+
+
+    def live_connection(self):
+        """
+        The current neo4jsbml connection
+            -- recreated if it fails a liveness check after being idle
+        """
+
+        with self.lock:
+            if self._connection is not None and self.is_stale("connection"):
+                try:
+                    self._connection.query("RETURN 1", expect_data=True)
+                except Exception:
+                    print("Neo4j connection lost, reconnecting")
+                    self._connection = None
+
+            if self._connection is None:
+                self._connection = connect.Connect.from_config(path=self.config_file)
+
+            self.last_used["connection"] = time.monotonic()
+            return self._connection
+
+
+    def graph(self):
+        """
+        Shared py2neo graph, py2neo keeps up to max_size Bolt connections open and reuses them
+            -- recreated if it fails a liveness check after being idle
+        """
+
+        with self.lock:
+            if self._graph is not None and self.is_stale("graph"):
+                try:
+                    self._graph.run("RETURN 1").evaluate()
+                except Exception:
+                    print("Neo4j graph connection lost, reconnecting")
+                    self._graph = None
+
+            if self._graph is None:
+                self._graph = Graph(self.uri, auth=self.auth, name=self.database, max_size=self.max_size, max_age=self.max_age)
+
+            self.last_used["graph"] = time.monotonic()
+            return self._graph
+
+
+    def driver(self):
+        """
+        Shared neo4j driver on the routing uri, thread safe and used by ReadQueryExecutor
+            -- the driver keeps its own pool of max_size connections per server
+            -- connections idle for longer than liveness_check are checked by the driver before use
+        """
+
+        with self.lock:
+            if self._driver is None:
+                self._driver = neo4j.GraphDatabase.driver(self.routing_uri, auth=self.auth,
+                                                          max_connection_pool_size=self.max_size,
+                                                          max_connection_lifetime=self.max_age,
+                                                          liveness_check_timeout=self.liveness_check)
+
+            return self._driver
+
+
+    def close(self):
+        """Close all connections, the next request opens new ones"""
+
+        with self.lock:
+            if self._graph is not None:
+                self._graph.service.connector.close()
+
+            if self._driver is not None:
+                self._driver.close()
+
+            self._connection = None
+            self._graph = None
+            self._driver = None
+
+
+class PooledConnection():
+    """Stand-in for a neo4jsbml connection that always forwards to the pool's live connection"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def query(self, value, expect_data=True, parameters=None):
+        """
+        Same as the neo4jsbml connection query
+            -- neo4jsbml does not take query parameters, queries with parameters are run on the pool's driver
+        """
+
+        if parameters is None:
+            return self.pool.live_connection().query(value, expect_data=expect_data)
+
+        with self.pool.driver().session(database=self.pool.database) as session:
+            records = [record.data() for record in session.run(value, parameters)]
+
+        return records if expect_data else None
+
+    def __getattr__(self, name):
+        return getattr(self.pool.live_connection(), name)
@@ -0,0 +1,150 @@
+import numpy as np
+import networkx as nx
+import config
+
+"""Layout and level of detail for graphs too large for nx.spring_layout and full matplotlib labelling"""
+
+def balanced_cells(positions, cells_per_side):
+    """
+    Assign nodes to a grid of cells_per_side x cells_per_side cells holding about the same number of nodes:
+    nodes are split into vertical slices by x, then every slice into cells by y
+
+    Return:
+        numpy array of the cell of every node
+    """
+
+    n = len(positions)
+    by_x = np.argsort(positions[:, 0], kind="stable")
+    slices = np.empty(n, dtype=np.int64)
+    slices[by_x] = np.arange(n) * cells_per_side // n
+
+    by_slice_y = np.lexsort((positions[:, 1], slices))
+    sorted_slices = slices[by_slice_y]
+    starts = np.searchsorted(sorted_slices, sorted_slices, side="left")
+    ends = np.searchsorted(sorted_slices, sorted_slices, side="right")
+    rows = np.empty(n, dtype=np.int64)
+    rows[by_slice_y] = (np.arange(n) - starts) * cells_per_side // (ends - starts)
+
+    return slices * cells_per_side + rows
+
+
+def squared_distances(a, b):
+    """Matrix of squared distances between the points of a and b, never 0"""
+    dx = a[:, 0, None] - b[None, :, 0]
+    dy = a[:, 1, None] - b[None, :, 1]
+    return np.maximum(dx * dx + dy * dy, 1e-9)
+
+
+def force_layout(G, pos=None, iterations=config.LARGE_LAYOUT_ITERATIONS, seed=42, chunk=4096):
+    """
+    Fruchterman-Reingold force directed layout, vectorised with NumPy
+        -- attraction along every edge is exact
+        -- repulsion is exact between nodes sharing a grid cell, every other cell acts on a node
+           as a single body at its centre of mass (a one level Barnes-Hut approximation)
+        -- cells hold about sqrt(nodes) nodes each, so an iteration costs O(nodes ^ 1.5) instead of O(nodes ^ 2)
+
+    G: NetworkX graph, directions and parallel edges are ignored
+    pos: optional {node: (x, y)} starting positions, other nodes start at random positions
+    chunk: nodes handled at once in the far field, bounds memory use
+
+    Return:
+        dict -> {node: numpy array (x, y)}, scaled to [-1, 1] like nx.spring_layout
+    """
+
+    nodes = list(G.nodes())
+    n = len(nodes)
+    if n == 0:
+        return {}
+    if n == 1:
+        return {nodes[0]: np.zeros(2)}
+
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = np.array([(index[u], index[v]) for u, v in G.edges() if u != v], dtype=np.int64).reshape(-1, 2)
+
+    rng = np.random.default_rng(seed)
+    positions = rng.random((n, 2))
+    if pos:
+        seeded = [index[node] for node in pos if node in index]
+        positions[seeded] = [pos[nodes[i]] for i in seeded]
+        # Seeded positions may use another scale, bring them to the unit square of the random ones
+        positions -= positions.min(axis=0)
+        positions /= max(positions.max(), 1e-9)
+
+    k = np.sqrt(1.0 / n)  # Optimal distance between nodes
+    cells_per_side = max(1, int(round(n ** 0.25)))
+    temperature = 0.1
+    cooling = temperature / (iterations + 1)
+
+    for _ in range(iterations):
+        displacement = np.zeros((n, 2))
+
+        cells = balanced_cells(positions, cells_per_side)
+        order = np.argsort(cells, kind="stable")
+        used, starts, counts = np.unique(cells[order], return_index=True, return_counts=True)
+        own_cell = np.searchsorted(used, cells)
+
+        # Far field: every node against the centre of mass of every other cell
+        mass = counts.astype(float)
+        centres = np.add.reduceat(positions[order], starts, axis=0) / mass[:, None]
+        for first in range(0, n, chunk):
+            block = slice(first, min(first + chunk, n))
+            force = (k * k) * mass[None, :] / squared_distances(positions[block], centres)
+            force[np.arange(block.stop - block.start), own_cell[block]] = 0.0
+            # sum_j force_ij * (p_i - c_j), as two matrix products
+            displacement[block] += positions[block] * force.sum(axis=1)[:, None] - force @ centres
+
+        # Near field: exact repulsion between the nodes of each cell
+        for start, count in zip(starts, counts):
+            if count < 2:
+                continue
+            members = order[start:start + count]
+            member_positions = positions[members]
+            force = (k * k) / squared_distances(member_positions, member_positions)
+            np.fill_diagonal(force, 0.0)
+            displacement[members] += member_positions * force.sum(axis=1)[:, None] - force @ member_positions
+
+        # Attraction along edges
+        if len(edges):
+            delta = positions[edges[:, 0]] - positions[edges[:, 1]]
+            distance = np.maximum(np.sqrt((delta ** 2).sum(axis=1)), 1e-9)
+            pull = delta * (distance / k)[:, None]
+            np.add.at(displacement, edges[:, 0], -pull)
+            np.add.at(displacement, edges[:, 1], pull)
+
+        # Move every node at most temperature
+        length = np.maximum(np.sqrt((displacement ** 2).sum(axis=1)), 1e-9)
+        positions += displacement * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+
+    positions = nx.rescale_layout(positions)
+    return dict(zip(nodes, positions))
+
+
+def collapse_leaves(G, labels=config.LOD_COLLAPSED_LABELS):
+    """
+    Level of detail: remove the nodes of the given labels (units and local parameters by default),
+    counting them on the nodes they were attached to
+
+    Return:
+        new graph, every remaining node has a "collapsed" attribute with the number of nodes folded into it
+    """
+
+    labels = set(labels)
+    collapsed_nodes = {node for node, label in G.nodes(data="label") if label in labels}
+
+    reduced = G.copy()
+    reduced.remove_nodes_from(collapsed_nodes)
+    nx.set_node_attributes(reduced, 0, "collapsed")
+
+    # Each collapsed node is counted once, on the first kept node found by walking away from it
+    for node in collapsed_nodes:
+        seen, frontier = {node}, [node]
+        while frontier:
+            neighbour = next((other for current in frontier for other in nx.all_neighbors(G, current) if other not in seen and other not in collapsed_nodes), None)
+            if neighbour is not None:
+                reduced.nodes[neighbour]["collapsed"] += 1
+                break
+            frontier = [other for current in frontier for other in nx.all_neighbors(G, current) if other not in seen]
+            seen.update(frontier)
+
+    return reduced
@@ -0,0 +1,186 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import matplotlib
+import os
+import config
+from ModelStore import ModelStore
+
+"""Background rendering of model graphs to PNG / SVG, on worker processes so the GUI never waits for matplotlib"""
+
+def init_worker():
+    # Workers have no display, draw with the image only backend
+    matplotlib.use("Agg")
+
+
+def render_model(model_id, output, format, dpi, config_file):
+    """Runs in a worker process: draw one model with GraphVisualizer.render()"""
+
+    from visualize import GraphVisualizer
+    return GraphVisualizer().render(model_id, output=output, format=format, dpi=dpi, config_file=config_file)
+
+
+def render_diff(model_id1, model_id2, format, dpi, config_file):
+    """Runs in a worker process: diff two models with GraphVisualizer.render_diff()"""
+
+    from visualize import GraphVisualizer
+    return GraphVisualizer().render_diff(model_id1, model_id2, format=format, dpi=dpi, config_file=config_file)
+
+
+def export_model(model_id, output, config_file):
+    """Runs in a worker process: write one model as interactive HTML with GraphVisualizer.export_html()"""
+
+    from visualize import GraphVisualizer
+    return GraphVisualizer().export_html(model_id, output=output, config_file=config_file)
+
+
+class GraphRenderer():
+    """
+    Renders model graphs on a pool of worker processes. Querying, laying out and drawing a graph
+    happen in the worker, so the caller is never blocked and several models render in parallel.
+    Workers keep their database connection and share the on disk layout cache.
+
+    Workers are started with "spawn", forking a process that runs Qt is not safe.
+
+    Methods:
+    ------------
+
+    submit(model_id, output=None, format="png"):
+        Start rendering a model, returns a Future of the output path or image bytes.
+
+    render_diff(model_id1, model_id2):
+        Start rendering the diff of two models, returns a Future of (diff, image bytes).
+
+    export_html(model_id, folder):
+        Start writing a model as interactive HTML, returns a Future of the file path.
+
+    render_thumbnails(models, folder):
+        Render thumbnails of many models in parallel, returns {model: path}.
+
+    close():
+        Stop the worker processes.
+    """
+
+    def __init__(self, workers=config.RENDER_WORKERS, config_file=config.CONFIGURATION_FILE):
+        """
+        workers (int): processes rendering at once
+        config_file (str): configuration (.ini) file of the database the models are read from
+        """
+        self.workers = workers
+        self.config_file = config_file
+        self.executor = None
+
+
+    def pool(self):
+        # Worker processes are only started when the first graph is rendered
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                initializer=init_worker)
+        return self.executor
+
+
+    def submit(self, model_id, output=None, format="png", dpi=100):
+        """
+        Render a model in the background
+
+        output: path of the image file, None to get the image as bytes
+        format: "png" or "svg"
+
+        Return:
+            concurrent.futures.Future -> output path or image bytes
+        """
+
+        return self.pool().submit(render_model, model_id, output, format, dpi, self.config_file)
+
+
+    def render_diff(self, model_id1, model_id2, format="png", dpi=100):
+        """
+        Diff two models in the background, refer to GraphVisualizer.diff()
+
+        Return:
+            concurrent.futures.Future -> (dict diff, image bytes)
+        """
+
+        return self.pool().submit(render_diff, model_id1, model_id2, format, dpi, self.config_file)
+
+
+    def export_html(self, model_id, folder=config.HTML_EXPORT_FOLDER):
+        """
+        Write a model as a self-contained interactive HTML file in the background, refer to HtmlExport.py
+
+        Return:
+            concurrent.futures.Future -> path of the HTML file
+        """
+
+        os.makedirs(folder, exist_ok=True)
+        return self.pool().submit(export_model, model_id, os.path.abspath(os.path.join(folder, f"{model_id}.html")), self.config_file)
+
+
+    def thumbnail_path(self, folder, model_id, format="png"):
+        return os.path.join(folder, f"{model_id}.{format}")
+
+
+    def render_thumbnails(self, models, folder=config.THUMBNAIL_FOLDER, width=config.THUMBNAIL_WIDTH, format="png", skip_existing=True, progress=None):
+        """
+        Batch mode: render a thumbnail of every model, all workers in parallel
+
+        width: thumbnail width in pixels
+        skip_existing: keep thumbnails that were already rendered
+        progress: optional callable, called with (rendered, total) after every model
+
+        Returns:
+            dict -> {model: thumbnail path} of the rendered models, failed models are printed and left out
+        """
+
+        os.makedirs(folder, exist_ok=True)
+        dpi = width / 15  # GraphVisualizer draws on a 15 x 8 inch figure
+
+        thumbnails = {}
+        futures = {}
+        for model_id in models:
+            path = self.thumbnail_path(folder, model_id, format)
+            if skip_existing and os.path.exists(path):
+                thumbnails[model_id] = path
+            else:
+                futures[self.submit(model_id, output=path, format=format, dpi=dpi)] = model_id
+
+        done = len(thumbnails)
+        for future in as_completed(futures):
+            model_id = futures[future]
+            done += 1
+            try:
+                thumbnails[model_id] = future.result()
+            except Exception as e:
+                print(f"Failed to render {model_id}: {e}")
+
+            if progress is not None:
+                progress(done, len(models))
+
+        return thumbnails
+
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+# Usage this is an example of how the renderer should be used
+
+if __name__ == "__main__":
+
+    renderer = GraphRenderer()
+
+    # One model, written to a file while this process carries on
+    future = renderer.submit("BIOMD0000000003", output="BIOMD0000000003.svg", format="svg")
+    print(f"Rendered {future.result()}")
+
+    # Thumbnails of every downloaded model, stored in the ModelStore or left as loose XML files
+    folder = config.BIOMODELS_DATABASE_FOLDER
+    models = {filename[:-4] for filename in os.listdir(folder) if filename.endswith(".xml")}
+    if config.MODEL_STORE and os.path.isdir(os.path.join(folder, config.MODEL_STORE_FOLDER)):
+        models |= ModelStore.from_folder(folder).models()
+    models = sorted(models)
+    thumbnails = renderer.render_thumbnails(models, progress=lambda done, total: print(f"{done}/{total}", end="\r"))
+    print(f"{len(thumbnails)} thumbnails in {config.THUMBNAIL_FOLDER}")
+
+    renderer.close()
@@ -0,0 +1,202 @@
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+import inspect
+import logging
+import threading
+import config
+
+"""Background workers for BioGraphGUI, database and network calls never run on the Qt main thread"""
+
+logger = logging.getLogger("biograph.workers")
+
+class WorkerCancelled(Exception):
+    """Raised by Worker.check_cancelled() to stop a cancelled task early"""
+
+
+class WorkerSignals(QObject):
+    """
+    Signals of a Worker, emitted on the pool thread and delivered on the GUI thread
+
+        result(object): value returned by the task
+        progress(int, int): (done, total) reported by the task
+        partial(object): intermediate results reported by the task, before it returns
+        error(str): message of an exception raised by the task
+        finished(): emitted last, also after an error or cancellation, not for a task cancelled before it started
+    """
+    result = pyqtSignal(object)
+    progress = pyqtSignal(int, int)
+    partial = pyqtSignal(object)
+    error = pyqtSignal(str)
+    finished = pyqtSignal()
+
+
+class Worker(QRunnable):
+    """
+    Runs function(*args, **kwargs) on a QThreadPool thread.
+
+    A function with a `worker` parameter is passed the worker itself, so it can report
+    progress with worker.report_progress(done, total), send results as they are found with
+    worker.report_partial(value), and stop early when cancelled with worker.check_cancelled().
+    A cancelled worker never emits result, progress, partial or error, so the GUI does not
+    show results of a request it no longer waits for.
+
+    Methods:
+    ------------
+
+    cancel():
+        Ask the task to stop and drop its result.
+
+    report_progress(done, total):
+        Emit progress from within the task.
+
+    report_partial(value):
+        Emit intermediate results from within the task.
+
+    check_cancelled():
+        Raise WorkerCancelled if the task was cancelled.
+    """
+
+    def __init__(self, function, *args, **kwargs):
+        super().__init__()
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self.cancelled = threading.Event()
+
+        try:
+            takes_worker = "worker" in inspect.signature(function).parameters
+        except (TypeError, ValueError): # Builtins without a signature
+            takes_worker = False
+        if takes_worker:
+            self.kwargs["worker"] = self
+
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def is_cancelled(self):
+        return self.cancelled.is_set()
+
+    def check_cancelled(self):
+        if self.cancelled.is_set():
+            raise WorkerCancelled()
+
+    def report_progress(self, done, total):
+        if not self.cancelled.is_set():
+            self.signals.progress.emit(done, total)
+
+    def report_partial(self, value):
+        if not self.cancelled.is_set():
+            self.signals.partial.emit(value)
+
+
+    def run(self):
+        try:
+            result = self.function(*self.args, **self.kwargs)
+        except WorkerCancelled:
+            pass
+        except Exception as e:
+            # Errors of cancelled tasks are expected (e.g. a closed connection) and not reported
+            if not self.cancelled.is_set():
+                logger.error("Background task %s failed", getattr(self.function, "__name__", self.function), exc_info=True)
+                self.signals.error.emit(str(e))
+        else:
+            if not self.cancelled.is_set():
+                self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+class WorkerPool():
+    """
+    QThreadPool running the database and network work of the GUI, several tasks run at once.
+
+    Tasks started with a key replace the previous task with the same key: a new search cancels
+    the search that is still running, so only the latest answer reaches the window. Signals that
+    were already queued when a task was cancelled are dropped as well.
+
+    Methods:
+    ------------
+
+    start(function, *args, key=None, result=None, progress=None, partial=None, error=None, finished=None, **kwargs):
+        Run a function in the background and connect the callbacks, returns the Worker.
+
+    cancel(key), cancel_all():
+        Cancel running and queued tasks, queued tasks are dropped without running.
+
+    wait(msecs):
+        Wait for all tasks to finish, used when the window closes.
+    """
+
+    def __init__(self, threads=config.GUI_WORKER_THREADS):
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(threads)
+        self.workers = set()  # Keeps workers and their signals alive until they finished
+        self.keys = {}  # key -> latest Worker started with it
+
+
+    def start(self, function, *args, key=None, result=None, progress=None, partial=None, error=None, finished=None, **kwargs):
+        """
+        Run function(*args, **kwargs) on the pool, callbacks are called on the GUI thread
+
+        key: optional name of the task, a running task with the same key is cancelled
+        result, progress, partial, error, finished: optional callables connected to the Worker's signals
+
+        Return:
+            Worker
+        """
+
+        if key is not None:
+            self.cancel(key)
+
+        worker = Worker(function, *args, **kwargs)
+        for signal, callback in ((worker.signals.result, result), (worker.signals.progress, progress),
+                                 (worker.signals.partial, partial), (worker.signals.error, error)):
+            if callback is not None:
+                signal.connect(self.unless_cancelled(worker, callback))
+        if finished is not None:
+            worker.signals.finished.connect(finished)
+        worker.signals.finished.connect(lambda: self.done(worker, key))
+
+        self.workers.add(worker)
+        if key is not None:
+            self.keys[key] = worker
+        self.pool.start(worker)
+
+        return worker
+
+
+    @staticmethod
+    def unless_cancelled(worker, callback):
+        """Signals are delivered later on the GUI thread, the task may have been cancelled in between"""
+        return lambda *args: None if worker.is_cancelled() else callback(*args)
+
+
+    def done(self, worker, key):
+        self.workers.discard(worker)
+        if key is not None and self.keys.get(key) is worker:
+            del self.keys[key]
+
+
+    def cancel(self, key):
+        worker = self.keys.pop(key, None)
+        if worker is not None:
+            self.drop(worker)
+
+
+    def cancel_all(self):
+        for worker in list(self.workers):
+            self.drop(worker)
+        self.keys.clear()
+
+
+    def drop(self, worker):
+        """Cancel a worker, a worker that did not start yet is taken off the queue: it never runs or emits finished"""
+
+        worker.cancel()
+        if self.pool.tryTake(worker):
+            self.workers.discard(worker)
+
+
+    def wait(self, msecs=-1):
+        return self.pool.waitForDone(msecs)
@@ -0,0 +1,306 @@
+from string import Template
+import html
+import json
+import os
+
+"""Single file, offline, interactive HTML view of a model graph, written by GraphVisualizer.export_html()"""
+
+COORDINATE_RANGE = 10000  # Positions are stored as integers from 0 to COORDINATE_RANGE
+
+# The page draws on a canvas: nodes are batched per label into one path, nodes outside the view are
+# skipped through a grid index, names appear once the zoom leaves room for them and relationship types
+# after that. Properties are a separate JSON block, only parsed when a node is first clicked.
+PAGE = Template("""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>$title</title>
+<style>
+html, body { margin: 0; height: 100%; overflow: hidden; font-family: sans-serif; background: #f2f2ff; }
+canvas { display: block; cursor: grab; }
+#legend { position: absolute; top: 10px; left: 10px; background: rgba(255, 255, 255, 0.85); padding: 6px 10px; border-radius: 4px; font-size: 12px; }
+#legend div { margin: 2px 0; }
+#legend span { display: inline-block; width: 10px; height: 10px; border-radius: 5px; margin-right: 6px; }
+#details { position: absolute; top: 10px; right: 10px; width: 340px; max-height: 85%; overflow: auto; background: white; border: 1px solid #999; border-radius: 4px; padding: 8px 12px; font-size: 12px; display: none; }
+#details table { border-collapse: collapse; width: 100%; }
+#details td { border-top: 1px solid #ddd; padding: 2px 4px; vertical-align: top; word-break: break-all; }
+</style>
+</head>
+<body>
+<canvas id="view"></canvas>
+<div id="legend"><b>$title</b></div>
+<div id="details"></div>
+<script id="graph" type="application/json">$graph</script>
+<script id="properties" type="application/json">$properties</script>
+<script>
+"use strict";
+const graph = JSON.parse(document.getElementById("graph").textContent);
+let properties = null;
+
+const RANGE = graph.range, n = graph.x.length, m = graph.source.length;
+const X = Float32Array.from(graph.x), Y = Float32Array.from(graph.y);
+const S = Int32Array.from(graph.source), T = Int32Array.from(graph.target);
+const palette = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22", "#17becf"];
+const spacing = RANGE / Math.sqrt(Math.max(n, 1));
+
+const canvas = document.getElementById("view"), context = canvas.getContext("2d");
+let width = 0, height = 0, scale = 1, offsetX = 0, offsetY = 0, selected = -1, scheduled = false, fitted = false;
+
+// Grid index of the nodes, for culling and hit testing
+const CELL = RANGE / 50, COLUMNS = 51;
+const cells = new Map();
+for (let i = 0; i < n; i++) {
+    const key = Math.floor(X[i] / CELL) * COLUMNS + Math.floor(Y[i] / CELL);
+    if (!cells.has(key)) cells.set(key, []);
+    cells.get(key).push(i);
+}
+
+function nodesIn(x0, y0, x1, y1) {
+    const found = [];
+    for (let cx = Math.max(0, Math.floor(x0 / CELL)); cx <= Math.min(COLUMNS - 1, Math.floor(x1 / CELL)); cx++) {
+        for (let cy = Math.max(0, Math.floor(y0 / CELL)); cy <= Math.min(COLUMNS - 1, Math.floor(y1 / CELL)); cy++) {
+            const cell = cells.get(cx * COLUMNS + cy);
+            if (cell) for (const i of cell) found.push(i);
+        }
+    }
+    return found;
+}
+
+function neighbours(node) {
+    const linked = [];
+    for (let e = 0; e < m; e++) {
+        if (S[e] === node) linked.push([e, T[e]]);
+        else if (T[e] === node) linked.push([e, S[e]]);
+    }
+    return linked;
+}
+
+function legend() {
+    const box = document.getElementById("legend");
+    graph.labels.forEach((label, l) => {
+        const row = document.createElement("div");
+        row.innerHTML = '<span style="background:' + palette[l % palette.length] + '"></span>';
+        row.appendChild(document.createTextNode(label));
+        box.appendChild(row);
+    });
+}
+
+function fit() {
+    scale = Math.min(width, height) / (RANGE * 1.05);
+    offsetX = (width - RANGE * scale) / 2;
+    offsetY = (height - RANGE * scale) / 2;
+}
+
+function resize() {
+    const ratio = window.devicePixelRatio || 1;
+    width = window.innerWidth;
+    height = window.innerHeight;
+    canvas.width = width * ratio;
+    canvas.height = height * ratio;
+    canvas.style.width = width + "px";
+    canvas.style.height = height + "px";
+    context.setTransform(ratio, 0, 0, ratio, 0, 0);
+    if (!fitted) { fit(); fitted = true; }
+    draw();
+}
+
+function draw() {
+    if (!scheduled) {
+        scheduled = true;
+        requestAnimationFrame(() => { scheduled = false; render(); });
+    }
+}
+
+function render() {
+    context.clearRect(0, 0, width, height);
+    const x0 = -offsetX / scale, y0 = -offsetY / scale, x1 = (width - offsetX) / scale, y1 = (height - offsetY) / scale;
+    const inView = i => X[i] >= x0 && X[i] <= x1 && Y[i] >= y0 && Y[i] <= y1;
+    const px = i => X[i] * scale + offsetX, py = i => Y[i] * scale + offsetY;
+    const zoom = spacing * scale;  // screen pixels between neighbouring nodes
+    const radius = Math.max(1.5, Math.min(10, zoom * 0.3));
+
+    // Relationships, one path, only those touching the view
+    const shown = [];
+    context.strokeStyle = "rgba(128, 128, 128, 0.5)";
+    context.lineWidth = zoom > 30 ? 1 : 0.5;
+    context.beginPath();
+    for (let e = 0; e < m; e++) {
+        if (!inView(S[e]) && !inView(T[e])) continue;
+        context.moveTo(px(S[e]), py(S[e]));
+        context.lineTo(px(T[e]), py(T[e]));
+        shown.push(e);
+    }
+    context.stroke();
+
+    // Nodes, one path per label
+    const visible = nodesIn(x0, y0, x1, y1).filter(inView);
+    const byLabel = graph.labels.map(() => []);
+    for (const i of visible) byLabel[graph.label[i]].push(i);
+    byLabel.forEach((nodes, l) => {
+        context.fillStyle = palette[l % palette.length];
+        context.beginPath();
+        for (const i of nodes) {
+            context.moveTo(px(i) + radius, py(i));
+            context.arc(px(i), py(i), radius, 0, 2 * Math.PI);
+        }
+        context.fill();
+    });
+
+    // Selected node and its relationships
+    if (selected >= 0) {
+        context.strokeStyle = "black";
+        context.lineWidth = 2;
+        context.beginPath();
+        for (const [e, other] of neighbours(selected)) {
+            context.moveTo(px(selected), py(selected));
+            context.lineTo(px(other), py(other));
+        }
+        context.moveTo(px(selected) + radius + 3, py(selected));
+        context.arc(px(selected), py(selected), radius + 3, 0, 2 * Math.PI);
+        context.stroke();
+    }
+
+    // Names once there is room for them, relationship types when zoomed in further
+    context.fillStyle = "black";
+    context.textAlign = "center";
+    if (zoom > 40 && visible.length < 3000) {
+        context.font = "bold 11px sans-serif";
+        for (const i of visible) context.fillText(graph.names[i], px(i), py(i) - radius - 3);
+    }
+    if (zoom > 120 && shown.length < 2000) {
+        context.font = "9px sans-serif";
+        context.fillStyle = "#555";
+        for (const e of shown) {
+            context.fillText(graph.types[graph.type[e]], (px(S[e]) + px(T[e])) / 2, (py(S[e]) + py(T[e])) / 2);
+        }
+    }
+}
+
+function nodeAt(clientX, clientY) {
+    const x = (clientX - offsetX) / scale, y = (clientY - offsetY) / scale, reach = 12 / scale;
+    let best = -1, bestDistance = reach * reach;
+    for (const i of nodesIn(x - reach, y - reach, x + reach, y + reach)) {
+        const distance = (X[i] - x) ** 2 + (Y[i] - y) ** 2;
+        if (distance < bestDistance) { best = i; bestDistance = distance; }
+    }
+    return best;
+}
+
+function showDetails(node) {
+    const box = document.getElementById("details");
+    if (node < 0) { box.style.display = "none"; return; }
+    if (properties === null) properties = JSON.parse(document.getElementById("properties").textContent);
+
+    box.innerHTML = "";
+    const title = document.createElement("h3");
+    title.textContent = graph.names[node] + " (" + graph.labels[graph.label[node]] + ")";
+    box.appendChild(title);
+
+    const table = document.createElement("table");
+    const row = (key, value) => {
+        const tr = table.insertRow();
+        tr.insertCell().textContent = key;
+        tr.insertCell().textContent = value;
+    };
+    for (const [key, value] of Object.entries(properties[node] || {})) row(key, value);
+    for (const [e, other] of neighbours(node)) row(graph.types[graph.type[e]], (S[e] === node ? "-> " : "<- ") + graph.names[other]);
+    box.appendChild(table);
+    box.style.display = "block";
+}
+
+let drag = null;
+canvas.addEventListener("mousedown", event => { drag = {x: event.clientX, y: event.clientY, moved: false}; canvas.style.cursor = "grabbing"; });
+window.addEventListener("mousemove", event => {
+    if (!drag) return;
+    const dx = event.clientX - drag.x, dy = event.clientY - drag.y;
+    if (Math.abs(dx) + Math.abs(dy) > 2) drag.moved = true;
+    offsetX += dx; offsetY += dy;
+    drag.x = event.clientX; drag.y = event.clientY;
+    draw();
+});
+window.addEventListener("mouseup", event => {
+    if (drag && !drag.moved) {
+        selected = nodeAt(event.clientX, event.clientY);
+        showDetails(selected);
+        draw();
+    }
+    drag = null;
+    canvas.style.cursor = "grab";
+});
+canvas.addEventListener("wheel", event => {
+    event.preventDefault();
+    const factor = Math.exp(-event.deltaY * 0.0015);
+    offsetX = event.clientX - (event.clientX - offsetX) * factor;
+    offsetY = event.clientY - (event.clientY - offsetY) * factor;
+    scale *= factor;
+    draw();
+}, {passive: false});
+window.addEventListener("keydown", event => {
+    if (event.key === "Escape") { selected = -1; showDetails(-1); draw(); }
+    if (event.key === "0") { fit(); draw(); }
+});
+window.addEventListener("resize", resize);
+
+legend();
+resize();
+</script>
+</body>
+</html>
+""")
+
+
+def embed(value):
+    """JSON that can be placed inside a <script> element"""
+    return json.dumps(value, separators=(",", ":"), default=str).replace("</", "<\\/")
+
+
+def write_html(G, pos, output, title="", properties=None):
+    """
+    Write a graph and its layout as one HTML file that opens offline, without a server
+
+    G: NetworkX graph, nodes may have a "label" attribute
+    pos: {node: (x, y)} layout of every node of G
+    properties: optional {node: {property: value}} shown when a node is clicked
+
+    Return:
+        output path
+    """
+
+    nodes = list(G.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    labels = sorted({str(label) for _, label in G.nodes(data="label", default="")})
+    label_index = {label: i for i, label in enumerate(labels)}
+    types = sorted({str(edge_type) for _, _, edge_type in G.edges(data="type", default="")})
+    type_index = {edge_type: i for i, edge_type in enumerate(types)}
+
+    # Positions as integers, the layout is scaled to fill 0 .. COORDINATE_RANGE
+    xs = [float(pos[node][0]) for node in nodes]
+    ys = [float(pos[node][1]) for node in nodes]
+    low = min(xs + ys, default=0.0)
+    extent = max(max(xs + ys, default=1.0) - low, 1e-9)
+    to_int = lambda value: int(round((value - low) / extent * COORDINATE_RANGE))
+
+    edges = [(index[u], index[v], type_index[str(edge_type)]) for u, v, edge_type in G.edges(data="type", default="")]
+
+    graph = {
+        "range": COORDINATE_RANGE,
+        "names": [str(node) for node in nodes],
+        "labels": labels,
+        "label": [label_index[str(G.nodes[node].get("label", ""))] for node in nodes],
+        "x": [to_int(x) for x in xs],
+        # Screen y grows downwards
+        "y": [COORDINATE_RANGE - to_int(y) for y in ys],
+        "types": types,
+        "source": [u for u, _, _ in edges],
+        "target": [v for _, v, _ in edges],
+        "type": [t for _, _, t in edges],
+    }
+    details = [(properties or {}).get(node, {}) for node in nodes]
+
+    page = PAGE.substitute(title=html.escape(title), graph=embed(graph), properties=embed(details))
+
+    with open(output + ".part", "w", encoding="utf-8") as html_file:
+        html_file.write(page)
+    os.replace(output + ".part", output)
+
+    return output
@@ -0,0 +1,226 @@
+import threading
+import queue
+import time
+import config
+
+"""Overlapped download -> map -> write import of models, used to sync the database with BioModels"""
+
+class ImportPipeline():
+    """
+    Streams models through three stages connected by bounded queues:
+        1) download workers fetch batches of models with the BiomodelsDownloader
+        2) map workers turn each downloaded XML into a graph with SbmlDatabase.map_model()
+        3) a single writer imports mapped models into the database, write_batch models at a time
+
+    A model is imported as soon as its XML lands instead of after all downloads finished.
+    When the writer falls behind, the queues fill up and the earlier stages wait (backpressure),
+    so memory use is bounded by queue_size mapped models.
+
+    Methods:
+    ------------
+
+    run(models):
+        Download and import models, returns the list of imported models.
+
+    report():
+        Counts per stage, why models failed and end to end models per second of the last run.
+    """
+
+    def __init__(self, downloader, database, download_workers=config.DOWNLOADING_THREADS, map_workers=config.PIPELINE_MAP_WORKERS,
+                 queue_size=config.PIPELINE_QUEUE_SIZE, write_batch=config.PIPELINE_WRITE_BATCH, progress=None):
+        """
+        downloader (BiomodelsDownloader): used to download models, its batch_size models per request
+        database (SbmlDatabase): models are mapped and written with it
+        download_workers (int): batches downloaded at once
+        map_workers (int): models mapped at once
+        queue_size (int): capacity of the queues between stages
+        write_batch (int): maximum number of models written to the database at once
+        progress (callable): called with (imported, total) after every written batch
+        """
+        self.downloader = downloader
+        self.database = database
+        self.download_workers = download_workers
+        self.map_workers = map_workers
+        self.queue_size = queue_size
+        self.write_batch = write_batch
+        self.progress = progress
+        self.statistics = {}
+        self.lock = threading.Lock()
+
+
+    def count(self, stage, n=1):
+        with self.lock:
+            self.statistics[stage] += n
+
+
+    def fail(self, model, error):
+        """Count a model as failed and keep the reason for report()"""
+        with self.lock:
+            self.statistics["failed"] += 1
+            self.statistics["errors"][model] = error
+
+
+    def download_stage(self, batches, downloaded):
+        """Download worker: batches of models in, one downloaded model at a time out"""
+
+        while True:
+            try:
+                batch = batches.get_nowait()
+            except queue.Empty:
+                return
+
+            error = None
+            try:
+                retry = self.downloader.download_batch(batch)
+                for model in retry:
+                    self.downloader.download_and_extract(model)
+            except Exception as e:
+                # Models of the batch downloaded before the error are still imported, the others fail with it
+                error = f"Download failed: {e}"
+
+            for model in batch:
+                outcome = self.downloader.download_results.get(model)
+                if outcome is not None and outcome["ok"]:
+                    self.count("downloaded")
+                    downloaded.put(model)  # Blocks while the map workers are behind
+                else:
+                    self.fail(model, (outcome or {}).get("error") or error or "Not downloaded")
+
+
+    def map_stage(self, downloaded, mapped):
+        """Map worker: model ids in, (tag, graph) out, until a None arrives"""
+
+        while True:
+            model = downloaded.get()
+            if model is None:
+                return
+
+            try:
+                with self.database.model_file(model) as path_model:
+                    graph = self.database.map_model(path_model, model)
+            except Exception as e:
+                self.fail(model, f"Mapping failed: {e}")
+                continue
+
+            self.count("mapped")
+            mapped.put((model, graph))  # Blocks while the writer is behind
+
+
+    def write_stage(self, mapped, total):
+        """Writer: imports mapped models in batches, until a None arrives"""
+
+        imported = []
+        done = False
+
+        while not done:
+            batch = [mapped.get()]
+
+            # Take whatever else is ready, without waiting for a full batch
+            while len(batch) < self.write_batch:
+                try:
+                    batch.append(mapped.get_nowait())
+                except queue.Empty:
+                    break
+
+            if None in batch:
+                batch.remove(None)
+                done = True
+
+            if not batch:
+                continue
+
+            try:
+                self.database.replace_models(batch)
+            except Exception as e:
+                for tag, _ in batch:
+                    self.fail(tag, f"Writing failed: {e}")
+                continue
+
+            imported += [tag for tag, _ in batch]
+            self.count("imported", len(batch))
+
+            if self.progress is not None:
+                self.progress(len(imported), total)
+
+        return imported
+
+
+    def run(self, models):
+        """
+        Download, map and import models with all stages running at once
+
+        Return:
+            list: models imported into the database
+        """
+
+        self.statistics = {"total": len(models), "downloaded": 0, "mapped": 0, "imported": 0, "failed": 0, "errors": {}}
+        start = time.perf_counter()
+
+        batches = queue.Queue()
+        for batch in self.downloader.batches(list(models)):
+            batches.put(batch)
+
+        downloaded = queue.Queue(maxsize=self.queue_size)
+        mapped = queue.Queue(maxsize=self.queue_size)
+
+        downloaders = [threading.Thread(target=self.download_stage, args=(batches, downloaded), name=f"pipeline-download-{i}", daemon=True)
+                       for i in range(self.download_workers)]
+        mappers = [threading.Thread(target=self.map_stage, args=(downloaded, mapped), name=f"pipeline-map-{i}", daemon=True)
+                   for i in range(self.map_workers)]
+
+        def close_stages():
+            # Each stage ends once the stage before it has finished and its queue is drained
+            for thread in downloaders:
+                thread.join()
+            for _ in mappers:
+                downloaded.put(None)
+            for thread in mappers:
+                thread.join()
+            mapped.put(None)
+
+        for thread in downloaders + mappers:
+            thread.start()
+        threading.Thread(target=close_stages, name="pipeline-close", daemon=True).start()
+
+        imported = self.write_stage(mapped, len(models))
+
+        self.downloader.record_downloads(models)
+        self.statistics["seconds"] = time.perf_counter() - start
+
+        report = self.report()
+        print(f"[{report['imported']}/{report['total']}] - models imported in {report['seconds']:.1f}s ({report['models_per_second']:.2f} models/s)")
+        if report["failed"]:
+            print(f"[{report['failed']}/{report['total']}] - models failed, see report()['errors']")
+
+        return imported
+
+
+    def report(self):
+        """
+        Statistics of the last run
+
+        Return:
+            dict -> total, downloaded, mapped, imported, failed, errors ({model: reason it failed}), seconds, models_per_second
+        """
+
+        with self.lock:
+            report = dict(self.statistics, errors=dict(self.statistics.get("errors", {})))
+        seconds = report.get("seconds", 0)
+        report["models_per_second"] = report.get("imported", 0) / seconds if seconds else 0.0
+
+        return report
+
+
+# Usage this is an example of how the pipeline should be called
+
+if __name__ == "__main__":
+
+    from BiomodelsDownloader import BiomodelsDownloader
+    from SbmlDatabase import SbmlDatabase
+
+    downloader = BiomodelsDownloader(threads=config.DOWNLOADING_THREADS, output_dir=config.BIOMODELS_DATABASE_FOLDER)
+    database = SbmlDatabase(config.CONFIGURATION_FILE, config.BIOMODELS_DATABASE_FOLDER, config.DEFAULT_SCHEMA)
+
+    pipeline = ImportPipeline(downloader, database)
+    pipeline.run(downloader.find_missing_models(config.NUMBER_OF_MODELS_TO_DOWNLOAD_FROM_DATABASE))
+    print(pipeline.report())
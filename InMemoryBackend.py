@@ -0,0 +1,515 @@
+from concurrent.futures import Future
+from array import array
+import xml.etree.ElementTree as ET
+import threading
+import bisect
+import json
+from SimilarityEngine import WLSimilarityEngine, TopK
+from ReactionIndex import ReactionNetworkIndex
+import config
+
+"""Embedded graph backend, answers the SbmlDatabaseQueries interface without a Neo4j server"""
+
+class InternTable():
+    """Maps strings (labels, relationship types, ids) to small integers and back, models may be mapped from several threads"""
+
+    def __init__(self):
+        self.index = {}
+        self.values = []
+        self.lock = threading.Lock()
+
+    def intern(self, value):
+        """Returns the integer of a string, adding it on first use. None is -1"""
+        if value is None:
+            return -1
+
+        if value not in self.index:
+            with self.lock:
+                if value not in self.index:
+                    self.values.append(value)
+                    self.index[value] = len(self.values) - 1
+
+        return self.index[value]
+
+    def lookup(self, value):
+        """Returns the integer of a string without adding it, -1 if unknown"""
+        return self.index.get(value, -1)
+
+    def __getitem__(self, i):
+        return self.values[i] if i >= 0 else None
+
+
+class ModelGraph():
+    """
+    Compact graph of a single model (tag)
+        -- node labels and ids are interned integers stored in arrays
+        -- relationships are stored as compressed sparse rows: the outgoing relationships of node i
+           are targets[offsets[i]:offsets[i + 1]] with types[offsets[i]:offsets[i + 1]]
+    """
+
+    def __init__(self, labels, ids, properties, edges):
+        """edges is a list of (source, relationship type, target) with interned types"""
+
+        self.labels = array('i', labels)
+        self.ids = array('i', ids)
+        self.properties = properties
+
+        counts = [0] * (len(labels) + 1)
+        for source, _, _ in edges:
+            counts[source + 1] += 1
+        for i in range(len(labels)):
+            counts[i + 1] += counts[i]
+
+        self.offsets = array('i', counts)
+        self.targets = array('i', [0] * len(edges))
+        self.types = array('i', [0] * len(edges))
+
+        position = list(counts[:-1])
+        for source, rel_type, target in edges:
+            self.targets[position[source]] = target
+            self.types[position[source]] = rel_type
+            position[source] += 1
+
+    def __len__(self):
+        return len(self.labels)
+
+    def out(self, node, rel_types=None):
+        """Yields (relationship type, target) of the outgoing relationships of a node"""
+        for i in range(self.offsets[node], self.offsets[node + 1]):
+            if rel_types is None or self.types[i] in rel_types:
+                yield self.types[i], self.targets[i]
+
+    def nodes_with_label(self, label):
+        return [node for node in range(len(self.labels)) if self.labels[node] == label]
+
+    def edge_count(self):
+        return len(self.targets)
+
+
+class InMemorySbmlBackend():
+    """
+    Holds imported models in process, in the same shape neo4jsbml writes them to Neo4j
+    (one node per SBML element of a schema label, relationships of the schema), and answers
+    the queries of SbmlDatabaseQueries with the same results and without any network round trips.
+
+    Methods:
+    ------------
+
+    import_model(path, tag):
+        Map an SBML file with the schema and add it under a tag (merged models add several files to one tag).
+
+    map_sbml(path, tag), add_graph(graph, tag):
+        The two halves of import_model(), mapping is thread safe.
+
+    delete_model(model_id):
+        Remove all nodes of a model.
+
+    change_schema(modelisation_path):
+        Use another schema for following imports.
+
+    check_model_exists(model_id), compare_models(model_id1, model_id2), search_for_compartment(compartment),
+    search_for_compund(compound), search_for_compound_in_compartment(compound, compartment),
+    find_all_models(skip, limit), iter_all_models(page_size, after), find_all_similar(model_id, MODEL_LIMIT),
+    find_reaction_path(source, target, model_id), can_convert(source, target, model_id):
+        Same as SbmlDatabaseQueries
+    """
+
+    SIMILARITY_STRUCTURE_TYPES = ("HAS_COMPARTMENT", "HAS_UNITDEFINITION", "HAS_SPECIES", "HAS_REACTION")
+    SIMILARITY_CHILD_TYPES = ("HAS_COMPARTMENT", "HAS_SPECIES", "HAS_REACTION")
+
+    def __init__(self, modelisation_path):
+        self.strings = InternTable()  # labels, relationship types and ids
+        self.models = {}  # tag -> [ModelGraph], one graph per imported file
+        self.tags = []  # sorted tags, for pagination
+        self.change_schema(modelisation_path)
+        self.wl_engine = InMemoryWLEngine(self)
+        self.reaction_index = InMemoryReactionIndex(self)
+
+
+    def change_schema(self, modelisation_path):
+        """Read node labels, their properties and the relationships from an arrows schema"""
+
+        with open(modelisation_path) as f:
+            schema = json.load(f)
+
+        labels = {node["id"]: node["labels"][0] for node in schema["nodes"]}
+
+        self.schema_properties = {node["labels"][0]: list(node["properties"]) for node in schema["nodes"]}
+        self.schema_relationships = [(labels[r["fromId"]], r["type"], labels[r["toId"]]) for r in schema["relationships"]]
+
+
+    @staticmethod
+    def local_name(element):
+        """Tag of an xml element without its namespace"""
+        return element.tag.rsplit("}", 1)[-1]
+
+
+    def element_label(self, element, parents):
+        """Schema label an SBML element is mapped to, None if the schema does not contain it"""
+
+        name = self.local_name(element)
+
+        # Level 2 local parameters are <parameter> elements in the listOfParameters of a kinetic law
+        if name == "parameter" and "LocalParameter" in self.schema_properties:
+            parent = parents.get(parents.get(element))
+            if parent is not None and self.local_name(parent) == "kineticLaw":
+                return "LocalParameter"
+
+        label = name[:1].upper() + name[1:]
+        return label if label in self.schema_properties else None
+
+
+    def map_sbml(self, path, tag):
+        """
+        Map an SBML file onto the schema
+            1) Every element whose name is a schema label becomes a node
+            2) A schema relationship (A)-[T]->(B) connects
+                - A to the B elements nested inside it (Model HAS_SPECIES Species, Reaction HAS_KENETICLAW KineticLaw)
+                - reactions and the species they reference for T containing REACTANT, PRODUCT or MODIFIER
+                - A to the B whose id is the value of one of A's attributes (Species IN_COMPARTMENT Compartment)
+
+        Return:
+            ModelGraph
+        """
+
+        root = ET.parse(path).getroot()
+        model = next(element for element in root.iter() if self.local_name(element) == "model")
+        parents = {child: parent for parent in model.iter() for child in parent}
+
+        elements = []  # node -> xml element
+        label_names = []  # node -> label
+        for element in model.iter():
+            label = self.element_label(element, parents)
+            if label is not None:
+                elements.append(element)
+                label_names.append(label)
+
+        node_of = {element: node for node, element in enumerate(elements)}
+        by_label_id = {}
+        for node, element in enumerate(elements):
+            by_label_id.setdefault((label_names[node], element.get("id")), node)
+
+        # Ancestor nodes of each node, closest first, for nested relationships
+        owners = {}
+        for node, element in enumerate(elements):
+            parent = parents.get(element)
+            while parent is not None:
+                if parent in node_of:
+                    owners.setdefault(node, []).append(node_of[parent])
+                parent = parents.get(parent)
+
+        # Species referenced by each reaction, per list (listOfReactants, listOfProducts, listOfModifiers)
+        references = {}
+        for node, element in enumerate(elements):
+            if label_names[node] != "Reaction":
+                continue
+            for child in element:
+                for reference in child:
+                    references.setdefault(self.local_name(child), []).append((node, reference.get("species")))
+
+        edges = []
+        for source_label, rel_type, target_label in self.schema_relationships:
+            rel = self.strings.intern(rel_type)
+            pairs = self.relationship_pairs(source_label, rel_type, target_label, elements, label_names, owners, references, by_label_id)
+            edges.extend((source, rel, target) for source, target in pairs)
+
+        properties = []
+        for node, element in enumerate(elements):
+            node_properties = {key: element.get(key) for key in self.schema_properties[label_names[node]] if element.get(key) is not None}
+            node_properties["name"] = element.get("name") or element.get("id") or element.get("metaid")
+            node_properties["metaid"] = element.get("metaid")
+            node_properties["tag"] = tag
+            properties.append(node_properties)
+
+        return ModelGraph([self.strings.intern(label) for label in label_names],
+                          [self.strings.intern(element.get("id")) for element in elements],
+                          properties, edges)
+
+
+    def relationship_pairs(self, source_label, rel_type, target_label, elements, label_names, owners, references, by_label_id):
+        """(source node, target node) pairs of one schema relationship, see map_sbml()"""
+
+        # Nested elements: the target's closest ancestor with the source label is the source
+        pairs = []
+        for node in range(len(elements)):
+            if label_names[node] != target_label:
+                continue
+            owner = next((owner for owner in owners.get(node, []) if label_names[owner] == source_label), None)
+            if owner is not None:
+                pairs.append((owner, node))
+
+        if pairs:
+            return pairs
+
+        # Reactions and the species they reference
+        for role, list_name in (("REACTANT", "listOfReactants"), ("PRODUCT", "listOfProducts"), ("MODIFIER", "listOfModifiers")):
+            if role not in rel_type:
+                continue
+
+            species = [(reaction, by_label_id.get(("Species", species_id))) for reaction, species_id in references.get(list_name, [])]
+            species = [(reaction, node) for reaction, node in species if node is not None]
+
+            if source_label == "Reaction" and target_label == "Species":
+                return species
+            if source_label == "Species" and target_label == "Reaction":
+                return [(node, reaction) for reaction, node in species]
+
+        # Attributes referencing another element by id
+        for node, element in enumerate(elements):
+            if label_names[node] != source_label:
+                continue
+            for key, value in element.attrib.items():
+                if key not in ("id", "metaid", "name") and (target_label, value) in by_label_id:
+                    pairs.append((node, by_label_id[(target_label, value)]))
+
+        return pairs
+
+
+    def import_model(self, path, tag):
+        """Add a model under a tag, a second file under the same tag is merged into it"""
+        self.add_graph(self.map_sbml(path, tag), tag)
+
+
+    def add_graph(self, graph, tag):
+        """Add a graph returned by map_sbml() under a tag"""
+
+        if tag not in self.models:
+            bisect.insort(self.tags, tag)
+            self.models[tag] = []
+
+        self.models[tag].append(graph)
+        self.invalidate_model(tag)
+
+
+    def delete_model(self, model_id):
+        """Remove a model and everything cached about it"""
+
+        if self.models.pop(model_id, None) is not None:
+            self.tags.remove(model_id)
+
+        self.invalidate_model(model_id)
+
+
+    def invalidate_model(self, model_id=None):
+        self.wl_engine.invalidate(model_id)
+        if model_id is not None:
+            self.reaction_index.drop(model_id)
+
+
+    def refresh_model_index(self, model_id):
+        self.reaction_index.refresh(model_id)
+
+
+    def check_model_exists(self, model_id):
+        return model_id in self.models
+
+
+    def model_children(self, model_id, rel_types):
+        """
+        Children of the Model nodes of a model through the given relationship types
+
+        Return:
+            list[(graph, node)]
+        """
+
+        model_label = self.strings.lookup("Model")
+        types = {self.strings.lookup(t) for t in rel_types}
+
+        children = []
+        for graph in self.models.get(model_id, []):
+            for model_node in graph.nodes_with_label(model_label):
+                children.extend((graph, target) for _, target in graph.out(model_node, types))
+
+        return children
+
+
+    def compare_models(self, model_id1, model_id2, engine="cypher"):
+        """
+        Same similarity score as the Cypher in SbmlDatabaseQueries.compare_models
+            -- structure: number of model elements of each model
+            -- children: every child of model 1 is paired with every child of model 2 of the same label,
+               and counts as matching if its id is one of the ids of those model 2 children
+        """
+
+        if engine == "wl":
+            return self.wl_engine.compare_models(model_id1, model_id2)
+
+        if model_id1 not in self.models or model_id2 not in self.models:
+            return 0
+
+        n1_elements = len(self.model_children(model_id1, self.SIMILARITY_STRUCTURE_TYPES))
+        n2_elements = len(self.model_children(model_id2, self.SIMILARITY_STRUCTURE_TYPES))
+
+        # Elements only hang off their Model node, so relationships and elements are counted the same
+        if n1_elements == n2_elements:
+            structural_similarity = 1.0
+        else:
+            structural_similarity = 1.0 - abs(n1_elements - n2_elements) / float(n1_elements + n2_elements)
+
+        children1 = {}
+        for graph, node in self.model_children(model_id1, self.SIMILARITY_CHILD_TYPES):
+            children1.setdefault(graph.labels[node], []).append(graph.ids[node])
+
+        children2 = {}
+        for graph, node in self.model_children(model_id2, self.SIMILARITY_CHILD_TYPES):
+            children2.setdefault(graph.labels[node], []).append(graph.ids[node])
+
+        shared_labels = [label for label in children1 if label in children2]
+        if not shared_labels:
+            return 0
+
+        children2_ids = {i for label in shared_labels for i in children2[label]}
+
+        total_children = sum(len(children1[label]) * len(children2[label]) for label in shared_labels)
+        matching = sum(len(children2[label]) for label in shared_labels for i in children1[label] if i in children2_ids)
+        children_similarity = matching / total_children
+
+        return structural_similarity * config.STRCUTURE_WEIGHTING + children_similarity * config.NODE_WEIGHTING
+
+
+    def search(self, matches):
+        """Names of models for which matches(graph, model node) is True, None (and a message) if there are none"""
+
+        model_label = self.strings.lookup("Model")
+
+        # Like the neo4j searches, the name of the matching Model node is returned, not the tag:
+        # a match in a merged model is reported as the model it came from
+        matching_models = set()
+        for tag, graphs in self.models.items():
+            for graph in graphs:
+                for node in graph.nodes_with_label(model_label):
+                    if matches(graph, node):
+                        matching_models.add(self.strings[graph.ids[node]] or tag)
+
+        if not matching_models:
+            print("No models found")
+            return
+
+        return list(matching_models)
+
+
+    def has_child(self, graph, node, rel_type, label, node_id):
+        """Targets of node through rel_type with the given label and id"""
+        rel, label, node_id = self.strings.lookup(rel_type), self.strings.lookup(label), self.strings.lookup(node_id)
+        return [target for _, target in graph.out(node, {rel}) if graph.labels[target] == label and graph.ids[target] == node_id]
+
+
+    def search_for_compartment(self, compartment):
+        return self.search(lambda graph, node: self.has_child(graph, node, "HAS_COMPARTMENT", "Compartment", compartment))
+
+
+    def search_for_compund(self, compound):
+        return self.search(lambda graph, node: self.has_child(graph, node, "HAS_SPECIES", "Species", compound))
+
+
+    def search_for_compound_in_compartment(self, compound, compartment):
+        return self.search(lambda graph, node: any(self.has_child(graph, species, "IN_COMPARTMENT", "Compartment", compartment)
+                                                   for species in self.has_child(graph, node, "HAS_SPECIES", "Species", compound)))
+
+
+    def find_all_models(self, skip=0, limit=-1):
+        return self.tags[skip:] if limit == -1 else self.tags[skip:skip + limit]
+
+
+    def find_models_page(self, after=None, page_size=config.MODELS_PAGE_SIZE):
+        if int(page_size) < 1:
+            raise ValueError(f"page_size must be at least 1, got {page_size}")
+
+        start = bisect.bisect_right(self.tags, after) if after is not None else 0
+        return self.tags[start:start + page_size]
+
+
+    def iter_all_models(self, page_size=config.MODELS_PAGE_SIZE, after=None):
+        while True:
+            page = self.find_models_page(after=after, page_size=page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            after = page[-1]
+
+
+    def similarity_candidates(self):
+        return [model for model in self.tags if "-" not in model]
+
+
+    def iter_similar(self, model_id, models=None, engine=config.SIMILARITY_ENGINE):
+        """Same as SbmlDatabaseQueries.iter_similar()"""
+
+        if models is None:
+            models = self.similarity_candidates()
+
+        if engine == "wl":
+            scores = self.wl_engine.iter_similar(model_id, models)
+        else:
+            scores = ((model, self.compare_models(model_id, model)) for model in models)
+
+        for model, accuracy in scores:
+            yield model, round(accuracy * 100, 2)
+
+
+    def find_all_similar(self, model_id, MODEL_LIMIT=-1, engine=config.SIMILARITY_ENGINE):
+        """Same as SbmlDatabaseQueries.find_all_similar()"""
+
+        top = TopK(MODEL_LIMIT)
+        for model, accuracy in self.iter_similar(model_id, engine=engine):
+            top.push(model, accuracy)
+
+        return top.best()
+
+
+    def find_reaction_path(self, source, target, model_id=None, max_depth=config.PATH_MAX_DEPTH, max_fanout=config.PATH_MAX_FANOUT):
+        return self.reaction_index.shortest_path(source, target, model_id=model_id, max_depth=max_depth, max_fanout=max_fanout)
+
+
+    def can_convert(self, source, target, model_id):
+        return self.reaction_index.can_convert(model_id, source, target)
+
+
+    def submit_read(self, function, *args, **kwargs):
+        """Nothing to wait for, reads are answered straight away"""
+        future = Future()
+        future.set_result(function(*args, **kwargs))
+        return future
+
+
+class InMemoryWLEngine(WLSimilarityEngine):
+    """WL similarity engine reading model graphs from the in memory backend"""
+
+    def __init__(self, backend):
+        super().__init__(connection=None)
+        self.backend = backend
+
+    def fetch_model_graph(self, model_id):
+        strings = self.backend.strings
+        labels, edges = {}, []
+
+        for g, graph in enumerate(self.backend.models.get(model_id, [])):
+            for node in range(len(graph)):
+                labels[(g, node)] = self.initial_label(strings[graph.labels[node]], strings[graph.ids[node]])
+                edges.extend(((g, node), strings[rel_type], (g, target)) for rel_type, target in graph.out(node))
+
+        return labels, edges
+
+
+class InMemoryReactionIndex(ReactionNetworkIndex):
+    """Reaction network index reading model graphs from the in memory backend"""
+
+    def __init__(self, backend):
+        super().__init__(connection=None)
+        self.backend = backend
+
+    def query_networks(self, model_id=None):
+        strings = self.backend.strings
+        reactant, product = strings.lookup("IS_REACTANT"), strings.lookup("HAS_PRODUCT")
+        models = [model_id] if model_id is not None else self.backend.tags
+
+        networks = {}
+        for tag in models:
+            for graph in self.backend.models.get(tag, []):
+                for species in range(len(graph)):
+                    for _, reaction in graph.out(species, {reactant}):
+                        for _, produced in graph.out(reaction, {product}):
+                            network = networks.setdefault(tag, {})
+                            network.setdefault(strings[graph.ids[species]], []).append((strings[graph.ids[reaction]], strings[graph.ids[produced]]))
+
+        return networks
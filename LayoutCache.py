@@ -0,0 +1,137 @@
+import threading
+import hashlib
+import json
+import os
+import config
+
+"""On disk cache of graph layouts used by GraphVisualizer, so a model is only laid out once"""
+
+class LayoutCache():
+    """
+    Node positions per model tag, stored as one JSON file per tag together with a hash of the
+    graph structure they were computed for.
+
+    get() only returns positions computed for exactly the same structure. When the model changed,
+    seed() still returns the positions of the nodes it kept, so a new layout can start from
+    them and needs far fewer iterations.
+
+    The cache holds at most max_entries models, the least recently used ones are evicted first.
+
+    Methods:
+    ------------
+
+    structure_hash(graph):
+        Hash of the nodes and relationships of a graph.
+
+    get(tag, graph):
+        Cached positions for this exact graph, or None.
+
+    seed(tag, graph):
+        Cached positions of the nodes of graph, also after the model changed, or None.
+
+    put(tag, graph, positions):
+        Store the positions of a graph.
+    """
+
+    def __init__(self, folder=config.LAYOUT_CACHE_FOLDER, max_entries=config.LAYOUT_CACHE_SIZE):
+        self.folder = folder
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+
+    @staticmethod
+    def structure_hash(graph):
+        """Order independent hash of the nodes and (typed) relationships of a NetworkX graph"""
+
+        digest = hashlib.blake2b(digest_size=16)
+        for node in sorted(map(str, graph.nodes())):
+            digest.update(f"n\t{node}\n".encode())
+        for edge in sorted(f"e\t{u}\t{v}\t{data.get('type', '')}\n" for u, v, data in graph.edges(data=True)):
+            digest.update(edge.encode())
+
+        return digest.hexdigest()
+
+
+    def path(self, tag):
+        # Tags are BioModels ids or merged ids, anything else is made safe for a file name
+        return os.path.join(self.folder, "".join(c if c.isalnum() or c in "-_." else "_" for c in tag) + ".json")
+
+
+    def load(self, tag):
+        """Cached entry of a tag and mark it as recently used, None if there is none"""
+
+        path = self.path(tag)
+        try:
+            with open(path) as layout_file:
+                entry = json.load(layout_file)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        return entry
+
+
+    def get(self, tag, graph, structure_hash=None):
+        """
+        Positions {node: (x, y)} if the layout of tag was computed for this graph, otherwise None
+            -- positions are stored under str(node), they are returned keyed by the nodes of graph
+               (e.g. (label, id) tuples)
+        """
+
+        entry = self.load(tag)
+        if entry is None or entry["hash"] != (structure_hash or self.structure_hash(graph)):
+            return None
+
+        positions = entry["positions"]
+        if not all(str(node) in positions for node in graph.nodes()):
+            return None
+
+        return {node: tuple(positions[str(node)]) for node in graph.nodes()}
+
+
+    def seed(self, tag, graph):
+        """Positions of the nodes of graph that are in the cached layout of tag, None if no node is"""
+
+        entry = self.load(tag)
+        if entry is None:
+            return None
+
+        positions = {node: tuple(entry["positions"][str(node)]) for node in graph.nodes() if str(node) in entry["positions"]}
+        return positions or None
+
+
+    def put(self, tag, graph, positions, structure_hash=None):
+        """Store the layout of a graph, replacing the previous layout of the tag"""
+
+        entry = {"tag": tag, "hash": structure_hash or self.structure_hash(graph),
+                 "positions": {str(node): [float(x), float(y)] for node, (x, y) in positions.items()}}
+
+        path = self.path(tag)
+        with self.lock:
+            with open(path + ".part", "w") as layout_file:
+                json.dump(entry, layout_file)
+            os.replace(path + ".part", path)
+            self.evict()
+
+
+    def evict(self):
+        """Remove the least recently used layouts above max_entries"""
+
+        files = [os.path.join(self.folder, name) for name in os.listdir(self.folder) if name.endswith(".json")]
+        if len(files) <= self.max_entries:
+            return
+
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+    def clear(self):
+        with self.lock:
+            for name in os.listdir(self.folder):
+                if name.endswith(".json"):
+                    os.remove(os.path.join(self.folder, name))
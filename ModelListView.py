@@ -0,0 +1,299 @@
+from PyQt6.QtWidgets import QListView, QStyledItemDelegate, QAbstractItemView
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize, QEvent, pyqtSignal
+from PyQt6.QtGui import QColor, QFont, QPainter
+import bisect
+import config
+
+"""Virtualized lists of models for BioGraphGUI: only visible rows are painted, pages are fetched while scrolling"""
+
+SCORE_ROLE = Qt.ItemDataRole.UserRole + 1
+
+# One stylesheet for every model list, rows themselves are painted by ModelRowDelegate
+LIST_STYLESHEET = """
+    QListView {
+        background-color: #0c120c;
+        border: none;
+        color: white;
+    }
+    QScrollBar:vertical {
+        border: none;
+        background: black;
+        width: 5px;
+    }
+    QScrollBar::handle:vertical {
+        background: #111c11;
+        min-height: 20px;
+    }
+"""
+
+ROW_HEIGHT = 70
+ROW_COLOR = QColor("#111c11")
+BUTTON_COLOR = QColor("#1a301a")
+BUTTON_HOVER_COLOR = QColor("#213d20")
+
+
+def score_color(score):
+    """Colour of a similarity score, as in the similar models list"""
+    if score >= 80:
+        return QColor("green")
+    if score >= 50:
+        return QColor("yellow")
+    if score >= 30:
+        return QColor("orange")
+    return QColor("red")
+
+
+class ModelListModel(QAbstractListModel):
+    """
+    Rows of (model, similarity score or None).
+
+    A list is either set at once with set_models(), or filled page by page: with a fetch_page
+    function, the view asks for the next page (canFetchMore / fetchMore) when it is scrolled
+    near the end. Pages are fetched on the GUI's WorkerPool, never on the GUI thread.
+
+    Signals:
+        error(str): a page could not be fetched
+
+    Methods:
+    ------------
+
+    set_models(models, scores=None):
+        Replace all rows.
+
+    set_source(fetch_page):
+        Replace all rows by pages of fetch_page(after, page_size) -> [model, ...].
+
+    update_ranking(changes):
+        Insert scored models as they arrive, rows stay sorted by score.
+
+    model_at(row):
+        Model of a row.
+    """
+
+    error = pyqtSignal(str)
+
+    def __init__(self, workers, page_size=config.MODELS_PAGE_SIZE, parent=None):
+        """
+        workers (GuiWorkers.WorkerPool): runs fetch_page in the background
+        page_size (int): models fetched at once
+        """
+        super().__init__(parent)
+        self.workers = workers
+        self.page_size = page_size
+        self.rows = []  # [model, score]
+        self.fetch_page = None
+        self.loading = False
+        self.exhausted = True
+
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+
+        model, score = self.rows[index.row()]
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return model
+        if role == SCORE_ROLE:
+            return score
+        return None
+
+
+    def model_at(self, row):
+        return self.rows[row][0]
+
+
+    def set_models(self, models, scores=None):
+        """Replace the rows with a list of models, scores are shown when given"""
+
+        self.beginResetModel()
+        self.workers.cancel(id(self))  # A page that is still loading belongs to the old rows
+        self.rows = [[model, None if scores is None else scores[i]] for i, model in enumerate(models)]
+        self.fetch_page = None
+        self.loading = False
+        self.exhausted = True
+        self.endResetModel()
+
+
+    def set_source(self, fetch_page):
+        """Replace the rows with models fetched page by page as the list is scrolled"""
+
+        self.set_models([])
+        self.fetch_page = fetch_page
+        self.exhausted = False
+        self.fetchMore(QModelIndex())
+
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted and not self.loading
+
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+
+        self.loading = True
+        after = self.rows[-1][0] if self.rows else None
+        self.workers.start(self.fetch_page, after, self.page_size, key=id(self), result=self.add_page, error=self.page_failed)
+
+
+    def add_page(self, page):
+        self.loading = False
+        self.exhausted = len(page) < self.page_size
+
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(page) - 1)
+            self.rows.extend([model, None] for model in page)
+            self.endInsertRows()
+
+
+    def update_ranking(self, changes):
+        """
+        Apply the changes of a running top k (SimilarityEngine.TopK) to a scored list
+            -- changes: [(model, score, evicted model or None)] in the order they were pushed
+            -- a model is inserted after the rows with a higher or equal score, the evicted model is removed
+            -- an evicted model that is not listed (the rows were replaced meanwhile) is ignored
+        """
+
+        for model, score, evicted in changes:
+            if evicted is not None:
+                row = next((i for i, (other, _) in enumerate(self.rows) if other == evicted), None)
+                if row is not None:
+                    self.beginRemoveRows(QModelIndex(), row, row)
+                    del self.rows[row]
+                    self.endRemoveRows()
+
+            row = bisect.bisect_right(self.rows, -score, key=lambda row: -row[1])
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.rows.insert(row, [model, score])
+            self.endInsertRows()
+
+
+    def page_failed(self, error):
+        self.loading = False
+        self.exhausted = True
+        self.error.emit(f"Failed to fetch models: {error}")
+
+
+class ModelRowDelegate(QStyledItemDelegate):
+    """
+    Paints a row like the former per model widgets: model name, optional score and action buttons.
+    Buttons are painted, not widgets, clicks on them are reported through ModelListView.action.
+    """
+
+    def __init__(self, actions, parent=None):
+        """actions: [(action, button text)], right to left"""
+        super().__init__(parent)
+        self.actions = actions
+        self.hover = None  # Mouse position in the view, for button hover
+        self.font = QFont()
+        self.score_font = QFont()
+        self.score_font.setPixelSize(20)
+        self.score_font.setBold(True)
+        self.button_font = QFont()
+        self.button_font.setPixelSize(10)
+
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), ROW_HEIGHT)
+
+
+    def button_rects(self, rect):
+        """[(action, text, QRect)] of the buttons of a row"""
+
+        buttons = []
+        right = rect.right() - 10
+        for action, text in self.actions:
+            width = 20 + len(text) * 6
+            buttons.append((action, text, QRect(right - width, rect.center().y() - 15, width, 30)))
+            right -= width + 10
+        return buttons
+
+
+    def paint(self, painter, option, index):
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        rect = option.rect.adjusted(2, 2, -2, -2)
+
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(ROW_COLOR)
+        painter.drawRoundedRect(rect, 5, 5)
+
+        buttons = self.button_rects(rect)
+        left_of_buttons = buttons[-1][2].left() if buttons else rect.right()
+
+        painter.setPen(QColor("white"))
+        painter.setFont(self.font)
+        painter.drawText(rect.adjusted(12, 0, 0, 0), Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft, index.data())
+
+        score = index.data(SCORE_ROLE)
+        if score is not None:
+            score_rect = QRect(left_of_buttons - 90, rect.top(), 80, rect.height())
+            painter.setFont(self.score_font)
+            painter.setPen(score_color(score))
+            painter.drawText(score_rect, Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignRight, f"{score}%")
+            painter.setFont(self.font)
+            painter.setPen(QColor("white"))
+            painter.drawText(QRect(score_rect.left() - 130, rect.top(), 120, rect.height()),
+                             Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignRight, "similarity match:")
+
+        painter.setFont(self.button_font)
+        for action, text, button in buttons:
+            painter.setPen(Qt.PenStyle.NoPen)
+            painter.setBrush(BUTTON_HOVER_COLOR if self.hover is not None and button.contains(self.hover) else BUTTON_COLOR)
+            painter.drawRect(button)
+            painter.setPen(QColor("white"))
+            painter.drawText(button, Qt.AlignmentFlag.AlignCenter, text)
+
+        painter.restore()
+
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.Type.MouseButtonRelease and event.button() == Qt.MouseButton.LeftButton:
+            for action, _, button in self.button_rects(option.rect.adjusted(2, 2, -2, -2)):
+                if button.contains(event.position().toPoint()):
+                    self.parent().action.emit(action, index.data())
+                    return True
+        return False
+
+
+class ModelListView(QListView):
+    """
+    List of models showing only the rows in view, for lists of tens of thousands of models.
+
+    Signals:
+        action(str, str): (action, model) when a row's button is clicked
+    """
+
+    action = pyqtSignal(str, str)
+
+    def __init__(self, actions, parent=None):
+        """actions: [(action, button text)] shown on every row, right to left"""
+        super().__init__(parent)
+        self.setUniformItemSizes(True)  # Row heights are not measured per row
+        self.setMouseTracking(True)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setItemDelegate(ModelRowDelegate(actions, self))
+        self.setStyleSheet(LIST_STYLESHEET)
+
+
+    def set_actions(self, actions):
+        """Change the buttons shown on every row"""
+        self.itemDelegate().actions = actions
+        self.viewport().update()
+
+
+    def mouseMoveEvent(self, event):
+        super().mouseMoveEvent(event)
+        self.itemDelegate().hover = event.position().toPoint()
+        self.viewport().update()  # Repaint button hover
+
+
+    def leaveEvent(self, event):
+        super().leaveEvent(event)
+        self.itemDelegate().hover = None
+        self.viewport().update()
@@ -0,0 +1,275 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import hashlib
+import json
+import time
+import os
+import requests
+import config
+
+"""Record of the upstream metadata and local state of every downloaded model, used to decide what to re-download"""
+
+class RateLimiter():
+    """Thread safe token bucket: at most `rate` calls per second, with bursts of up to `burst` calls"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a call is allowed"""
+
+        if not self.rate:
+            return
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class ModelManifest():
+    """
+    Persistent manifest (JSON) of the models in the download folder.
+    For every model it keeps:
+        size, checksum, mtime: size, sha256 and modification time of the local file when it was downloaded
+        upstream_size: fileSize of the main file according to the BioModels metadata
+        upstream_revision: checksum or revision of the main file according to the metadata, see upstream_revision()
+        etag, last_modified: validators of the last metadata response, sent back as If-None-Match / If-Modified-Since
+        checked: time of the last metadata check
+        stale: the upstream version changed and has not been downloaded yet
+
+    A model has to be re-downloaded when its local file is missing or no longer matches the manifest (damaged),
+    or when refresh() finds that the upstream size or revision of its main file changed.
+
+    Methods:
+    ------------
+
+    is_damaged(model):
+        True if the local file of a model does not match the manifest.
+
+    refresh(session, models):
+        Parallel, rate limited, conditional metadata requests - returns the models changed upstream.
+
+    record_download(model):
+        Store the state of a freshly downloaded model.
+
+    save():
+        Write the manifest to disk.
+    """
+
+    def __init__(self, folder, metadata_url=config.METADATA_URL, path=None, threads=config.DOWNLOADING_THREADS,
+                 rate_limit=config.DOWNLOAD_RATE_LIMIT, timeout=config.DOWNLOAD_TIMEOUT, store=None):
+        """
+        folder (str): folder of the downloaded models
+        metadata_url (str): metadata url of a model, with {model} in place of the model id
+        path (str): manifest file, default is config.MANIFEST_FILE inside folder
+        threads (int): number of metadata requests in flight at once
+        rate_limit (float): maximum metadata requests per second, 0 for no limit
+        store (ModelStore): store of the models, loose XML files in folder are used for models not in it
+        """
+        self.folder = folder
+        self.metadata_url = metadata_url
+        self.path = path or os.path.join(folder, config.MANIFEST_FILE)
+        self.threads = threads
+        self.limiter = RateLimiter(rate_limit, burst=threads)
+        self.timeout = timeout
+        self.store = store
+        self.lock = threading.Lock()
+        self.entries = self.load()
+
+
+    def load(self):
+        """Read the manifest, an unreadable manifest is treated as empty"""
+
+        try:
+            with open(self.path) as manifest:
+                return json.load(manifest)
+        except (OSError, ValueError):
+            return {}
+
+
+    def save(self):
+        """Write the manifest atomically, so an interrupted save never leaves a broken file"""
+
+        with self.lock:
+            with open(self.path + ".part", "w") as manifest:
+                json.dump(self.entries, manifest, indent=1, sort_keys=True)
+            os.replace(self.path + ".part", self.path)
+
+
+    def model_file(self, model):
+        return os.path.join(self.folder, f"{model}.xml")
+
+
+    def in_store(self, model):
+        return self.store is not None and model in self.store
+
+
+    def has_model(self, model):
+        """True if the model is in the store or in a loose XML file"""
+        return self.in_store(model) or os.path.isfile(self.model_file(model))
+
+
+    @staticmethod
+    def checksum(path):
+        """sha256 of a file, read in blocks"""
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as model_file:
+            for block in iter(lambda: model_file.read(1 << 16), b""):
+                digest.update(block)
+
+        return digest.hexdigest()
+
+
+    def is_damaged(self, model):
+        """
+        True if the local file is missing or differs from the manifest
+            -- the checksum is only computed when size or mtime changed, so unchanged files cost one stat
+            -- models downloaded before the manifest existed are adopted as they are
+            -- for stored models the checksum is kept in the store index, no file is read
+        """
+
+        if self.in_store(model):
+            entry = self.entries.get(model)
+            if entry is None or "checksum" not in entry:
+                self.record_download(model)
+                return False
+            return entry["checksum"] != self.store.entry(model)["checksum"]
+
+        path = self.model_file(model)
+        if not os.path.isfile(path):
+            return True
+
+        stat = os.stat(path)
+        entry = self.entries.get(model)
+
+        if entry is None or "checksum" not in entry:
+            self.record_download(model)
+            return False
+
+        if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return False
+
+        if entry["size"] == stat.st_size and entry["checksum"] == self.checksum(path):
+            with self.lock:
+                entry["mtime"] = stat.st_mtime
+            return False
+
+        return True
+
+
+    def record_download(self, model):
+        """Store size, checksum and mtime of the local file (or store record) of a model"""
+
+        if self.in_store(model):
+            stored = self.store.entry(model)
+            with self.lock:
+                self.entries.setdefault(model, {}).update(size=stored["size"], mtime=None, checksum=stored["checksum"], stale=False)
+            return
+
+        path = self.model_file(model)
+        stat = os.stat(path)
+        checksum = self.checksum(path)
+
+        with self.lock:
+            entry = self.entries.setdefault(model, {})
+            entry.update(size=stat.st_size, mtime=stat.st_mtime, checksum=checksum, stale=False)
+
+
+    @staticmethod
+    def upstream_revision(metadata):
+        """
+        Revision of the main file of a model according to its metadata
+            -- a checksum or revision published with the file is used as is
+            -- otherwise a hash of the metadata of the main file (name, size, description, ...), which changes with a new upload
+        """
+
+        main = metadata["main"][0]
+        for key in ("checksum", "sha256", "md5", "revision", "version"):
+            if main.get(key) is not None:
+                return f"{key}:{main[key]}"
+
+        return "metadata:" + hashlib.sha256(json.dumps(main, sort_keys=True).encode()).hexdigest()
+
+
+    def check_model(self, session, model):
+        """
+        Conditional metadata request for one model
+
+        Return:
+            bool: True if the upstream main file changed since it was downloaded
+        """
+
+        with self.lock:
+            entry = dict(self.entries.get(model, {}))
+
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        self.limiter.acquire()
+        try:
+            response = session.get(self.metadata_url.format(model=model), headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"{model} metadata check failed: {e}")
+            return False
+
+        if response.status_code == 304:
+            changed = entry.get("stale", False)
+            update = {"checked": time.time()}
+
+        elif response.status_code == 200:
+            try:
+                metadata = response.json()
+                upstream_size = int(metadata["main"][0]["fileSize"])
+                upstream_revision = self.upstream_revision(metadata)
+            except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+                print(f"{model} metadata could not be read")
+                return False
+
+            # Before the first check the local file is the reference, a revision is only compared once one was recorded
+            changed = (entry.get("stale", False) or upstream_size != entry.get("upstream_size", entry.get("size"))
+                       or upstream_revision != entry.get("upstream_revision", upstream_revision))
+            update = {"checked": time.time(), "upstream_size": upstream_size, "upstream_revision": upstream_revision, "stale": changed,
+                      "etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+
+        else:
+            print(f"{model} metadata check failed: status code {response.status_code}")
+            return False
+
+        with self.lock:
+            self.entries.setdefault(model, {}).update(update)
+
+        return changed
+
+
+    def refresh(self, session, models):
+        """
+        Check the upstream metadata of many models in parallel
+
+        Return:
+            list: models whose upstream version changed, in input order
+        """
+
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            changed = list(executor.map(lambda model: self.check_model(session, model), models))
+
+        self.save()
+
+        return [model for model, is_changed in zip(models, changed) if is_changed]
@@ -0,0 +1,336 @@
+import threading
+import hashlib
+import struct
+import json
+import zlib
+import os
+import config
+
+"""Compressed, indexed storage of downloaded SBML documents, used in place of one XML file per model"""
+
+class ModelStore():
+    """
+    Packs SBML documents into append-only segment files, each document compressed on its own.
+    An index (model -> segment, offset, length, size, checksum) is kept in memory and appended to
+    index.jsonl on every write, so reading a model is one seek and listing the models never
+    touches the file system.
+
+    Every record in a segment starts with a header holding its model id, so the index can be
+    rebuilt from the segments if it is lost. Replacing a model appends a new record, deleting a
+    model appends a tombstone record, compact() rewrites the segments without the replaced and
+    deleted records.
+
+    Methods:
+    ------------
+
+    from_folder(folder):
+        Returns the shared store inside a download folder.
+
+    put(model, data), put_file(model, path):
+        Add or replace the XML of a model.
+
+    get(model):
+        XML of a model as bytes.
+
+    models():
+        All stored models.
+
+    write_file(model, path):
+        Write the XML of a model to a file, for readers that need a path.
+
+    delete(model), compact():
+        Remove a model, reclaim the space of removed records.
+    """
+
+    HEADER = struct.Struct(">4sHII")  # magic, length of model id, compressed length, uncompressed size
+    MAGIC = b"SBMS"
+    TOMBSTONE = b"SBMX"  # Header of a deleted model, without data
+
+    stores = {}  # folder -> ModelStore
+    stores_lock = threading.Lock()
+
+    def __init__(self, path, segment_size=config.MODEL_STORE_SEGMENT_SIZE, compression=config.MODEL_STORE_COMPRESSION):
+        """
+        path (str): folder of the segment files and index
+        segment_size (int): a new segment is started once the current one is larger than this many bytes
+        compression (int): zlib compression level
+        """
+        self.path = path
+        self.segment_size = segment_size
+        self.compression = compression
+        self.lock = threading.Lock()
+        self.readers = {}  # segment -> open file, shared under the lock
+
+        os.makedirs(path, exist_ok=True)
+        self.index_path = os.path.join(path, "index.jsonl")
+        self.index = self.load_index()
+        self.segment = max((entry["segment"] for entry in self.index.values()), default=0)
+        self.segment = max([self.segment] + self.segment_numbers())
+
+
+    @classmethod
+    def from_folder(cls, folder):
+        """Returns the store of a download folder, creating it the first time it is requested"""
+
+        path = os.path.abspath(os.path.join(folder, config.MODEL_STORE_FOLDER))
+
+        with cls.stores_lock:
+            if path not in cls.stores:
+                cls.stores[path] = cls(path)
+
+            return cls.stores[path]
+
+
+    def segment_path(self, segment):
+        return os.path.join(self.path, f"segment-{segment:05d}.seg")
+
+
+    def segment_numbers(self):
+        return sorted(int(name[8:13]) for name in os.listdir(self.path) if name.startswith("segment-") and name.endswith(".seg"))
+
+
+    def load_index(self):
+        """Replay index.jsonl (later lines win), rebuilding it from the segments if it is missing"""
+
+        if not os.path.isfile(self.index_path):
+            return self.rebuild_index()
+
+        index = {}
+        with open(self.index_path) as index_file:
+            for line in index_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Line cut short by a crash, the previous record of the model stays in use
+
+                if entry.get("deleted"):
+                    index.pop(entry["model"], None)
+                else:
+                    index[entry["model"]] = entry
+
+        return index
+
+
+    def rebuild_index(self):
+        """
+        Scan all segments for records, the last record of a model wins and a tombstone removes the model
+            -- a torn or damaged record (e.g. cut short by a crash) is skipped, the scan resumes at the next record header
+        """
+
+        index = {}
+        for segment in self.segment_numbers():
+            with open(self.segment_path(segment), "rb") as segment_file:
+                content = segment_file.read()
+
+            offset = 0
+            while offset + self.HEADER.size <= len(content):
+                record = self.read_record(content, offset)
+                if record is None:
+                    offset = self.next_header(content, offset + 1)
+                    continue
+
+                model, magic, data_offset, length, size, checksum = record
+                if magic == self.TOMBSTONE:
+                    index.pop(model, None)
+                else:
+                    index[model] = {"model": model, "segment": segment, "offset": data_offset, "length": length,
+                                    "size": size, "checksum": checksum}
+                offset = data_offset + length
+
+        with open(self.index_path, "w") as index_file:
+            for entry in index.values():
+                index_file.write(json.dumps(entry) + "\n")
+
+        return index
+
+
+    def read_record(self, content, offset):
+        """(model, magic, data offset, length, size, checksum) of the record at offset, None if it is not a whole valid record"""
+
+        magic, id_length, length, size = self.HEADER.unpack_from(content, offset)
+        if magic not in (self.MAGIC, self.TOMBSTONE):
+            return None
+
+        data_offset = offset + self.HEADER.size + id_length
+        if data_offset + length > len(content):
+            return None
+
+        try:
+            model = content[offset + self.HEADER.size:data_offset].decode()
+            if magic == self.TOMBSTONE:
+                return (model, magic, data_offset, 0, 0, None) if length == 0 else None
+
+            data = zlib.decompress(content[data_offset:data_offset + length])
+        except (UnicodeDecodeError, zlib.error):
+            return None
+
+        if len(data) != size:
+            return None
+
+        return model, magic, data_offset, length, size, hashlib.sha256(data).hexdigest()
+
+
+    def next_header(self, content, offset):
+        """Offset of the next record or tombstone header at or after offset, the end of content if there is none"""
+
+        found = [position for position in (content.find(self.MAGIC, offset), content.find(self.TOMBSTONE, offset)) if position != -1]
+        return min(found, default=len(content))
+
+
+    def append(self, record):
+        """Append a record to the current segment, starting a new segment when it is full -> (segment, offset), call with the lock held"""
+
+        path = self.segment_path(self.segment)
+        if os.path.isfile(path) and os.path.getsize(path) + len(record) > self.segment_size:
+            self.segment += 1
+            path = self.segment_path(self.segment)
+
+        with open(path, "ab") as segment_file:
+            offset = segment_file.tell()
+            segment_file.write(record)
+
+        return self.segment, offset
+
+
+    def put(self, model, data):
+        """Add or replace the XML (bytes) of a model"""
+
+        compressed = zlib.compress(data, self.compression)
+
+        with self.lock:
+            self.write(model, data, compressed)
+
+
+    def write(self, model, data, compressed):
+        """Append the record of a model and its index line, call with the lock held"""
+
+        model_id = model.encode()
+        record = self.HEADER.pack(self.MAGIC, len(model_id), len(compressed), len(data)) + model_id + compressed
+        segment, offset = self.append(record)
+
+        entry = {"model": model, "segment": segment, "offset": offset + self.HEADER.size + len(model_id),
+                 "length": len(compressed), "size": len(data), "checksum": hashlib.sha256(data).hexdigest()}
+
+        # The index line is only written once the record is on disk
+        with open(self.index_path, "a") as index_file:
+            index_file.write(json.dumps(entry) + "\n")
+
+        self.index[model] = entry
+
+
+    def put_file(self, model, path):
+        """Add or replace a model from an XML file"""
+
+        with open(path, "rb") as xml_file:
+            self.put(model, xml_file.read())
+
+
+    def get(self, model):
+        """
+        XML of a model
+
+        Return:
+            bytes, None if the model is not stored
+        """
+
+        with self.lock:
+            entry = self.index.get(model)
+            if entry is None:
+                return None
+
+            compressed = self.read(entry)
+
+        return zlib.decompress(compressed)
+
+
+    def read(self, entry):
+        """Compressed data of an index entry, call with the lock held"""
+
+        reader = self.readers.get(entry["segment"])
+        if reader is None:
+            reader = self.readers[entry["segment"]] = open(self.segment_path(entry["segment"]), "rb")
+
+        reader.seek(entry["offset"])
+        return reader.read(entry["length"])
+
+
+    def write_file(self, model, path):
+        """Write the XML of a model to a file, returns False if the model is not stored"""
+
+        data = self.get(model)
+        if data is None:
+            return False
+
+        with open(path, "wb") as xml_file:
+            xml_file.write(data)
+
+        return True
+
+
+    def __contains__(self, model):
+        return model in self.index
+
+
+    def models(self):
+        """Set of all stored models, answered from the in memory index"""
+        with self.lock:
+            return set(self.index)
+
+
+    def entry(self, model):
+        """Index entry of a model: segment, offset, length, size (uncompressed) and checksum (sha256 of the XML)"""
+        return self.index.get(model)
+
+
+    def delete(self, model):
+        """
+        Remove a model, its record is reclaimed by compact()
+            -- a tombstone is appended to the segments, so a rebuilt index does not bring the model back
+        """
+
+        model_id = model.encode()
+
+        with self.lock:
+            if self.index.pop(model, None) is not None:
+                self.append(self.HEADER.pack(self.TOMBSTONE, len(model_id), 0, 0) + model_id)
+                with open(self.index_path, "a") as index_file:
+                    index_file.write(json.dumps({"model": model, "deleted": True}) + "\n")
+
+
+    def compact(self):
+        """
+        Rewrite all live records into new segments, dropping replaced and deleted records
+            -- the lock is held throughout, so a put or delete during compaction waits instead of
+               landing in a segment that is about to be removed
+            -- old segments are only removed once the new index is in place, so an interrupted compaction loses nothing
+        """
+
+        with self.lock:
+            old_segments = self.segment_numbers()
+            self.segment = (old_segments[-1] + 1) if old_segments else 0
+
+            for model, entry in list(self.index.items()):
+                # The compressed bytes are copied as they are, not compressed again
+                compressed = self.read(entry)
+                self.write(model, zlib.decompress(compressed), compressed)
+
+            with open(self.index_path + ".part", "w") as index_file:
+                for entry in self.index.values():
+                    index_file.write(json.dumps(entry) + "\n")
+            os.replace(self.index_path + ".part", self.index_path)
+
+            for reader in self.readers.values():
+                reader.close()
+            self.readers = {}
+
+            for segment in old_segments:
+                os.remove(self.segment_path(segment))
+
+
+    def close(self):
+        """Close the open segment readers"""
+
+        with self.lock:
+            for reader in self.readers.values():
+                reader.close()
+            self.readers = {}
@@ -0,0 +1,216 @@
+from collections import defaultdict
+import threading
+import logging
+import json
+import time
+import re
+import config
+
+"""Instrumentation of the Cypher queries sent by SbmlDatabaseQueries, SbmlDatabase and GraphVisualizer"""
+
+class QueryProfiler():
+    """
+    Records every query sent through a profiled connection or graph:
+    its template (the query with literals replaced by ?), the literal parameters, wall time,
+    number of rows returned and, when the client exposes a result summary, PROFILE db hits.
+
+    Queries slower than the threshold are written to the slow query log as one JSON object per line.
+    report() aggregates all recorded queries per template.
+
+    Methods:
+    ------------
+
+    wrap_connection(connection):
+        Returns a neo4jsbml connection whose queries are recorded.
+
+    run(graph, query):
+        Runs a query on a py2neo graph and records it.
+
+    report():
+        Aggregated statistics per query template, slowest total time first.
+
+    print_report():
+        Prints report() as a table.
+    """
+
+    STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'" + r'|"(?:[^"\\]|\\.)*"')
+    NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+    COMMENT = re.compile(r"//[^\n]*")
+
+    def __init__(self, enabled=config.PROFILE_QUERIES, threshold=config.SLOW_QUERY_THRESHOLD,
+                 log_file=config.SLOW_QUERY_LOG, db_hits=config.PROFILE_DB_HITS):
+        """
+        enabled (bool): queries are only recorded when enabled, otherwise they are passed straight through
+        threshold (float): queries taking longer than this many seconds are written to the slow query log
+        log_file (str): path of the slow query log
+        db_hits (bool): run queries with PROFILE to count database hits, where the client supports it
+        """
+        self.enabled = enabled
+        self.threshold = threshold
+        self.log_file = log_file
+        self.db_hits = db_hits
+        self.lock = threading.Lock()
+        self.statistics = defaultdict(lambda: {"count": 0, "total_time": 0.0, "max_time": 0.0, "rows": 0, "db_hits": 0})
+        self.logger = None
+
+
+    @classmethod
+    def template(cls, query):
+        """
+        Split a query into its template and literal parameters, so the same query
+        for different models is aggregated together
+
+        Return:
+            (str, list): template, literals in order of appearance
+        """
+
+        query = cls.COMMENT.sub("", query)
+        parameters = []
+
+        def replace(match):
+            parameters.append(match.group(0))
+            return "?"
+
+        query = cls.STRING_LITERAL.sub(replace, query)
+        query = cls.NUMBER_LITERAL.sub(replace, query)
+
+        return " ".join(query.split()), parameters
+
+
+    def slow_query_logger(self):
+        """File logger for slow queries, created on the first slow query"""
+
+        if self.logger is None:
+            self.logger = logging.getLogger("biograph.slow_queries")
+            self.logger.setLevel(logging.INFO)
+            self.logger.propagate = False
+            handler = logging.FileHandler(self.log_file)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(handler)
+
+        return self.logger
+
+
+    def record(self, query, seconds, rows, db_hits=None):
+        """Add a finished query to the statistics, and to the slow query log if it took too long"""
+
+        template, parameters = self.template(query)
+
+        with self.lock:
+            statistics = self.statistics[template]
+            statistics["count"] += 1
+            statistics["total_time"] += seconds
+            statistics["max_time"] = max(statistics["max_time"], seconds)
+            statistics["rows"] += rows
+            statistics["db_hits"] += db_hits or 0
+
+        if seconds >= self.threshold:
+            entry = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "template": template, "parameters": parameters,
+                     "seconds": round(seconds, 6), "rows": rows, "db_hits": db_hits}
+            self.slow_query_logger().info(json.dumps(entry))
+
+
+    @staticmethod
+    def count_db_hits(plan):
+        """Sum db hits over a PROFILE plan and all of its children"""
+
+        if not plan:
+            return None
+
+        hits = plan.get("dbHits", plan.get("db_hits", 0))
+        for child in plan.get("children", []):
+            hits += QueryProfiler.count_db_hits(child) or 0
+
+        return hits
+
+
+    def wrap_connection(self, connection):
+        """Returns a connection that records its queries, all other methods are passed to the original connection"""
+        return ProfiledConnection(connection, self)
+
+
+    def run(self, graph, query, parameters=None):
+        """
+        Profiled replacement for py2neo graph.run(query)
+            -- records are streamed, the query is recorded once the caller has read all of them
+
+        Return:
+            generator of py2neo records
+        """
+
+        if not self.enabled:
+            yield from graph.run(query, parameters)
+            return
+
+        profile = self.db_hits and not query.lstrip().upper().startswith(("PROFILE", "EXPLAIN"))
+
+        start = time.perf_counter()
+        cursor = graph.run(("PROFILE " if profile else "") + query, parameters)
+
+        rows = 0
+        for record in cursor:
+            rows += 1
+            yield record
+
+        db_hits = self.count_db_hits(cursor.summary().get("profile")) if profile else None
+        self.record(query, time.perf_counter() - start, rows, db_hits)
+
+
+    def report(self):
+        """
+        Aggregated statistics of all recorded queries
+
+        Return:
+            list[dict] -> one dict per template: template, count, total_time, mean_time, max_time, rows, db_hits
+        """
+
+        with self.lock:
+            report = [dict(statistics, template=template, mean_time=statistics["total_time"] / statistics["count"])
+                      for template, statistics in self.statistics.items()]
+
+        return sorted(report, key=lambda x: x["total_time"], reverse=True)
+
+
+    def print_report(self, limit=20):
+        """Print the most expensive query templates"""
+
+        print(f"{'count':>7} {'total s':>9} {'mean s':>9} {'max s':>9} {'rows':>9} {'db hits':>10}  template")
+        for entry in self.report()[:limit]:
+            print(f"{entry['count']:>7} {entry['total_time']:>9.3f} {entry['mean_time']:>9.4f} {entry['max_time']:>9.4f} "
+                  f"{entry['rows']:>9} {entry['db_hits']:>10}  {entry['template'][:120]}")
+
+
+    def reset(self):
+        """Forget all recorded statistics"""
+        with self.lock:
+            self.statistics.clear()
+
+
+class ProfiledConnection():
+    """Wraps a neo4jsbml connection, recording every call to query()"""
+
+    def __init__(self, connection, profiler):
+        self.connection = connection
+        self.profiler = profiler
+
+    def query(self, value, expect_data=True, **kwargs):
+        """
+        Same as the neo4jsbml connection query
+            -- neo4jsbml only returns records, so db hits are not available here
+        """
+
+        if not self.profiler.enabled:
+            return self.connection.query(value, expect_data=expect_data, **kwargs)
+
+        start = time.perf_counter()
+        result = self.connection.query(value, expect_data=expect_data, **kwargs)
+        self.profiler.record(value, time.perf_counter() - start, len(result) if result else 0)
+
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+
+# Shared by all components, so a single report covers the whole application
+query_profiler = QueryProfiler()
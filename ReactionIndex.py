@@ -0,0 +1,208 @@
+from collections import deque
+import config
+
+"""Precomputed reaction network index used by SbmlDatabaseQueries for species conversion path queries"""
+
+class ReactionNetworkIndex():
+    """
+    Holds the reaction network of every model as species -> [(reaction, product)] adjacency lists,
+    together with the set of species reachable from each species within max_depth reactions.
+    Paths are followed through (Species)-[:IS_REACTANT]->(Reaction)-[:HAS_PRODUCT]->(Species) chains.
+
+    The reachability sets let impossible conversions be rejected without any search, and the
+    adjacency lists replace variable length Cypher queries with a breadth first search in memory.
+
+    Methods:
+    ------------
+
+    refresh(model_id):
+        Re-reads the reaction network of a model and recomputes its reachability.
+
+    drop(model_id):
+        Removes a model from the index.
+
+    can_convert(model_id, source, target):
+        Check if a species can be converted into another within a model.
+
+    shortest_path(source, target, model_id, max_depth, max_fanout):
+        Shortest reaction path between two species within or across models.
+    """
+
+    def __init__(self, connection, max_depth=config.PATH_MAX_DEPTH):
+        """Connection from creating sbmldatabase is passed and reused"""
+        self.connection = connection
+        self.max_depth = max_depth
+        self.networks = {}  # model_id -> {species: [(reaction, product)]}
+        self.reachable = {}  # model_id -> {species: frozenset(species reachable within max_depth)}
+        self.complete = False  # True once every model in the database has been indexed
+        self.corpus = None  # combined adjacency lists of all models, see corpus_network()
+
+
+    def query_networks(self, model_id=None):
+        """Query reactant -> reaction -> product triples of one model, or of all models"""
+
+        where = "WHERE s.tag = $tag" if model_id is not None else ""
+
+        query = f"""
+                MATCH (s:Species)-[:IS_REACTANT]->(r:Reaction)-[:HAS_PRODUCT]->(p:Species)
+                {where}
+                RETURN s.tag AS tag, s.id AS reactant, r.id AS reaction, p.id AS product
+                """
+
+        kwargs = {} if model_id is None else {"parameters": {"tag": model_id}}
+        result = self.connection.query(query, expect_data=True, **kwargs)
+
+        networks = {}
+        for record in result or []:
+            network = networks.setdefault(record["tag"], {})
+            network.setdefault(record["reactant"], []).append((record["reaction"], record["product"]))
+
+        return networks
+
+
+    def index_network(self, model_id, network):
+        """Store a model's adjacency lists and compute the species reachable from each species"""
+
+        for steps in network.values():
+            steps.sort()
+
+        reachable = {}
+        for species in network:
+            seen = {species}
+            frontier = [species]
+
+            for _ in range(self.max_depth):
+                frontier = [product for current in frontier for _, product in network.get(current, ()) if product not in seen]
+                seen.update(frontier)
+                if not frontier:
+                    break
+
+            seen.discard(species)
+            reachable[species] = frozenset(seen)
+
+        self.networks[model_id] = network
+        self.reachable[model_id] = reachable
+        self.corpus = None
+
+
+    def refresh(self, model_id):
+        """Called after a model is imported, so its index always matches the database"""
+        network = self.query_networks(model_id).get(model_id, {})
+        self.index_network(model_id, network)
+        self.complete = False  # The database changed, ensure_all() checks it again
+
+
+    def drop(self, model_id):
+        """Called after a model is deleted"""
+        self.networks.pop(model_id, None)
+        self.reachable.pop(model_id, None)
+        self.corpus = None
+        self.complete = False
+
+
+    def ensure_model(self, model_id):
+        """Index a model imported before this index existed (e.g. in a previous session)"""
+        if model_id not in self.networks:
+            self.refresh(model_id)
+
+
+    def ensure_all(self):
+        """Index every model in the database with a single query"""
+        if self.complete:
+            return
+
+        for model_id, network in self.query_networks().items():
+            if model_id not in self.networks:
+                self.index_network(model_id, network)
+
+        self.complete = True
+
+
+    def can_convert(self, model_id, source, target):
+        """True if target is reachable from source within max_depth reactions of the model"""
+        self.ensure_model(model_id)
+        return target in self.reachable[model_id].get(source, ())
+
+
+    def corpus_network(self):
+        """
+        Adjacency lists of all indexed (non merged) models combined: species -> [(reaction, product, model_id)]
+            -- species are matched across models by id
+            -- rebuilt lazily after a model is refreshed or dropped
+        """
+
+        if self.corpus is None:
+            corpus = {}
+            for model_id in sorted(self.networks):
+                if "-" in model_id: continue
+
+                for species, steps in self.networks[model_id].items():
+                    corpus.setdefault(species, []).extend((reaction, product, model_id) for reaction, product in steps)
+
+            self.corpus = corpus
+
+        return self.corpus
+
+
+    def shortest_path(self, source, target, model_id=None, max_depth=config.PATH_MAX_DEPTH, max_fanout=config.PATH_MAX_FANOUT):
+        """
+        Breadth first search over the reaction network of a model, or of all models when model_id is None
+            -- across models, a path may continue in any model that contains the current species
+            -- at most max_fanout reactions are followed from each species
+            -- within a model, the reachability index rules out impossible conversions without searching
+
+        Return:
+            list[tuple()] -> [(reactant, reaction, product, model_id)] for each step, None if no path was found
+        """
+
+        if source == target:
+            return []
+
+        if model_id is not None:
+            self.ensure_model(model_id)
+
+            # Reachability is only exact up to the depth the index was built with
+            if max_depth <= self.max_depth and not self.can_convert(model_id, source, target):
+                return None
+
+            network = {species: [(reaction, product, model_id) for reaction, product in steps]
+                       for species, steps in self.networks[model_id].items()}
+        else:
+            self.ensure_all()
+            network = self.corpus_network()
+
+        parents = {source: None}
+        frontier = deque([(source, 0)])
+
+        while frontier:
+            species, depth = frontier.popleft()
+            if depth >= max_depth:
+                continue
+
+            for reaction, product, step_model in network.get(species, [])[:max_fanout]:
+                if product in parents:
+                    continue
+
+                parents[product] = (species, reaction, step_model)
+
+                if product == target:
+                    return self.build_path(parents, target)
+
+                frontier.append((product, depth + 1))
+
+        return None
+
+
+    @staticmethod
+    def build_path(parents, target):
+        """Walk back from target to source through the breadth first search parents"""
+
+        path = []
+        species = target
+
+        while parents[species] is not None:
+            reactant, reaction, model_id = parents[species]
+            path.append((reactant, reaction, species, model_id))
+            species = reactant
+
+        return path[::-1]
@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+from QueryProfiler import query_profiler
+import neo4j
+import time
+import config
+
+"""Concurrent, read-replica routed execution of the read only queries in SbmlDatabaseQueries"""
+
+class ReadQueryExecutor():
+    """
+    Runs read only queries on a thread pool through a routing (neo4j://) driver in READ access mode,
+    so a cluster spreads them over its followers/read replicas while writes made by SbmlDatabase
+    through the neo4jsbml connection stay on the leader.
+
+    query() has the same signature as the neo4jsbml connection query, so the executor can be
+    used anywhere a connection is only used for reading.
+
+    Reads may briefly lag behind writes on a replica, so anything that has to see a model
+    straight after it is imported (e.g. the reaction index refresh) should use the connection.
+
+    Methods:
+    ------------
+
+    query(value, expect_data, parameters):
+        Run a read query on a follower and return its records.
+
+    submit(function, *args):
+        Run a function on the read thread pool, returns a Future.
+
+    map(function, iterable):
+        Run a function for every item on the read thread pool, results in order.
+    """
+
+    def __init__(self, pool, threads=config.READ_QUERY_THREADS):
+        """Pool is the shared Neo4jConnectionPool, its routing driver is used for all reads"""
+        self.pool = pool
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="neo4j-read")
+
+
+    def query(self, value, expect_data=True, parameters=None):
+        """
+        Run a read query in READ access mode
+            -- records are returned as dicts, like the neo4jsbml connection
+            -- parameters (dict) are passed to the server, not pasted into the query
+            -- PROFILE db hits are recorded when profiling with config.PROFILE_DB_HITS
+
+        Return:
+            list[dict]: records of the query
+        """
+
+        profile = query_profiler.enabled and query_profiler.db_hits
+        start = time.perf_counter()
+
+        with self.pool.driver().session(database=self.pool.database, default_access_mode=neo4j.READ_ACCESS) as session:
+            result = session.run(("PROFILE " if profile else "") + value, parameters)
+            records = [record.data() for record in result]
+            summary = result.consume()
+
+        if query_profiler.enabled:
+            db_hits = query_profiler.count_db_hits(summary.profile) if profile else None
+            query_profiler.record(value, time.perf_counter() - start, len(records), db_hits)
+
+        return records if expect_data else None
+
+
+    def submit(self, function, *args, **kwargs):
+        """Run any read only function (e.g. a search) in the background"""
+        return self.executor.submit(function, *args, **kwargs)
+
+
+    def map(self, function, iterable):
+        """Run a read only function for many inputs at once, results are returned in input order"""
+        return list(self.executor.map(function, iterable))
+
+
+    def shutdown(self):
+        """Wait for running queries and stop the thread pool"""
+        self.executor.shutdown(wait=True)
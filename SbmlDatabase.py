@@ -1,6 +1,13 @@
-from neo4jsbml import arrows, connect, sbml
+from neo4jsbml import arrows, sbml
 from BiomodelsDownloader import BiomodelsDownloader
 from SbmlDatabaseQueries import SbmlDatabaseQueries
+from ConnectionPool import Neo4jConnectionPool
+from InMemoryBackend import InMemorySbmlBackend
+from ModelStore import ModelStore
+from contextlib import contextmanager
+import tempfile
+import config
+import json
 import os
 
 
@@ -29,6 +36,9 @@ class SbmlDatabase:
     import_models(model_list):
         Imports multiple SBML models into Neo4j.
 
+    map_model(path_model, tag), replace_models(mapped_models):
+        Mapping and batched writing of models, the two stages of import used by ImportPipeline.
+
     check_model_exists(model_id):
         Check if database contains a model.
 
@@ -47,11 +57,26 @@ class SbmlDatabase:
     search_compound_in_compartment(compound, compartment):
         Finds models that contains specific species in a specific compartment.
 
+    find_reaction_path(source, target, model_id):
+        Finds the shortest reaction path converting one species into another.
+
+    find_all_models(skip, limit):
+        Finds all models, or a page of models, in the database.
+
+    find_models_page(after, page_size):
+        Finds one page of models in the database, used by the GUI's model list.
+
+    iter_all_models(page_size, after):
+        Iterates over all models in the database page by page.
+
+    iter_similar(model_id, models, engine):
+        Yields the similarity of every model as soon as it is scored, used by the GUI to stream results.
+
     change_schema(modelisation_path):
         Change schema that converts sbml to graphs
     """
     
-    def __init__(self, config_path, folder, modelisation_path):
+    def __init__(self, config_path, folder, modelisation_path, backend=config.DATABASE_BACKEND):
         """
         Initializes Database with the provided configuration.
         
@@ -63,13 +88,35 @@ class SbmlDatabase:
             Directory where the SBML models are stored.
         modelisation_path : str
             Path to the JSON file defining the chema/modelisation.
+        backend : str
+            "neo4j" stores models in the configured Neo4j server,
+            "memory" keeps them in process (refer to InMemoryBackend.InMemorySbmlBackend), no server is needed
         """
         self.config_path = config_path
         self.folder = folder
         self.modelisation_path = modelisation_path
-        self.connection = connect.Connect.from_config(path=config_path) # Connection object to interact with the Neo4j database.
+        self.backend = backend
         self.arr = arrows.Arrows.from_json(path=modelisation_path)
-        self.sbmlQueries = SbmlDatabaseQueries(connection=self.connection)
+        self.labels = self.schema_labels(modelisation_path)
+
+        if backend == "memory":
+            self.pool = None
+            self.connection = None
+            self.sbmlQueries = InMemorySbmlBackend(modelisation_path)
+        else:
+            self.pool = Neo4jConnectionPool.from_config(config_path) # Shared with every other component using the same config file
+            self.connection = self.pool.connection() # Connection object to interact with the Neo4j database.
+            self.sbmlQueries = SbmlDatabaseQueries(connection=self.connection, pool=self.pool)
+
+    @staticmethod
+    def schema_labels(modelisation_path):
+        """Node labels of a schema, every imported node has one of them"""
+
+        try:
+            with open(modelisation_path) as schema:
+                return sorted({label for node in json.load(schema)["nodes"] for label in node["labels"]})
+        except (OSError, ValueError, KeyError, TypeError):
+            return []
 
     def load_and_import_model(self, model_id, path=False) -> None:
         """
@@ -89,21 +136,113 @@ class SbmlDatabase:
             print(f"Deleting old model {model_id}")
 
         # ADD NEW MODELS
+        tag = model_id 
         if not path:
-            path_model = self.folder + "/" + model_id + ".xml"
+            with self.model_file(model_id) as path_model:
+                self.import_sbml(path_model, tag)
         else:
-            path_model = model_id 
+            self.import_sbml(model_id, tag)
+
+        self.sbmlQueries.refresh_model_index(tag)
+
+
+    @contextmanager
+    def model_file(self, model_id):
+        """
+        Path of the XML of a downloaded model, for the SBML readers that need a file
+            - models in the ModelStore of the folder are written to a temporary file, removed afterwards
+            - otherwise the loose XML file in the folder is used
+        """
+
+        store_path = os.path.join(self.folder, config.MODEL_STORE_FOLDER)
+        store = ModelStore.from_folder(self.folder) if config.MODEL_STORE and os.path.isdir(store_path) else None
+
+        if store is None or model_id not in store:
+            yield os.path.join(self.folder, model_id + ".xml")
+            return
+
+        handle, path_model = tempfile.mkstemp(prefix=model_id + "-", suffix=".xml")
+        os.close(handle)
+        try:
+            store.write_file(model_id, path_model)
+            yield path_model
+        finally:
+            os.remove(path_model)
+
+
+    def import_sbml(self, path_model, tag) -> None:
+        """
+        Maps an SBML file to a graph with the current schema and adds it under a tag
+            - a second file imported under the same tag is merged into the same graph
+        """
+
+        self.sbmlQueries.invalidate_model(tag)
+        self.write_models([(tag, self.map_model(path_model, tag))])
+
+
+    def map_model(self, path_model, tag):
+        """
+        Maps an SBML file to a graph with the current schema, without touching the database
+            - safe to call from several threads at once (used by ImportPipeline)
+
+        Return:
+            graph to be passed to write_models()
+        """
+
+        if self.backend == "memory":
+            return self.sbmlQueries.map_sbml(path_model, tag)
 
-        tag = model_id 
         sbm = sbml.SbmlToNeo4j.from_sbml(path=path_model, tag=tag)
 
         # Mapping sbml to graph
         nod = sbm.format_nodes(nodes=self.arr.nodes)
         rel = sbm.format_relationships(relationships=self.arr.relationships)
 
-        # Import graph into Neo4j
-        self.connection.create_nodes(nodes=nod)
-        self.connection.create_relationships(relationships=rel)
+        return nod, rel
+
+
+    def write_models(self, mapped_models) -> None:
+        """
+        Writes graphs returned by map_model() to the database
+            - mapped_models is a list of (tag, graph)
+            - all nodes are created before any relationship, so several models are written with one create call each
+        """
+
+        if self.backend == "memory":
+            for tag, graph in mapped_models:
+                self.sbmlQueries.add_graph(graph, tag)
+            return
+
+        nodes = [node for _, (nod, _) in mapped_models for node in nod]
+        relationships = [relationship for _, (_, rel) in mapped_models for relationship in rel]
+
+        # Import graph into Neo4j, the labels of the schema are indexed on their tag first
+        self.sbmlQueries.ensure_tag_indexes(self.labels)
+        self.connection.create_nodes(nodes=nodes)
+        self.connection.create_relationships(relationships=relationships)
+
+
+    def replace_models(self, mapped_models) -> None:
+        """
+        Writes a batch of mapped models, replacing older versions of the same models
+            - a single delete query for the whole batch instead of check/delete per model
+        """
+
+        tags = [tag for tag, _ in mapped_models]
+
+        if self.backend == "memory":
+            for tag in tags:
+                self.sbmlQueries.delete_model(tag)
+        else:
+            tag_list = ", ".join(f'"{tag}"' for tag in tags)
+            self.connection.query(f"""MATCH (n) WHERE n.tag IN [{tag_list}] DETACH DELETE n""", expect_data=False)
+            for tag in tags:
+                self.sbmlQueries.invalidate_model(tag)
+
+        self.write_models(mapped_models)
+
+        for tag in tags:
+            self.sbmlQueries.refresh_model_index(tag)
 
 
     def merge_biomodels(self, model_id1, model_id2) -> None:
@@ -126,27 +265,11 @@ class SbmlDatabase:
             self.delete_model(tag)
             print(f"Deleting old model {tag}")
 
-        # Specify location of two graphs
-        path_model1 = self.folder + "/" + model_id1 + ".xml"
-        path_model2 = self.folder + "/" + model_id2 + ".xml"
-
-        # Mapping sbml to model1
-        sbm = sbml.SbmlToNeo4j.from_sbml(path=path_model1, tag=tag)
-        nod = sbm.format_nodes(nodes=self.arr.nodes)
-        rel = sbm.format_relationships(relationships=self.arr.relationships)
-
-        # Import graph1 into Neo4j
-        self.connection.create_nodes(nodes=nod)
-        self.connection.create_relationships(relationships=rel)
-
-        # Mapping sbml to model2
-        sbm = sbml.SbmlToNeo4j.from_sbml(path=path_model2, tag=tag)   
-        nod = sbm.format_nodes(nodes=self.arr.nodes)
-        rel = sbm.format_relationships(relationships=self.arr.relationships)
-
-        # Import graph2 into Neo4j
-        self.connection.create_nodes(nodes=nod)
-        self.connection.create_relationships(relationships=rel)
+        # Map and import both models under the merged tag
+        with self.model_file(model_id1) as path_model1, self.model_file(model_id2) as path_model2:
+            self.import_sbml(path_model1, tag)
+            self.import_sbml(path_model2, tag)
+        self.sbmlQueries.refresh_model_index(tag)
 
         return tag
 
@@ -176,16 +299,21 @@ class SbmlDatabase:
         Queries database to delete a model based on tag
             - deletes all nodes and relationships belonging to a node
         """
+        if self.backend == "memory":
+            self.sbmlQueries.delete_model(model_id)
+            return
+
         query = f"""MATCH (n) WHERE n.tag="{model_id}" DETACH DELETE n"""
         self.connection.query(query, expect_data=False)
+        self.sbmlQueries.invalidate_model(model_id)
         
     
-    def compare_models(self, model_id1, model_id2) -> int:
+    def compare_models(self, model_id1, model_id2, engine="cypher") -> int:
         """
         Returns accuracy score percentage based on similarity between models
             - Refer to SbmlDatabaseQueries.compare_models() for implementation details
         """
-        accuracy = self.sbmlQueries.compare_models(model_id1=model_id1, model_id2=model_id2)
+        accuracy = self.sbmlQueries.compare_models(model_id1=model_id1, model_id2=model_id2, engine=engine)
         return accuracy
     
 
@@ -228,27 +356,73 @@ class SbmlDatabase:
 
         print("Schema changed to", modelisation_path)
         self.arr = arrows.Arrows.from_json(path=modelisation_path)
+        self.labels = self.schema_labels(modelisation_path)
 
+        if self.backend == "memory":
+            self.sbmlQueries.change_schema(modelisation_path)
 
-    def find_all_models(self) -> list:
+
+    def find_reaction_path(self, source, target, model_id=None) -> list:
+        """
+            Returns the shortest chain of reactions converting species source into species target
+                -- returns a list of steps (reactant, reaction, product, model_id), None if not convertible
+                -- without a model_id, the path may cross between models
+            - Refer to SbmlDatabaseQueries.find_reaction_path() for implementation details
+        """
+        path = self.sbmlQueries.find_reaction_path(source, target, model_id=model_id)
+        return path
+
+
+    def find_all_models(self, skip=0, limit=-1) -> list:
         """
-            Returns list of all models in database
+            Returns list of all models in database, optionally a single page of it
             - Refer to SbmlDatabaseQueries.find_all_models() for implementation details
         """
-        all_models = self.sbmlQueries.find_all_models()
+        all_models = self.sbmlQueries.find_all_models(skip=skip, limit=limit)
         return all_models
 
 
-    def find_all_similar(self, model_id, MODEL_LIMIT=-1) -> tuple:
+    def find_models_page(self, after=None, page_size=config.MODELS_PAGE_SIZE) -> list:
+        """
+            Returns one page of models in tag order, the page after the tag after
+            - Refer to SbmlDatabaseQueries.find_models_page() for implementation details
+        """
+        return self.sbmlQueries.find_models_page(after=after, page_size=page_size)
+
+
+    def iter_all_models(self, page_size=config.MODELS_PAGE_SIZE, after=None):
+        """
+            Generator over all models in database, fetched page by page
+            - Refer to SbmlDatabaseQueries.iter_all_models() for implementation details
+        """
+        return self.sbmlQueries.iter_all_models(page_size=page_size, after=after)
+
+
+    def find_all_similar(self, model_id, MODEL_LIMIT=-1, engine=config.SIMILARITY_ENGINE) -> tuple:
         """
             Returns list of models that have the highest similartiy with a model provided
                 -- returns a list of tuples containing (model_id, accuracy)
+                -- engine is "cypher" or "wl" (Weisfeiler-Lehman graph kernel)
             - Refer to SbmlDatabaseQueries.find_all_similar() for implementation details
         """
-        similar_models = self.sbmlQueries.find_all_similar(model_id=model_id, MODEL_LIMIT=MODEL_LIMIT)
+        similar_models = self.sbmlQueries.find_all_similar(model_id=model_id, MODEL_LIMIT=MODEL_LIMIT, engine=engine)
         return similar_models
 
 
+    def similarity_candidates(self) -> list:
+        """Returns the models a model is compared against by find_all_similar(), merged models are left out"""
+        return self.sbmlQueries.similarity_candidates()
+
+
+    def iter_similar(self, model_id, models=None, engine=config.SIMILARITY_ENGINE):
+        """
+            Yields (model_id, accuracy) for every model as soon as its comparison completes, used to stream results
+                -- models defaults to similarity_candidates()
+            - Refer to SbmlDatabaseQueries.iter_similar() for implementation details
+        """
+        return self.sbmlQueries.iter_similar(model_id, models=models, engine=engine)
+
+
 if __name__ == "__main__":
 
     # These models are all downloaded from the biomodels database
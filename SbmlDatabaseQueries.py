@@ -1,3 +1,7 @@
+from concurrent.futures import Future, as_completed
+from SimilarityEngine import WLSimilarityEngine, TopK
+from ReactionIndex import ReactionNetworkIndex
+from ReadQueryExecutor import ReadQueryExecutor
 import config
 
 """Helper Class to SbmlDatabse, Handles all query functions for class"""
@@ -21,11 +25,35 @@ class SbmlDatabaseQueries():
     
     search_compound_in_compartment(compound, compartment):
         Finds models that contains specific species in a specific compartment.
+
+    find_all_models(skip, limit):
+        Finds a page of models in the database.
+
+    find_reaction_path(source, target, model_id):
+        Finds the shortest reaction path converting one species into another.
+
+    iter_all_models(page_size, after):
+        Iterates over all models in the database page by page.
+
+    ensure_tag_indexes(labels):
+        Creates the tag index of every node label, before models are imported.
+
+    iter_similar(model_id, models, engine):
+        Yields the similarity of every model as soon as its comparison completes.
     """
 
-    def __init__(self, connection):
-        """Connection from creating sbmldatabase is passed and reused"""
+    def __init__(self, connection, pool=None):
+        """
+        Connection from creating sbmldatabase is passed and reused
+            -- with the connection pool, read only queries run concurrently through a ReadQueryExecutor
+               that routes them to read replicas, otherwise they use the connection
+        """
         self.connection = connection
+        self.reader = ReadQueryExecutor(pool) if pool is not None and config.ROUTE_READ_QUERIES else None
+        self.labels = None  # Node labels of the database, read once
+        self.indexed_labels = set()  # Labels whose tag index was created by this process
+        self.wl_engine = WLSimilarityEngine(connection=self.reader or connection, labels=self.tag_labels)
+        self.reaction_index = ReactionNetworkIndex(connection=connection)
     
         
     def check_model_exists(self, model_id):
@@ -40,6 +68,7 @@ class SbmlDatabaseQueries():
 
         query = f"""MATCH (n) WHERE n.tag="{model_id}" RETURN (n)"""
         
+        # Checked on the leader, as it is used straight after imports and deletes
         result = self.connection.query(query, expect_data=True)
         
         # Empty results -- not found
@@ -48,7 +77,102 @@ class SbmlDatabaseQueries():
         
         return True
     
-    def compare_models(self, model_id1, model_id2):
+    def read(self, query, parameters=None):
+        """
+        Run a read only query, on a read replica when a read executor is available
+            -- values from users or other queries are passed as parameters, not pasted into the query
+        """
+
+        kwargs = {} if parameters is None else {"parameters": parameters}
+
+        if self.reader is not None:
+            return self.reader.query(query, expect_data=True, **kwargs)
+
+        return self.connection.query(query, expect_data=True, **kwargs)
+
+
+    def tag_labels(self):
+        """Node labels in the database, the nodes of a model are found through the tag index of each label"""
+
+        if not self.labels: # Read again while the database is empty
+            self.labels = sorted(record["label"] for record in self.read("CALL db.labels() YIELD label RETURN label"))
+
+        return self.labels
+
+
+    def ensure_tag_indexes(self, labels):
+        """
+        Create an index on the tag of every label that is not indexed yet, called before models are written
+            -- nodes of a model are then found through these indexes instead of a scan of every node
+            -- each label is only sent to the server once per process
+        """
+
+        for label in labels:
+            if label not in self.indexed_labels:
+                index_name = "tag_" + "".join(c if c.isalnum() else "_" for c in label)
+                self.connection.query(f"CREATE INDEX {index_name} IF NOT EXISTS FOR (n:`{label}`) ON (n.tag)", expect_data=False)
+                self.indexed_labels.add(label)
+
+        if self.labels:
+            self.labels = sorted(set(self.labels) | set(labels))
+
+
+    def submit_read(self, function, *args, **kwargs):
+        """
+        Run a read only method (e.g. search_for_compund) in the background
+
+        Return:
+            Future: result of the method
+        """
+
+        if self.reader is None:
+            future = Future()
+            future.set_result(function(*args, **kwargs))
+            return future
+
+        return self.reader.submit(function, *args, **kwargs)
+
+
+    def invalidate_model(self, model_id=None):
+        """Drop anything cached about a model, called when a model is imported again or deleted"""
+        self.wl_engine.invalidate(model_id)
+
+        if model_id is not None:
+            self.reaction_index.drop(model_id)
+
+
+    def refresh_model_index(self, model_id):
+        """Rebuild the precomputed indexes of a model, called after a model is imported"""
+        self.reaction_index.refresh(model_id)
+
+
+    def find_reaction_path(self, source, target, model_id=None, max_depth=config.PATH_MAX_DEPTH, max_fanout=config.PATH_MAX_FANOUT):
+        """
+        Finds the shortest chain of reactions that converts one species into another
+            -- species are followed through IS_REACTANT and HAS_PRODUCT relationships
+            -- model_id limits the search to one model, otherwise a path may cross between models
+            -- max_depth is the maximum number of reactions, max_fanout the maximum reactions followed per species
+            -- refer to ReactionIndex.ReactionNetworkIndex for the precomputed index
+
+        Return:
+            list[tuple()] -> [(reactant, reaction, product, model_id)] for each step, None if not convertible
+        """
+
+        return self.reaction_index.shortest_path(source, target, model_id=model_id, max_depth=max_depth, max_fanout=max_fanout)
+
+
+    def can_convert(self, source, target, model_id):
+        """
+        Check if a species can be converted into another within a model, answered from the reachability index
+
+        Return:
+            bool: True if target is reachable from source within config.PATH_MAX_DEPTH reactions
+        """
+
+        return self.reaction_index.can_convert(model_id, source, target)
+
+
+    def compare_models(self, model_id1, model_id2, engine="cypher"):
         """
         This Graph mathcing algorithm compares the similarity between two biomodels in graph format and returns a similarity score. 
         ONlY WORKS ON NON MERGED GRAPHS
@@ -61,10 +185,15 @@ class SbmlDatabaseQueries():
             6) This is compared by mathing lists of these relationships to each other
             7) The final similarity score is the weighted sum of structure and child nodes similarity
 
+        engine="wl" uses the Weisfeiler-Lehman graph kernel instead -> refer to SimilarityEngine.WLSimilarityEngine
+
         Return:
             int: Similarity score calculation of two models. Accuracy between 0 and 1
         """
 
+        if engine == "wl":
+            return self.wl_engine.compare_models(model_id1, model_id2)
+
         STRUCTURE_WEIGHTING = config.STRCUTURE_WEIGHTING
         CHILDREN_WEIGHTING = config.NODE_WEIGHTING
 
@@ -135,7 +264,7 @@ class SbmlDatabaseQueries():
             RETURN similarity_score
             """
 
-        result = self.connection.query(query, expect_data=True) # this accuracy is not parsed
+        result = self.read(query) # this accuracy is not parsed
         if result == []: return 0
         accuracy = result[0]['similarity_score']
 
@@ -155,7 +284,7 @@ class SbmlDatabaseQueries():
                 WHERE c.id = "{compartment}"
                 RETURN m
                 """
-        result = self.connection.query(query, expect_data=True)
+        result = self.read(query)
 
         if not result:
             print("No models found")
@@ -182,7 +311,7 @@ class SbmlDatabaseQueries():
                 WHERE s.id = "{compound}"
                 RETURN m
                 """
-        result = self.connection.query(query, expect_data=True)
+        result = self.read(query)
 
         if not result:
             print("No models found")
@@ -210,7 +339,7 @@ class SbmlDatabaseQueries():
                 RETURN m
                 """
 
-        result = self.connection.query(query, expect_data=True)
+        result = self.read(query)
 
         if not result:
             print("No models found")
@@ -224,47 +353,149 @@ class SbmlDatabaseQueries():
         return list(matching_models)
     
 
-    def find_all_models(self):
-        """Returns a list of all models present in the database"""
+    def find_all_models(self, skip=0, limit=-1):
+        """
+        Returns a list of all models present in the database
+            -- DISTINCT, ORDER BY, SKIP and LIMIT are applied by neo4j, so only the requested page is sent back
+            -- merged models share a single tag and are only returned once
+
+        Parameters:
+            skip: number of models (in tag order) to skip
+            limit: maximum number of models to return, -1 returns all models
+        """
 
         query = f"""
-                MATCH (m:Model) Return (m.tag);
+                MATCH (m:Model)
+                RETURN DISTINCT m.tag AS tag
+                ORDER BY tag
+                SKIP {int(skip)}
                 """
 
-        all_models = []
-        result = self.connection.query(query, expect_data=True)
+        if limit != -1:
+            query += f"LIMIT {int(limit)}"
 
-        for model in result:
-            all_models.append(model["(m.tag)"])
+        result = self.read(query)
+
+        if not result:
+            return []
 
-        # Remove merged models whose tag is the same 
-        return sorted(list(set(all_models)))
+        return [model["tag"] for model in result]
 
 
-    def find_all_similar(self, model_id, MODEL_LIMIT=-1):
+    def find_models_page(self, after=None, page_size=config.MODELS_PAGE_SIZE):
+        """
+        Returns the next page of models whose tag comes after a given tag (keyset pagination)
+            -- unlike SKIP, the cost of a page does not grow with how far into the corpus it is
+
+        Parameters:
+            after: tag of the last model of the previous page, None starts from the beginning
+            page_size: maximum number of models in the page, at least 1
+        """
+
+        if int(page_size) < 1:
+            raise ValueError(f"page_size must be at least 1, got {page_size}")
+
+        where = "WHERE m.tag > $after" if after is not None else ""
+
+        query = f"""
+                MATCH (m:Model)
+                {where}
+                RETURN DISTINCT m.tag AS tag
+                ORDER BY tag
+                LIMIT {int(page_size)}
+                """
+
+        result = self.read(query, {"after": after} if after is not None else None)
+
+        if not result:
+            return []
+
+        return [model["tag"] for model in result]
+
+
+    def iter_all_models(self, page_size=config.MODELS_PAGE_SIZE, after=None):
+        """
+        Generator over all models in the database in tag order
+            -- fetches one page at a time, so memory is bounded by page_size
+            -- pass the last tag seen as after to continue an interrupted iteration
+            -- page_size must be at least 1, ValueError otherwise
+        """
+
+        while True:
+            page = self.find_models_page(after=after, page_size=page_size)
+
+            for model in page:
+                yield model
+
+            if len(page) < page_size:
+                return
+
+            after = page[-1]
+
+
+    def similarity_candidates(self):
+        """Models a model is compared against: all models except merged models"""
+        return [model for model in self.iter_all_models() if "-" not in model]
+
+
+    def iter_similar(self, model_id, models=None, engine=config.SIMILARITY_ENGINE):
+        """
+            Scores a model against other models, yielding every score as soon as its comparison completes
+                -- models defaults to similarity_candidates()
+                -- with concurrent reads, comparisons run on the read replicas and arrive in completion order,
+                   find_all_similar() keeps candidate order instead
+                -- closing the iterator early cancels the comparisons that did not start yet
+
+            Yields:
+                tuple -> (model_id, accuracy)
+        """
+
+        if models is None:
+            models = self.similarity_candidates()
+
+        if engine == "wl":
+            for model, accuracy in self.wl_engine.iter_similar(model_id, models):
+                yield model, round(accuracy * 100, 2)
+
+        elif self.reader is not None:
+            # Comparisons are independent, so they run concurrently on the read replicas
+            futures = {self.reader.submit(self.compare_models, model_id, model): model for model in models}
+            try:
+                for future in as_completed(futures):
+                    yield futures[future], round(future.result() * 100, 2)
+            finally:
+                for future in futures:
+                    future.cancel()
+
+        else:
+            for model in models:
+                yield model, round(self.compare_models(model_id, model) * 100, 2)
+
+
+    def find_all_similar(self, model_id, MODEL_LIMIT=-1, engine=config.SIMILARITY_ENGINE):
         """
             1)Queries to find all models in database
             2)Checks accuracy score against all models
-            3)Sorts list based on accuracy
-            4)Returns models with the highest accuracy rating
+            3)Keeps the models with the highest accuracy rating in a heap
+            4)Returns them sorted by accuracy
+
+            engine selects the scorer: "cypher" runs compare_models per model, "wl" scores all models
+            with the cached Weisfeiler-Lehman features
 
             Returns:
                 list[tuple()] -> list of models with their accuracy [(model_id, accuracy)]
         """
 
-        similar_models = []
-        all_models = self.find_all_models()
-
-        # Remove merged models from comparison
-        for model in all_models:    
-            if "-" in model: continue
-
-            accuracy = self.compare_models(model_id, model)
-            similar_models.append((model, round(accuracy * 100, 2)))
-        
-        similar_models = sorted(similar_models, key=lambda x: x[1], reverse=True)
+        if engine != "wl" and self.reader is not None:
+            # Scores are taken in candidate order, not completion order, so ties rank the same on every run
+            models = self.similarity_candidates()
+            accuracies = self.reader.map(lambda model: self.compare_models(model_id, model), models)
+            scores = ((model, round(accuracy * 100, 2)) for model, accuracy in zip(models, accuracies))
+        else:
+            scores = self.iter_similar(model_id, engine=engine)
 
-        if MODEL_LIMIT != -1:
-            return similar_models[:MODEL_LIMIT]
+        top = TopK(MODEL_LIMIT)
+        for model, accuracy in scores:
+            top.push(model, accuracy)
 
-        return similar_models
\ No newline at end of file
+        return top.best()
@@ -0,0 +1,251 @@
+from collections import Counter
+import hashlib
+import heapq
+import threading
+import numpy as np
+import config
+
+"""Graph kernel similarity engine, alternative to the Cypher scorer in SbmlDatabaseQueries.compare_models"""
+
+class WLSimilarityEngine():
+    """
+    Scores model similarity with a Weisfeiler-Lehman subtree kernel.
+    Every model graph is reduced to a histogram of WL subtree labels, so two models only score
+    the same if their species, reactions, kinetic laws AND the way they are wired together match.
+
+    Histograms are computed once per model and cached as sparse vectors over a shared
+    feature vocabulary. Comparing a model against the whole database is then a handful
+    of vectorised dot products instead of one Cypher query per model.
+
+    Methods:
+    ------------
+
+    get_features(model_id):
+        Returns (cached) normalised sparse feature vector of a model.
+
+    invalidate(model_id):
+        Drops cached features of a model, or of all models if no model is provided.
+
+    compare_models(model_id1, model_id2):
+        Calculates similarity between two models.
+
+    find_all_similar(model_id, models):
+        Calculates similarity between a model and a list of models.
+
+    iter_similar(model_id, models):
+        Yields the similarity of every model as soon as it is scored.
+    """
+
+    def __init__(self, connection, iterations=config.WL_ITERATIONS, labels=None):
+        """
+        Connection from creating sbmldatabase is passed and reused
+            -- labels: function returning the node labels of the database, the nodes of a model are then
+               found through the tag index of each label instead of a scan of every node
+        """
+        self.connection = connection
+        self.iterations = iterations
+        self.labels = labels
+        self.vocabulary = {}  # WL label -> column in the sparse vectors
+        self.vocabulary_lock = threading.Lock()  # Models are vectorised from several threads at once
+        self.features = {}  # model_id -> (indices, values) of the normalised feature vector
+
+
+    def fetch_model_graph(self, model_id):
+        """
+        Query the labelled graph of a model: node labels, ids and relationship types
+
+        Return:
+            (dict, list): {node: initial label}, [(source, relationship type, target)]
+        """
+
+        labels = self.labels() if self.labels is not None else []
+        sources = " UNION ".join(f"MATCH (n:`{label}` {{tag: $tag}}) RETURN n" for label in labels) or "MATCH (n {tag: $tag}) RETURN n"
+
+        query = f"""
+            CALL {{ {sources} }}
+            MATCH (n)-[r]->(m)
+            RETURN elementId(n) AS source, labels(n)[0] AS source_label, n.id AS source_id,
+                   type(r) AS type,
+                   elementId(m) AS target, labels(m)[0] AS target_label, m.id AS target_id
+            """
+
+        result = self.connection.query(query, expect_data=True, parameters={"tag": model_id})
+
+        labels = {}
+        edges = []
+
+        for record in result or []:
+            labels[record["source"]] = self.initial_label(record["source_label"], record["source_id"])
+            labels[record["target"]] = self.initial_label(record["target_label"], record["target_id"])
+            edges.append((record["source"], record["type"], record["target"]))
+
+        return labels, edges
+
+
+    @staticmethod
+    def initial_label(label, node_id):
+        """Named entities (species, compartments, ...) keep their id, everything else is only labelled by type"""
+        if label in config.WL_IDENTIFIED_LABELS and node_id is not None:
+            return f"{label}:{node_id}"
+        return str(label)
+
+
+    def compute_histogram(self, labels, edges):
+        """
+        Weisfeiler-Lehman relabelling
+            1) Every node starts with its initial label
+            2) Each iteration, a node's new label is its old label plus the sorted multiset of
+               (direction, relationship type, neighbour label) of all its relationships
+            3) Labels are hashed to keep them short, and counted at every iteration
+
+        Return:
+            Counter: WL label -> number of occurrences
+        """
+
+        neighbours = {node: [] for node in labels}
+        for source, rel_type, target in edges:
+            neighbours[source].append((">", rel_type, target))
+            neighbours[target].append(("<", rel_type, source))
+
+        histogram = Counter(f"0|{label}" for label in labels.values())
+
+        current = labels
+        for iteration in range(1, self.iterations + 1):
+            relabelled = {}
+
+            for node, label in current.items():
+                signature = sorted(f"{direction}{rel_type}{current[other]}" for direction, rel_type, other in neighbours[node])
+                digest = hashlib.blake2b(f"{label}({','.join(signature)})".encode(), digest_size=8).hexdigest()
+                relabelled[node] = digest
+
+            histogram.update(f"{iteration}|{label}" for label in relabelled.values())
+            current = relabelled
+
+        return histogram
+
+
+    def vectorise(self, histogram):
+        """Map a histogram onto the shared vocabulary as a normalised sparse vector (indices, values)"""
+
+        with self.vocabulary_lock: # Two threads must never give the same column to different features
+            indices = np.fromiter((self.vocabulary.setdefault(feature, len(self.vocabulary)) for feature in histogram),
+                                  dtype=np.int64, count=len(histogram))
+        values = np.fromiter(histogram.values(), dtype=np.float64, count=len(histogram))
+
+        norm = np.linalg.norm(values)
+        if norm > 0:
+            values /= norm
+
+        return indices, values
+
+
+    def get_features(self, model_id):
+        """Returns the feature vector of a model, computing and caching it on first use"""
+
+        if model_id not in self.features:
+            labels, edges = self.fetch_model_graph(model_id)
+            self.features[model_id] = self.vectorise(self.compute_histogram(labels, edges))
+
+        return self.features[model_id]
+
+
+    def invalidate(self, model_id=None):
+        """Models that are re-imported or deleted must be recomputed"""
+
+        if model_id is None:
+            self.features.clear()
+        else:
+            self.features.pop(model_id, None)
+
+
+    def dense(self, model_id):
+        """Dense copy of a feature vector, so other models can be scored by indexing into it"""
+
+        indices, values = self.get_features(model_id)
+        vector = np.zeros(len(self.vocabulary))
+        vector[indices] = values
+        return vector
+
+
+    def compare_models(self, model_id1, model_id2):
+        """
+        Cosine similarity of the WL feature histograms of two models
+
+        Return:
+            float: Accuracy between 0 and 1
+        """
+
+        return self.find_all_similar(model_id1, [model_id2])[0][1]
+
+
+    def find_all_similar(self, model_id, models):
+        """
+        Scores a model against a list of models
+
+        Return:
+            list[tuple()] -> list of models with their accuracy [(model_id, accuracy)] in the order provided
+        """
+
+        return list(self.iter_similar(model_id, models))
+
+
+    def iter_similar(self, model_id, models):
+        """
+        Scores a model against a list of models, one model at a time
+            -- the query model is expanded to a dense vector once
+            -- every other model is vectorised when it is reached and scored by a sparse dot product against it
+
+        Yields:
+            (model_id, accuracy) in the order provided
+        """
+
+        query = self.dense(model_id)
+
+        for model in models:
+            indices, values = self.get_features(model)
+            known = indices < len(query)  # Labels first seen after the query model cannot be in it
+            yield model, min(1.0, float(np.dot(query[indices[known]], values[known])))
+
+
+class TopK():
+    """
+    Running top k of a stream of (model, score) pairs, kept in a min-heap of size k.
+    Pairs with equal scores keep the order they arrived in, like a stable sort.
+
+    Methods:
+    ------------
+
+    push(model, score):
+        Offer a pair, returns (kept, evicted model or None).
+
+    best():
+        Kept pairs, highest score first.
+    """
+
+    def __init__(self, k=-1):
+        """k: number of pairs to keep, -1 keeps all"""
+        self.k = k
+        self.heap = []  # (score, -arrival, model), the worst kept pair is heap[0]
+        self.arrivals = 0
+
+
+    def push(self, model, score):
+        entry = (score, -self.arrivals, model)
+        self.arrivals += 1
+
+        if self.k == -1 or len(self.heap) < self.k:
+            heapq.heappush(self.heap, entry)
+            return True, None
+
+        if self.k > 0 and entry > self.heap[0]:
+            return True, heapq.heapreplace(self.heap, entry)[2]
+
+        return False, None
+
+
+    def best(self):
+        return [(model, score) for score, _, model in sorted(self.heap, reverse=True)]
+
+
+    def __len__(self):
+        return len(self.heap)
@@ -0,0 +1,74 @@
+import argparse
+import tempfile
+import shutil
+import time
+from BiomodelsMirror import BiomodelsMirror
+from BiomodelsDownloader import BiomodelsDownloader
+from AsyncBiomodelsDownloader import AsyncBiomodelsDownloader
+import config
+
+"""
+Benchmark of the downloaders against the local BioModels mirror (BiomodelsMirror.py).
+Every run starts from an empty download folder. Run from the project root:
+
+    python -m benchmarks.downloader --models 500 --latency 0.05 --threads 1 4 16 --batch-sizes 1 10 50
+"""
+
+def run_once(downloader_class, mirror, threads, batch_size, models, use_store, rate_limit):
+    """verifiy_models() on an empty folder, returns (seconds, models downloaded, downloads failed)"""
+
+    # The asyncio downloader runs everything on one thread, its concurrency plays the part of the thread count
+    options = {"concurrency": threads, "rate_limit": rate_limit} if downloader_class is AsyncBiomodelsDownloader else {}
+
+    output_dir = tempfile.mkdtemp(prefix="biograph-bench-")
+    downloader = None
+    try:
+        downloader = downloader_class(base_url=mirror.base_url, meta_data_url=mirror.metadata_url, identifiers_url=mirror.identifiers_url,
+                                      threads=threads, output_dir=output_dir, batch_size=batch_size, use_store=use_store, **options)
+        start = time.perf_counter()
+        downloaded = downloader.verifiy_models(models)
+        seconds = time.perf_counter() - start
+        failed = len(downloader.failed_downloads())
+    finally:
+        if downloader is not None and downloader.store is not None:
+            downloader.store.close()
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    return seconds, len(downloaded) - failed, failed
+
+
+def run(arguments):
+    mirror = BiomodelsMirror(latency=arguments.latency, jitter=arguments.jitter, error_rate=arguments.error_rate,
+                             throttle=arguments.throttle, replicate=arguments.models, seed=0)
+
+    downloaders = {"threads": BiomodelsDownloader, "asyncio": AsyncBiomodelsDownloader}
+
+    print(f"{arguments.models} models, latency {arguments.latency}s, error rate {arguments.error_rate}, throttle {arguments.throttle or '-'} req/s")
+    print(f"{'downloader':>10} {'threads':>8} {'batch':>6} {'seconds':>9} {'models/s':>9} {'ok':>6} {'failed':>7} {'requests':>9}")
+
+    with mirror:
+        for name in arguments.downloaders:
+            for threads in arguments.threads:
+                for batch_size in arguments.batch_sizes:
+                    before = sum(mirror.statistics().values())
+                    seconds, ok, failed = run_once(downloaders[name], mirror, threads, batch_size, arguments.models, arguments.store, arguments.rate_limit)
+                    requests = sum(mirror.statistics().values()) - before
+
+                    print(f"{name:>10} {threads:>8} {batch_size:>6} {seconds:>9.2f} {ok / seconds:>9.1f} {ok:>6} {failed:>7} {requests:>9}")
+
+        print(f"requests served: {mirror.statistics()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Downloader throughput against the local BioModels mirror")
+    parser.add_argument("--models", type=int, default=200, help="models to download (fixtures are replicated to reach it)")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, config.DOWNLOADING_THREADS])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, config.DOWNLOAD_BATCH_SIZE])
+    parser.add_argument("--downloaders", nargs="+", default=["threads", "asyncio"], choices=["threads", "asyncio"])
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many extra seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--throttle", type=int, default=0, help="requests per second before 429 responses, 0 for none")
+    parser.add_argument("--rate-limit", type=float, default=0, help="requests per second of the asyncio downloader, 0 for no limit")
+    parser.add_argument("--store", action=argparse.BooleanOptionalAction, default=config.MODEL_STORE, help="write models to the model store")
+    run(parser.parse_args())
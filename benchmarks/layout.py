@@ -0,0 +1,77 @@
+import argparse
+import random
+import time
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import networkx as nx
+from GraphLayout import force_layout, collapse_leaves
+from visualize import GraphVisualizer
+from LayoutCache import LayoutCache
+import tempfile
+import config
+
+"""
+Benchmark of the layout engine (GraphLayout.py) on synthetic model graphs of 1k to 50k nodes.
+Run from the project root:
+
+    python -m benchmarks.layout --nodes 1000 5000 20000 50000
+"""
+
+def model_graph(nodes, leaf_fraction=0.3, seed=0):
+    """
+    Graph shaped like a (merged) SBML model: a scale free core of species, reactions and parameters,
+    with unit and local parameter leaves hanging off it
+    """
+
+    rng = random.Random(seed)
+    core = int(nodes * (1 - leaf_fraction))
+    G = nx.MultiDiGraph(nx.barabasi_albert_graph(core, 2, seed=seed))
+    nx.set_node_attributes(G, "Species", "label")
+
+    for leaf in range(core, nodes):
+        G.add_node(leaf, label=rng.choice(config.LOD_COLLAPSED_LABELS))
+        G.add_edge(rng.randrange(core), leaf, type="HAS")
+
+    return G
+
+
+def time_it(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def run(arguments):
+    print(f"{'nodes':>7} {'edges':>7} {'spring':>8} {'force':>8} {'lod nodes':>10} {'lod+force':>10} {'draw':>8}")
+
+    for nodes in arguments.nodes:
+        G = model_graph(nodes)
+
+        # nx.spring_layout is O(nodes ^ 2) per iteration, only timed while it finishes in reasonable time
+        spring = "-"
+        if nodes <= arguments.spring_limit:
+            try:
+                spring = f"{time_it(nx.spring_layout, G, k=0.5, seed=42)[0]:.2f}"
+            except ImportError:  # above 500 nodes spring_layout needs scipy
+                pass
+        force, _ = time_it(force_layout, G)
+
+        lod, reduced = time_it(collapse_leaves, G)
+        lod_force, _ = time_it(force_layout, reduced)
+
+        # Full draw through GraphVisualizer, with an empty layout cache
+        visualizer = GraphVisualizer(layout_cache=LayoutCache(folder=tempfile.mkdtemp(prefix="biograph-layouts-")))
+        visualizer.model_id = f"synthetic-{nodes}"
+        visualizer.G = G
+        draw, _ = time_it(visualizer.draw_and_style_graph)
+        plt.close("all")
+
+        print(f"{nodes:>7} {G.number_of_edges():>7} {spring:>8} {force:>8.2f} {len(reduced):>10} {lod + lod_force:>10.2f} {draw:>8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Layout and draw time of large model graphs")
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1000, 5000, 10000, 50000])
+    parser.add_argument("--spring-limit", type=int, default=2000, help="largest graph also laid out with nx.spring_layout")
+    run(parser.parse_args())
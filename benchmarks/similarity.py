@@ -0,0 +1,60 @@
+import time
+import sys
+from SbmlDatabase import SbmlDatabase
+import config
+
+"""
+Benchmark of the Weisfeiler-Lehman similarity engine against the Cypher graph matching query.
+Run from the project root against a loaded database:
+
+    python -m benchmarks.similarity BIOMD0000000001
+"""
+
+def timed(function, *args, **kwargs):
+    """Returns (result, seconds taken)"""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def kendall_tau(ranking1, ranking2):
+    """Rank correlation of two rankings over the models they share (1 = same order, -1 = reversed)"""
+
+    position = {model: i for i, model in enumerate(ranking2)}
+    shared = [model for model in ranking1 if model in position]
+
+    concordant = discordant = 0
+    for i in range(len(shared)):
+        for j in range(i + 1, len(shared)):
+            if position[shared[i]] < position[shared[j]]:
+                concordant += 1
+            else:
+                discordant += 1
+
+    pairs = concordant + discordant
+    return (concordant - discordant) / pairs if pairs else 1.0
+
+
+def run(model_id, top_k=config.TOTAL_MATCHING_GRAPHS):
+    database = SbmlDatabase(config.CONFIGURATION_FILE, config.BIOMODELS_DATABASE_FOLDER, config.DEFAULT_SCHEMA)
+
+    cypher, cypher_time = timed(database.find_all_similar, model_id, engine="cypher")
+    wl_cold, wl_cold_time = timed(database.find_all_similar, model_id, engine="wl")
+    wl_warm, wl_warm_time = timed(database.find_all_similar, model_id, engine="wl")
+
+    cypher_ranking = [model for model, _ in cypher]
+    wl_ranking = [model for model, _ in wl_warm]
+    overlap = len(set(cypher_ranking[:top_k]) & set(wl_ranking[:top_k]))
+
+    # Distinct scores show how well each scorer separates models, ties cannot be ranked
+    print(f"Models compared:        {len(cypher)}")
+    print(f"cypher:                 {cypher_time:.3f}s, {len({s for _, s in cypher})} distinct scores")
+    print(f"wl (cold cache):        {wl_cold_time:.3f}s")
+    print(f"wl (warm cache):        {wl_warm_time:.3f}s, {len({s for _, s in wl_warm})} distinct scores")
+    print(f"top {top_k} overlap:         {overlap}/{min(top_k, len(cypher))}")
+    print(f"kendall tau:            {kendall_tau(cypher_ranking, wl_ranking):.3f}")
+    print(f"self match (wl):        {dict(wl_warm).get(model_id)}")
+
+
+if __name__ == "__main__":
+    run(sys.argv[1] if len(sys.argv) > 1 else "BIOMD0000000001")
@@ -0,0 +1,80 @@
+import argparse
+import tempfile
+import shutil
+import time
+import os
+import sys
+import config
+
+"""
+Startup benchmark of the GUI: time until the window is constructed, first painted, the database is ready
+and the background sync finished. Models are synced from the local BioModels mirror (BiomodelsMirror.py)
+into the in memory database, so no Neo4j server or internet connection is needed. Run from the project root:
+
+    python -m benchmarks.startup --models 50 --latency 0.05
+"""
+
+def run(arguments):
+    # Settings are changed before the GUI modules are imported, as they read them on import
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    output_dir = tempfile.mkdtemp(prefix="biograph-startup-")
+
+    from BiomodelsMirror import BiomodelsMirror
+    mirror = BiomodelsMirror(latency=arguments.latency, replicate=arguments.models, seed=0).start()
+
+    config.BIOMODELS_DATABASE = mirror.base_url
+    config.METADATA_URL = mirror.metadata_url
+    config.IDENTIFIERS_URL = mirror.identifiers_url
+    config.BIOMODELS_DATABASE_FOLDER = output_dir
+    config.NUMBER_OF_MODELS_TO_DOWNLOAD_FROM_DATABASE = arguments.models
+    config.DATABASE_BACKEND = arguments.backend
+
+    from PyQt6.QtWidgets import QApplication
+    from PyQt6.QtCore import QObject, QEvent, QTimer
+    from bioGraphGUI import BioGraphGUI
+
+    times = {}
+    start = time.perf_counter()
+    mark = lambda name: times.setdefault(name, time.perf_counter() - start)
+
+    class FirstPaint(QObject):
+        def eventFilter(self, watched, event):
+            if event.type() == QEvent.Type.Paint:
+                mark("first paint")
+            return False
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    window = BioGraphGUI()
+    mark("constructed")
+    paint_filter = FirstPaint()
+    window.installEventFilter(paint_filter)
+
+    # Wrap the startup callbacks of this window to time them
+    database_opened, database_failed = window.database_opened, window.database_failed
+    models_synced, sync_failed = window.models_synced, window.sync_failed
+    window.database_opened = lambda connection: (mark("database ready"), database_opened(connection))
+    window.models_synced = lambda models: (mark("synced"), times.setdefault("models", len(models)), models_synced(models), app.quit())
+    window.database_failed = lambda error: (print(f"database failed: {error}"), database_failed(error), app.quit())
+    window.sync_failed = lambda error: (print(f"sync failed: {error}"), sync_failed(error), app.quit())
+    QTimer.singleShot(int(arguments.timeout * 1000), app.quit)
+
+    window.show()
+    app.exec()
+
+    window.close()
+    mirror.stop()
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+    print(f"{arguments.models} models, latency {arguments.latency}s, {arguments.backend} database")
+    for name in ("constructed", "first paint", "database ready", "synced"):
+        print(f"{name:>15}: {times[name]:8.3f}s" if name in times else f"{name:>15}: -")
+    print(f"{'models synced':>15}: {times.get('models', 0)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time to first paint, database ready and synced of the GUI")
+    parser.add_argument("--models", type=int, default=20, help="models synced from the local mirror")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to every mirror request")
+    parser.add_argument("--backend", default="memory", choices=["memory", "neo4j"], help="database the models are imported into")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds before the benchmark gives up on the sync")
+    run(parser.parse_args())
@@ -1,13 +1,26 @@
 import sys
 import os
+import time
+from contextlib import closing
 from PyQt6.QtWidgets import *
 from PyQt6.QtCore import *
 from PyQt6.QtGui import *
 from SbmlDatabase import SbmlDatabase
 from BiomodelsDownloader import BiomodelsDownloader
-from visualize import GraphVisualizer
+from ImportPipeline import ImportPipeline
+from GraphRenderer import GraphRenderer
+from GuiWorkers import WorkerPool
+from SimilarityEngine import TopK
+from ModelListView import ModelListModel, ModelListView
 import config
 
+class RenderSignals(QObject):
+    """Delivers rendered graphs from the renderer's threads to the GUI thread"""
+    finished = pyqtSignal(str, bytes)  # model, PNG image
+    exported = pyqtSignal(str)  # path of an HTML export
+    failed = pyqtSignal(str, str)  # model, error
+
+
 class BioGraphGUI(QMainWindow):
     
     def __init__(self):
@@ -32,14 +45,28 @@ class BioGraphGUI(QMainWindow):
         self.setGeometry(x, y, window_width, window_height)
 
         self.file_count = 0
-        self.setup_ui()
 
-        # Setup database
-        self.database = SbmlDatabase(config.CONFIGURATION_FILE, config.BIOMODELS_DATABASE_FOLDER, config.DEFAULT_SCHEMA)
-        self.downloader = BiomodelsDownloader(threads=config.DOWNLOADING_THREADS, curatedOnly=config.CURATED_ONLY, output_dir=config.BIOMODELS_DATABASE_FOLDER)
-        self.models = self.downloader.verifiy_models(config.NUMBER_OF_MODELS_TO_DOWNLOAD_FROM_DATABASE)
-        self.database.import_models(self.models)
+        # Database and network calls run on a thread pool, the window never waits for them
+        self.workers = WorkerPool()
+
+        self.setup_ui()
+        self.setup_status_bar()
+
+        # The database is opened, and models synced with BioModels, in the background after the window is shown.
+        # Requests made before the database is ready are queued and run once it is
+        self.database = None
+        self.downloader = None
+        self.models = []
+        self.pending_requests = []
         self.model_ID = "" 
+        QTimer.singleShot(0, self.open_database)
+
+        # Graphs are rendered on worker processes and shown when ready, the GUI is never blocked
+        self.renderer = GraphRenderer(config_file=config.CONFIGURATION_FILE)
+        self.render_signals = RenderSignals()
+        self.render_signals.finished.connect(self.show_graph)
+        self.render_signals.failed.connect(self.show_render_error)
+        self.render_signals.exported.connect(lambda path: QDesktopServices.openUrl(QUrl.fromLocalFile(path)))
 
 
     def setup_ui(self):
@@ -395,6 +422,10 @@ class BioGraphGUI(QMainWindow):
         button.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
         #button.clicked.connect(self.set_id())
         button.clicked.connect(lambda: self.veiwGraph(self.model_ID))
+        export_button = QPushButton("Export HTML")
+        export_button.setStyleSheet(button.styleSheet())
+        export_button.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
+        export_button.clicked.connect(lambda: self.export_graph_html(self.model_ID))
         button2.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
         button2.clicked.connect(self.toggle_widgets)
        
@@ -404,6 +435,7 @@ class BioGraphGUI(QMainWindow):
         else:
             self.file_display_layout.addWidget(self.file_name_label)
             self.file_display_layout.addWidget(button2)
+            self.file_display_layout.addWidget(export_button)
             self.file_display_layout.addWidget(button)
 
         self.file_display.hide()
@@ -418,6 +450,14 @@ class BioGraphGUI(QMainWindow):
         self.content_area.setWidgetResizable(True)
         self.content_area.setWidget(self.content_widget)
 
+        # Lists of models (all models, search results, similar models) only paint the rows in view
+        self.model_list_model = ModelListModel(self.workers)
+        self.model_list_model.error.connect(self.show_error)
+        self.model_list = ModelListView(actions=[("view", "View graph in browser"), ("html", "Export HTML")])
+        self.model_list.setModel(self.model_list_model)
+        self.model_list.action.connect(self.model_list_action)
+        self.model_list.hide()
+
         # style main area
         self.content_area.setStyleSheet("""
             QScrollArea {
@@ -461,6 +501,7 @@ class BioGraphGUI(QMainWindow):
         right_layout.addWidget(self.merge_menu)
         right_layout.addWidget(self.file_display)
         right_layout.addWidget(self.content_area)
+        right_layout.addWidget(self.model_list)
         right_layout.setStretchFactor(search_widget, 0)
         right_layout.setStretchFactor(main_window, 100)
         right_layout.setSpacing(0)
@@ -485,22 +526,154 @@ class BioGraphGUI(QMainWindow):
         self.merge_animation.setDuration(300)
         self.merge_animation.setEasingCurve(QEasingCurve.Type.InOutQuad)
 
+    def setup_status_bar(self):
+        """Database state, sync and similarity search progress, shown at the bottom of the window"""
+
+        self.database_state = QLabel("Connecting to database...")
+        self.sync_progress = QProgressBar()
+        self.sync_progress.setFixedWidth(250)
+        self.sync_progress.setFormat("Syncing models %v/%m")
+        self.sync_progress.hide()
+        self.similar_progress = QProgressBar()
+        self.similar_progress.setFixedWidth(250)
+        self.similar_progress.setFormat("Comparing models %v/%m")
+        self.similar_progress.hide()
+        self.cancel_similar = QPushButton("Stop")
+        self.cancel_similar.clicked.connect(self.stop_similar_search)
+        self.cancel_similar.hide()
+        self.reconnect_database = QPushButton("Reconnect")
+        self.reconnect_database.clicked.connect(self.open_database)
+        self.reconnect_database.hide()
+        self.statusBar().addPermanentWidget(self.similar_progress)
+        self.statusBar().addPermanentWidget(self.cancel_similar)
+        self.statusBar().addPermanentWidget(self.sync_progress)
+        self.statusBar().addPermanentWidget(self.database_state)
+        self.statusBar().addPermanentWidget(self.reconnect_database)
+
+    def open_database(self):
+        """Connect to the database and load the schema on a worker thread, called once the window is shown and by Reconnect"""
+
+        self.reconnect_database.hide()
+        self.database_state.setText("Connecting to database...")
+
+        def connect():
+            database = SbmlDatabase(config.CONFIGURATION_FILE, config.BIOMODELS_DATABASE_FOLDER, config.DEFAULT_SCHEMA, backend=config.DATABASE_BACKEND)
+            # The list of available models comes from the downloader's cache, it is only refreshed from BioModels when stale
+            downloader = BiomodelsDownloader(base_url=config.BIOMODELS_DATABASE, meta_data_url=config.METADATA_URL, identifiers_url=config.IDENTIFIERS_URL,
+                                             threads=config.DOWNLOADING_THREADS, curatedOnly=config.CURATED_ONLY, output_dir=config.BIOMODELS_DATABASE_FOLDER)
+            return database, downloader
+
+        self.workers.start(connect, key="startup", result=self.database_opened, error=self.database_failed)
+
+    def database_failed(self, error):
+        """The database could not be opened: drop the queued requests, reporting them, and offer to reconnect"""
+
+        self.database_state.setText(f"Database unavailable: {error}")
+        self.reconnect_database.show()
+
+        pending, self.pending_requests = self.pending_requests, []
+        if pending:
+            requests = ", ".join(request.__name__ for request, _ in pending)
+            self.statusBar().showMessage(f"Database unavailable, {len(pending)} request(s) not run: {requests}")
+
+    def database_opened(self, connection):
+        """Database ready: run the requests made while connecting, then sync models in the background"""
+
+        self.database, self.downloader = connection
+        self.database_state.setText("Database ready")
+
+        pending, self.pending_requests = self.pending_requests, []
+        for request, args in pending:
+            request(*args)
+
+        self.sync_progress.setValue(0)
+        self.sync_progress.show()
+        self.workers.start(self.sync_models, key="sync", result=self.models_synced, progress=self.show_sync_progress,
+                           error=self.sync_failed)
+
+    def sync_models(self, worker):
+        """Runs on a worker thread: download and import the models missing from the database"""
+
+        models = self.downloader.find_missing_models(config.NUMBER_OF_MODELS_TO_DOWNLOAD_FROM_DATABASE)
+        worker.report_progress(0, len(models))
+        pipeline = ImportPipeline(self.downloader, self.database, progress=worker.report_progress) # Imports every model as soon as it is downloaded
+        return pipeline.run(models)
+
+    def show_sync_progress(self, imported, total):
+        self.sync_progress.setMaximum(max(total, 1))
+        self.sync_progress.setValue(imported)
+
+    def models_synced(self, models):
+        self.models = models
+        self.sync_progress.hide()
+        self.database_state.setText(f"Database ready, {len(models)} models synced")
+
+    def sync_failed(self, error):
+        self.sync_progress.hide()
+        self.database_state.setText(f"Database ready, sync failed: {error}")
+
+    def wait_for_database(self, request, *args):
+        """
+        True if the database is not open yet, request(*args) is then run once it is
+        -- used at the start of every handler that needs the database
+        """
+
+        if self.database is not None:
+            return False
+
+        self.pending_requests.append((request, args))
+        self.statusBar().showMessage("Waiting for the database, the request runs once it is ready", 5000)
+        return True
+
+    def show_error(self, error):
+        """Report a failed background task"""
+        self.statusBar().clearMessage()
+        QMessageBox.warning(self, "BioGraph", error)
+
+    def show_progress(self, message):
+        """Progress callback of a background task: shows message.format(done=, total=) in the status bar"""
+        return lambda done, total: self.statusBar().showMessage(message.format(done=done, total=total))
+
     def changeSchema(self, text):
         """Change database Schema"""
-        self.database.change_schema(config.SCHEMA_FOLDER + "/" + text + ".json")
+        if self.wait_for_database(self.changeSchema, text):
+            return
+        self.workers.start(self.database.change_schema, config.SCHEMA_FOLDER + "/" + text + ".json", key="schema", error=self.show_error)
 
     def upload_files(self):
 
         files, _ = QFileDialog.getOpenFileNames(self, "Select Files to Upload", "", "XML Files (*.xml)")
-        names = ""
+        if not files:
+            return
+        self.import_uploaded_files(files)
 
+    def import_uploaded_files(self, files):
+        if self.wait_for_database(self.import_uploaded_files, files):
+            return
+        self.workers.start(self.import_files, files, result=self.files_uploaded, error=self.show_error,
+                           progress=self.show_progress("Uploading {done}/{total} models"))
+
+    def import_files(self, files, worker):
+        """Runs on a worker thread: import every file, returns the names of the imported files"""
+
+        imported = []
         for file_path in files:
-            file_name = file_path.split("/")[-1] # Strip folder 
+            worker.check_cancelled()
             self.database.load_and_import_model(file_path, path=True) # Import to database
+            imported.append(file_path.split("/")[-1]) # Strip folder 
+            worker.report_progress(len(imported), len(files))
+
+        return imported
+
+    def files_uploaded(self, file_names):
+        names = ""
+
+        for file_name in file_names:
             names += f"{file_name[:-4]}, "
             self.file_list.addItem(file_name)
             self.file_count += 1
 
+        self.statusBar().clearMessage()
         QMessageBox.information(self, "Success", f"{names} has been successfully uploaded to the database.")
         
     def show_context_menu(self, position):
@@ -527,9 +700,7 @@ class BioGraphGUI(QMainWindow):
             self.file_list.takeItem(row)
 
             # Remove the file from the database
-            self.database.delete_model(file_name[:-4])
-            
-            QMessageBox.information(self, "Success", f"{file_name[:-4]} has been successfully deleted from the database.")
+            self.remove_model(file_name[:-4])
             self.file_count -= 1
 
             # If the deleted file was being displayed, hide the display
@@ -541,9 +712,18 @@ class BioGraphGUI(QMainWindow):
             QMessageBox.information(self, "Cancelled", f"Deletion of {file_name[:-4]} was cancelled.")
 
 
+    def remove_model(self, model):
+        if self.wait_for_database(self.remove_model, model):
+            return
+        self.workers.start(self.database.delete_model, model, error=self.show_error,
+                           result=lambda _: QMessageBox.information(self, "Success", f"{model} has been successfully deleted from the database."))
+
     def advanced_search(self):
         """Depending on input provided, query model and return matches"""
 
+        if self.wait_for_database(self.advanced_search):
+            return
+
         self.clear_widgets()
         self.file_display.hide()
         compound = self.compound_input_box.text()
@@ -553,18 +733,25 @@ class BioGraphGUI(QMainWindow):
         if compound == "" and compartment == "":
             return
 
+        self.statusBar().showMessage("Searching...")
+        self.workers.start(self.search_models, compound, compartment, key="search", result=self.show_advanced_search, error=self.show_error)
+
+    def search_models(self, compound, compartment):
+        """Runs on a worker thread: models matching a compound and/or compartment"""
+
         # Only search for compund
         if compartment == "":
-            models = self.database.search_for_compound(compound)
+            return self.database.search_for_compound(compound)
 
         # Only search for compartment
         elif compound == "":
-            models = self.database.search_for_compartment(compartment)
+            return self.database.search_for_compartment(compartment)
 
         # Search for compund in compartment
-        else:
-            models = self.database.search_compound_in_compartment(compound=compound, compartment=compartment)
-        
+        return self.database.search_compound_in_compartment(compound=compound, compartment=compartment)
+
+    def show_advanced_search(self, models):
+        self.statusBar().clearMessage()
         if models is None:
             models = ["NO MATCHING MODELS"]
         
@@ -595,98 +782,25 @@ class BioGraphGUI(QMainWindow):
 
     def all_models_widgets(self):
 
+        if self.wait_for_database(self.all_models_widgets):
+            return
+
         self.clear_widgets()
         self.file_display.hide()
 
-        models = self.database.find_all_models()
-
-        for model in models:
-            widget = QWidget()
-            widget.setFixedHeight(70)  # Set only the height to be fixed
-            widget.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
-            label = QLabel(model)
-            
-            widget.setStyleSheet("""
-                QWidget {
-                    background-color: #111c11;
-                    border-radius: 5px;
-                    margin: 2px;
-                    padding: 5px;
-                }
-            """)
-
-            layout = QHBoxLayout(widget)
-            layout.addWidget(label)
-            layout.addWidget(QWidget())  # Spacer
-            layout.addWidget(QWidget())  # Spacer
-            button = QPushButton("View graph in browser")
-            #button.setFont(QFont("Arial",20))
-            button.setStyleSheet("""
-                QPushButton {
-                    background-color: #1a301a;
-                    padding: 10px 10px;
-                    color: white;
-                    font-size: 10px;
-                    border: none;
-                }
-                                 
-                QPushButton:hover {
-                background-color: #213d20;
-                }
-                                 """)
-            button.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
-            #button.clicked.connect(lambda: self.veiwGraph(pair[0]))
-            button.clicked.connect(lambda checked, x = model:self.veiwGraph(x))
-
-            layout.addWidget(button)
-            self.content_layout.addWidget(widget)
+        # Models are fetched from the database page by page, while the list is scrolled
+        self.show_model_list([])
+        self.model_list_model.set_source(self.database.find_models_page)
 
     def advanced_search_add_widgets(self, models):
-        for model in models:
-            widget = QWidget()
-            widget.setFixedHeight(70)  # Set only the height to be fixed
-            widget.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
-            label = QLabel(model)
-            
-            widget.setStyleSheet("""
-                QWidget {
-                    background-color: #111c11;
-                    border-radius: 5px;
-                    margin: 2px;
-                    padding: 5px;
-                }
-            """)
-
-            layout = QHBoxLayout(widget)
-            layout.addWidget(label)
-            layout.addWidget(QWidget())  # Spacer
-            layout.addWidget(QWidget())  # Spacer
-            button = QPushButton("View graph in browser")
-            #button.setFont(QFont("Arial",20))
-            button.setStyleSheet("""
-                QPushButton {
-                    background-color: #1a301a;
-                    padding: 10px 10px;
-                    color: white;
-                    font-size: 10px;
-                    border: none;
-                }
-                                 
-                QPushButton:hover {
-                background-color: #213d20;
-                }
-                                 """)
-            button.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
-            #button.clicked.connect(lambda: self.veiwGraph(pair[0]))
-            button.clicked.connect(lambda checked, x = model:self.veiwGraph(x))
-
-            layout.addWidget(button)
-            self.content_layout.addWidget(widget)
-
+        self.show_model_list(models)
 
     def perform_search(self):
         """Lookup if a model exists in a database"""
 
+        if self.wait_for_database(self.perform_search):
+            return
+
         search_term = self.search_bar.text()
         print(f"Searching for: {search_term}")
         self.clear_widgets()
@@ -694,10 +808,8 @@ class BioGraphGUI(QMainWindow):
         self.model_ID = search_term
 
         # Implement your search logic here
-        if self.database.check_model_exists(search_term):
-            self.show_search(search_term)
-        else:
-            self.show_search("Model does not exist")
+        self.workers.start(self.database.check_model_exists, search_term, key="search", error=self.show_error,
+                           result=lambda exists: self.show_search(search_term if exists else "Model does not exist"))
 
 
     def merge_dropdown(self):
@@ -721,6 +833,9 @@ class BioGraphGUI(QMainWindow):
     def merge_models(self):
         """Query database to merge two models"""
 
+        if self.wait_for_database(self.merge_models):
+            return
+
         self.clear_widgets()
 
         model1 = self.m1_input_box.text()
@@ -730,7 +845,11 @@ class BioGraphGUI(QMainWindow):
         if model1 == "" or model2 == "":
             return
 
-        newmodel = self.database.merge_biomodels(model_id1=model1, model_id2=model2)
+        self.statusBar().showMessage(f"Merging {model1} and {model2}...")
+        self.workers.start(self.database.merge_biomodels, model_id1=model1, model_id2=model2, key="merge", result=self.merged, error=self.show_error)
+
+    def merged(self, newmodel):
+        self.statusBar().clearMessage()
         print(newmodel)
         self.merge_widget(newmodel)
 
@@ -806,104 +925,89 @@ class BioGraphGUI(QMainWindow):
 
 
     def add_widgets(self):
-        """Create a widget, if a model needs to listed"""
-        similar_models = self.database.find_all_similar(self.model_ID, config.TOTAL_MATCHING_GRAPHS)
-
-        for pair in similar_models:
-            widget = QWidget()
-            widget.setFixedHeight(70) 
-            widget.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Fixed)
-            label = QLabel(pair[0])
-            simLabel = QLabel("similarity match:")
-            perWidget = QWidget()
-            perLabel = QLabel(f"{pair[1]}%")
-
-            if (pair[1] >= 80):
-                perWidget.setStyleSheet("""
-                QWidget {
-                    background-color: #111c11;
-                    color: green;
-                    font-size: 20px;
-                    border-radius: 5px;
-                    margin: 0px;
-                    padding: 0px 0px;
-                    font-weight: bold;}
-             """)
-            elif (50 <= pair[1] < 80):
-                perWidget.setStyleSheet("""
-                QWidget {
-                    background-color: #111c11;
-                    color: yellow;
-                    font-size: 20px;
-                    border-radius: 5px;
-                    margin: 0px;
-                    font-weight: bold;}
-             """)
-                
-            elif (30 <= pair[1] <= 50):
-                perWidget.setStyleSheet("""
-                QWidget {
-                    background-color: #111c11;
-                    color: orange;
-                    font-size: 20px;
-                    border-radius: 5px;
-                    margin: 0px;
-                    font-weight: bold;}
-             """)
-                
-            else:
-                perWidget.setStyleSheet("""
-                QWidget {
-                    background-color: #111c11;
-                    color: red;
-                    font-size: 20px;
-                    border-radius: 5px;
-                    margin: 0px;
-                    font-weight: bold;}
-             """)
-
-            widget.setStyleSheet("""
-                QWidget {
-                    background-color: #111c11;
-                    border-radius: 5px;
-                    margin: 2px;
-                    padding: 5px;
-                }
-            """)
-
-            perLayout = QHBoxLayout(perWidget)
-            perLayout.addWidget(perLabel)
-            layout = QHBoxLayout(widget)
-            layout.addWidget(label)
-            layout.addWidget(QWidget())  # Spacer
-            layout.addWidget(QWidget())  # Spacer
-            layout.addWidget(simLabel)
-            layout.addWidget(perWidget)
-            button = QPushButton("View graph in browser")
-            
-            button.setStyleSheet("""
-                QPushButton {
-                    background-color: #1a301a;
-                    padding: 10px 10px;
-                    color: white;
-                    font-size: 10px;
-                    border: none;
-                }
-                                 
-                QPushButton:hover {
-                background-color: #213d20;
-                }
-                                 """)
-            button.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Fixed)
-            #button.clicked.connect(lambda: self.veiwGraph(pair[0]))
-            button.clicked.connect(lambda checked, x = pair[0]:self.veiwGraph(x))
+        """Find similar models in the background, the list is filled and reordered while models are scored"""
+        if self.wait_for_database(self.add_widgets):
+            return
+        self.show_model_list([], scores=[], actions=[("view", "View graph in browser"), ("html", "Export HTML"), ("diff", "Show differences")])
+        self.similar_progress.setValue(0)
+        self.similar_progress.show()
+        self.cancel_similar.show()
+        self.workers.start(self.stream_similar, self.model_ID, key="similar", partial=self.model_list_model.update_ranking,
+                           progress=self.show_similar_progress, result=self.similar_models_found, error=self.similar_search_failed)
+
+    def stream_similar(self, model_id, worker):
+        """
+        Runs on a worker thread: scores every model and keeps the best TOTAL_MATCHING_GRAPHS in a heap
+        -- changes to the top models are sent to the list every SIMILARITY_UPDATE_INTERVAL seconds
+        """
 
-            layout.addWidget(button)
-            self.content_layout.addWidget(widget)
+        models = self.database.similarity_candidates()
+        top = TopK(config.TOTAL_MATCHING_GRAPHS)
+        changes = []
+        sent = time.monotonic()
+        worker.report_progress(0, len(models))
+
+        with closing(self.database.iter_similar(model_id, models)) as scores: # Closing it early cancels queued comparisons
+            for done, (model, score) in enumerate(scores, 1):
+                worker.check_cancelled()
+                kept, evicted = top.push(model, score)
+                if kept:
+                    changes.append((model, score, evicted))
+
+                if time.monotonic() - sent >= config.SIMILARITY_UPDATE_INTERVAL or done == len(models):
+                    if changes:
+                        worker.report_partial(changes)
+                        changes = []
+                    worker.report_progress(done, len(models))
+                    sent = time.monotonic()
+
+        return top.best()
+
+    def show_similar_progress(self, done, total):
+        self.similar_progress.setMaximum(max(total, 1))
+        self.similar_progress.setValue(done)
+
+    def similar_models_found(self, similar_models):
+        self.similar_progress.hide()
+        self.cancel_similar.hide()
+        self.statusBar().showMessage(f"{len(similar_models)} most similar models to {self.model_ID}", 5000)
+
+    def similar_search_failed(self, error):
+        self.stop_similar_search()
+        self.show_error(error)
+
+    def stop_similar_search(self):
+        """Stop scoring models, the models listed so far stay"""
+        self.workers.cancel("similar")
+        self.similar_progress.hide()
+        self.cancel_similar.hide()
+
+    def show_model_list(self, models, scores=None, actions=None):
+        """Show a list of models in place of the content area, actions defaults to viewing and exporting each model"""
+        if actions is None:
+            actions = [("view", "View graph in browser"), ("html", "Export HTML")]
+        self.stop_similar_search() # A running similarity search would keep adding rows to the new list
+        self.model_list.set_actions(actions)
+        self.model_list_model.set_models(models, scores)
+        self.content_area.hide()
+        self.model_list.show()
+
+    def model_list_action(self, action, model):
+        """A button of a row in the model list was clicked"""
+        if action == "diff":
+            self.view_diff(self.model_ID, model)
+        elif action == "html":
+            self.export_graph_html(model)
+        else:
+            self.veiwGraph(model)
 
 
     def clear_widgets(self):
         """Set visibility of all widgets to None"""
+        self.stop_similar_search()
+        self.model_list.hide()
+        self.model_list_model.set_models([])
+        self.content_area.show()
         while self.content_layout.count():
             child = self.content_layout.takeAt(0)
             if child.widget():
@@ -933,9 +1037,59 @@ class BioGraphGUI(QMainWindow):
             self.current_file = file_name
 
     def veiwGraph(self, text):
-        """Launch a matplotlib plot visualizing a graph"""
-        visualiser = GraphVisualizer()
-        visualiser.visualize(text, config_file=config.CONFIGURATION_FILE)
+        """Render the graph of a model in the background, it opens in a window when ready"""
+        future = self.renderer.submit(text)
+        future.add_done_callback(lambda future, model=text: self.graph_rendered(model, future))
+
+    def view_diff(self, model1, model2):
+        """Render the diff of two models in the background, it opens in a window when ready"""
+        future = self.renderer.render_diff(model1, model2)
+        future.add_done_callback(lambda future, model=f"{model1} vs {model2}": self.graph_rendered(model, future))
+
+    def export_graph_html(self, text):
+        """Export the graph of a model as interactive HTML in the background, it opens in the browser when ready"""
+        future = self.renderer.export_html(text)
+        future.add_done_callback(lambda future, model=text: self.graph_exported(model, future))
+
+    def graph_exported(self, model, future):
+        """Called on a renderer thread, hands the exported file to the GUI thread"""
+        try:
+            self.render_signals.exported.emit(future.result())
+        except Exception as e:
+            self.render_signals.failed.emit(model, str(e))
+
+    def graph_rendered(self, model, future):
+        """Called on a renderer thread, hands the result to the GUI thread"""
+        try:
+            image = future.result()
+            if isinstance(image, tuple): # render_diff() returns (diff, image)
+                image = image[1]
+            self.render_signals.finished.emit(model, image)
+        except Exception as e:
+            self.render_signals.failed.emit(model, str(e))
+
+    def show_graph(self, model, image):
+        """Open a window with the rendered graph of a model"""
+        pixmap = QPixmap()
+        pixmap.loadFromData(image, "PNG")
+
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"Model: {model}")
+        dialog.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        layout = QVBoxLayout(dialog)
+        label = QLabel()
+        label.setPixmap(pixmap.scaledToWidth(min(pixmap.width(), int(self.width() * 0.9)), Qt.TransformationMode.SmoothTransformation))
+        layout.addWidget(label)
+        dialog.show()
+
+    def show_render_error(self, model, error):
+        QMessageBox.warning(self, "BioGraph", f"Could not draw {model}: {error}")
+
+    def closeEvent(self, event):
+        self.workers.cancel_all()
+        self.workers.wait(5000)
+        self.renderer.close()
+        super().closeEvent(event)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
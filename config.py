@@ -1,14 +1,73 @@
 # Constants
-CHECK_UPDATED_BIOMODELS = False
+CHECK_UPDATED_BIOMODELS = True # Conditional metadata requests to redownload models changed upstream, see ModelManifest
 DOWNLOADING_THREADS = 10
 CURATED_ONLY = True
 NUMBER_OF_MODELS_TO_DOWNLOAD_FROM_DATABASE = 10  # defualt is -1 = all models
+DOWNLOAD_RETRIES = 5 # Retries after connection errors, 429 and 5xx responses
+DOWNLOAD_BACKOFF = 0.5 # Seconds, doubled after every retry (unless the server sends Retry-After)
+DOWNLOAD_TIMEOUT = (10, 120) # (connect, read) timeout of a request in seconds
+DOWNLOAD_BATCH_SIZE = 20 # Models fetched in one zip file, 1 = one request per model
+MANIFEST_FILE = "manifest.json" # Manifest of downloaded models, stored in the download folder
+PIPELINE_MAP_WORKERS = 4 # Models mapped to graphs at once while downloading
+PIPELINE_QUEUE_SIZE = 16 # Models waiting between pipeline stages before earlier stages pause
+PIPELINE_WRITE_BATCH = 8 # Models written to the database in one batch
+MODEL_STORE = True # Keep downloaded models in compressed segment files instead of one XML file per model
+MODEL_STORE_FOLDER = "store" # Folder of the model store, inside the download folder
+MODEL_STORE_SEGMENT_SIZE = 64 * 1024 * 1024 # Bytes per segment file of the model store
+MODEL_STORE_COMPRESSION = 6 # zlib level of the model store
+LAYOUT_CACHE_FOLDER = "layouts" # Cached node positions of visualized models
+LAYOUT_CACHE_SIZE = 200 # Models kept in the layout cache, least recently used are removed first
+LAYOUT_SEED_ITERATIONS = 15 # Layout iterations of a changed model starting from its cached positions (a new layout uses 50)
+LARGE_GRAPH_THRESHOLD = 500 # Graphs with more nodes use the NumPy force layout and level of detail drawing
+LARGE_LAYOUT_ITERATIONS = 50 # Iterations of the NumPy force layout
+LOD_COLLAPSED_LABELS = ["UnitDefinition", "Unit", "LocalParameter"] # Leaves folded into their parent node in large graphs
+LOD_LABEL_THRESHOLD = 300 # Node labels are hidden above this many nodes
+LOD_EDGE_LABEL_THRESHOLD = 100 # Relationship labels are hidden above this many relationships
+RENDER_WORKERS = 4 # Processes rendering graphs to PNG / SVG in the background
+THUMBNAIL_FOLDER = "thumbnails" # Pre-rendered thumbnails of the models
+THUMBNAIL_WIDTH = 320 # Width of thumbnails in pixels
+HTML_EXPORT_FOLDER = "exports" # Interactive HTML views of models, opened in the browser
+GUI_WORKER_THREADS = 4 # Database and network tasks of the GUI running at once
+SIMILARITY_UPDATE_INTERVAL = 0.1 # Seconds between updates of the similar models list while models are scored
+ASYNC_DOWNLOAD_CONCURRENCY = 20 # Downloads in flight at once with AsyncBiomodelsDownloader
+DOWNLOAD_RATE_LIMIT = 10 # Requests per second to a host with AsyncBiomodelsDownloader, 0 = no limit
+DOWNLOAD_CHUNK_SIZE = 65536 # Bytes read from a response at a time when streaming to disk
 
 # Accuracy Weighting of graph matching, Adds up to 1
 NODE_WEIGHTING = 0.5
 STRCUTURE_WEIGHTING = 0.5
 TOTAL_MATCHING_GRAPHS = 10 # The number of top mathing models to RETURNS
 
+# Graph matching engine used by find_all_similar: "cypher" (count and child id comparison) or "wl" (Weisfeiler-Lehman graph kernel)
+SIMILARITY_ENGINE = "cypher"
+WL_ITERATIONS = 3 # Depth of the subtrees compared by the WL kernel
+WL_IDENTIFIED_LABELS = ["Species", "Compartment", "Reaction"] # Node labels whose id is part of their WL label
+
+# Reaction path queries: maximum number of reactions in a path, and reactions followed per species
+PATH_MAX_DEPTH = 10
+PATH_MAX_FANOUT = 50
+
+# Number of models fetched from the database per page when listing all models
+MODELS_PAGE_SIZE = 500
+
+# Query profiling -- records every query for QueryProfiler.query_profiler.report()
+PROFILE_QUERIES = False
+PROFILE_DB_HITS = False # Runs queries with PROFILE to count db hits (only where the client returns a summary)
+SLOW_QUERY_THRESHOLD = 0.5 # Seconds, slower queries are written to the slow query log
+SLOW_QUERY_LOG = "slow_queries.log"
+
+# Where models are stored: "neo4j" (server from CONFIGURATION_FILE) or "memory" (in process, no server needed)
+DATABASE_BACKEND = "neo4j"
+
+# Shared Neo4j connection pool -- can be overridden in the [pool] section of the configuration file
+CONNECTION_POOL_SIZE = 10 # Maximum connections kept open
+CONNECTION_MAX_AGE = 3600 # Seconds before a connection is replaced
+CONNECTION_LIVENESS_CHECK = 60 # Seconds a connection may be idle before it is checked
+
+# Read only queries (searches, comparisons, model lists) run on a thread pool, routed to read replicas
+ROUTE_READ_QUERIES = True
+READ_QUERY_THREADS = 8
+
 # FOLDERS
 BIOMODELS_DATABASE_FOLDER = "biomodels" # Folder where database biomodels are downloaded
 SCHEMA_FOLDER = "Schemas"
@@ -17,4 +76,7 @@ DEFAULT_SCHEMA = "Schemas/default_schema.json"
 
 # DATABASE
 BIOMODELS_DATABASE = "https://www.ebi.ac.uk/biomodels/search/download" # URL for downloading files
-METADATA_URL = "https://www.ebi.ac.uk/biomodels/model/files/{model}?format=json" # URL For checking model updates
\ No newline at end of file
+METADATA_URL = "https://www.ebi.ac.uk/biomodels/model/files/{model}?format=json" # URL For checking model updates
+IDENTIFIERS_URL = "https://www.ebi.ac.uk/biomodels/model/identifiers?format=json" # URL listing all models
+IDENTIFIERS_TTL = 24 * 60 * 60 # Seconds the cached model list is used before it is refreshed in the background
+IDENTIFIERS_CACHE = "identifiers.json" # Cached model list, stored in the download folder
\ No newline at end of file
@@ -1,6 +1,48 @@
 import unittest
+import tempfile
+import zipfile
+import random
+import io
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, MagicMock
+import requests
+import numpy as np
+import networkx as nx
+import matplotlib
+matplotlib.use("Agg") # Figures are drawn without a display
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen") # Windows are created without a display
+from PyQt6.QtCore import QCoreApplication
+from PyQt6.QtWidgets import QApplication, QPushButton
+import neo4j
 from SbmlDatabase import SbmlDatabase
+from SbmlDatabaseQueries import SbmlDatabaseQueries
+from SimilarityEngine import WLSimilarityEngine, TopK
+from ReactionIndex import ReactionNetworkIndex
+from BiomodelsDownloader import BiomodelsDownloader
+from BiomodelsMirror import BiomodelsMirror
+from AsyncBiomodelsDownloader import AsyncBiomodelsDownloader
+from ModelManifest import ModelManifest
+from ModelStore import ModelStore
+from ImportPipeline import ImportPipeline
+from LayoutCache import LayoutCache
+from GraphLayout import force_layout, collapse_leaves
+from HtmlExport import write_html, COORDINATE_RANGE
+from visualize import GraphVisualizer
+from GraphRenderer import GraphRenderer
+from ModelListView import ModelListModel
+from GuiWorkers import WorkerPool
+from bioGraphGUI import BioGraphGUI
+from QueryProfiler import QueryProfiler
+from ConnectionPool import Neo4jConnectionPool, PooledConnection
+from ReadQueryExecutor import ReadQueryExecutor
 
 """"
 These tests are to be done everytime database is modified to make sure all changes do not affect others
@@ -14,7 +56,7 @@ class TestSbmlDatabase(unittest.TestCase):
         """ Set up a mock database instance before each test """
         self.database = SbmlDatabase("localhost.ini", "biomodels", "Schemas/default_schema.json")
 
-    @patch('SbmlDatabase.connect')
+    @patch('ConnectionPool.connect')
     def test_find_all_models(self, mock_connect):
         """Makes sure database can find all models it contains"""
         mock_connect.return_value = MagicMock()
@@ -23,7 +65,25 @@ class TestSbmlDatabase(unittest.TestCase):
         self.assertEqual(result, ['BIOMD0000000001', 'BIOMD0000000002', 'BIOMD0000000004',
                                                   'BIOMD0000000005', 'BIOMD0000000006', 'BIOMD0000000007', 'BIOMD0000000008', 'BIOMD0000000009', 'BIOMD0000000010'])
     
-    @patch('SbmlDatabase.connect')
+    @patch('ConnectionPool.connect')
+    def test_find_all_models_page(self, mock_connect):
+        """Makes sure pages of models are returned in order and do not overlap"""
+        mock_connect.return_value = MagicMock()
+        first_page = self.database.find_all_models(limit=3)
+        second_page = self.database.find_all_models(skip=3, limit=3)
+        self.assertEqual(first_page, ['BIOMD0000000001', 'BIOMD0000000002', 'BIOMD0000000004'])
+        self.assertEqual(second_page, ['BIOMD0000000005', 'BIOMD0000000006', 'BIOMD0000000007'])
+
+    @patch('ConnectionPool.connect')
+    def test_iter_all_models(self, mock_connect):
+        """Makes sure iterating page by page returns the same models as a single query"""
+        mock_connect.return_value = MagicMock()
+        result = list(self.database.iter_all_models(page_size=2))
+        self.assertEqual(result, self.database.find_all_models())
+        continued = list(self.database.iter_all_models(page_size=2, after='BIOMD0000000007'))
+        self.assertEqual(continued, ['BIOMD0000000008', 'BIOMD0000000009', 'BIOMD0000000010'])
+
+    @patch('ConnectionPool.connect')
     def test_findsimilar_models(self, mock_connect):
         """Makes sure database can find all models it contains"""
         mock_connect.return_value = MagicMock()
@@ -31,7 +91,7 @@ class TestSbmlDatabase(unittest.TestCase):
         result = self.database.find_all_similar('BIOMD0000000001', MODEL_LIMIT=5)
         self.assertEqual(result, [('BIOMD0000000001', 100.0), ('BIOMD0000000002', 99.18), ('BIOMD0000000010', 40.0), ('BIOMD0000000005', 38.78), ('BIOMD0000000008', 38.78)])
 
-    @patch('SbmlDatabase.connect')
+    @patch('ConnectionPool.connect')
     def test_delete_model(self, mock_connect):
         """ Test deleting a model from the database """
         mock_connect.return_value = MagicMock()
@@ -39,7 +99,7 @@ class TestSbmlDatabase(unittest.TestCase):
         mock_connect().run_query.assert_not_called()
 
 
-    @patch('SbmlDatabase.connect')
+    @patch('ConnectionPool.connect')
     def test_compare_models(self, mock_connect):
         """ Test comparing two models """
         mock_connect.return_value = MagicMock()
@@ -48,7 +108,7 @@ class TestSbmlDatabase(unittest.TestCase):
         self.assertEqual(similarity, 0.9583333333333333)
         # This accuracy value is objective, but makes sure that the graph matching algorithm remains the same
 
-    @patch('SbmlDatabase.connect')
+    @patch('ConnectionPool.connect')
     def test_compare__same_model(self, mock_connect):
         """ Test comparing same model in graph macthing algorithm - should be 100% accuracy """
         mock_connect.return_value = MagicMock()
@@ -57,7 +117,23 @@ class TestSbmlDatabase(unittest.TestCase):
         self.assertEqual(similarity, 1)
 
 
-    @patch('SbmlDatabase.connect')
+    @patch('ConnectionPool.connect')
+    def test_compare_same_model_wl(self, mock_connect):
+        """ Test comparing same model with the Weisfeiler-Lehman engine - should be 100% accuracy """
+        mock_connect.return_value = MagicMock()
+        similarity = self.database.compare_models("BIOMD0000000003", "BIOMD0000000003", engine="wl")
+        self.assertAlmostEqual(similarity, 1)
+
+    @patch('ConnectionPool.connect')
+    def test_findsimilar_models_wl(self, mock_connect):
+        """Makes sure the Weisfeiler-Lehman engine ranks the model itself first"""
+        mock_connect.return_value = MagicMock()
+        result = self.database.find_all_similar('BIOMD0000000001', MODEL_LIMIT=5, engine="wl")
+        self.assertEqual(result[0], ('BIOMD0000000001', 100.0))
+        self.assertEqual(len(result), 5)
+
+
+    @patch('ConnectionPool.connect')
     def test_search_for_compartment(self, mock_connect):
         """ Test searching for models with a specific compartment """
         mock_connect.return_value = MagicMock()
@@ -66,7 +142,7 @@ class TestSbmlDatabase(unittest.TestCase):
         self.assertEqual(sorted(result), sorted(['BIOMD0000000006', 'BIOMD0000000005', 'BIOMD0000000004', 'BIOMD0000000003']))
 
 
-    @patch('SbmlDatabase.connect')
+    @patch('ConnectionPool.connect')
     def test_search_for_compound(self, mock_connect):
         """ Test searching for models containing a specific compound """
         mock_connect.return_value = MagicMock()
@@ -75,7 +151,7 @@ class TestSbmlDatabase(unittest.TestCase):
         self.assertEqual(sorted(result), sorted(['BIOMD0000000003', 'BIOMD0000000004', 'BIOMD0000000008']))
 
 
-    @patch('SbmlDatabase.connect')
+    @patch('ConnectionPool.connect')
     def test_search_compound_in_compartment(self, mock_connect):
         """ Test searching for a compound in a specific compartment """
         mock_connect.return_value = MagicMock()
@@ -84,14 +160,23 @@ class TestSbmlDatabase(unittest.TestCase):
         self.assertEqual(sorted(result), sorted(['BIOMD0000000003', 'BIOMD0000000004']))
 
 
-    @patch('SbmlDatabase.connect')
+    @patch('ConnectionPool.connect')
+    def test_find_reaction_path(self, mock_connect):
+        """ Test finding a chain of reactions between two species """
+        mock_connect.return_value = MagicMock()
+        path = self.database.find_reaction_path("B", "ALL", model_id="BIOMD0000000001")
+        self.assertEqual([step[1] for step in path], ["React0", "React1", "React2"])
+        self.assertIsNone(self.database.find_reaction_path("B", "NOT_A_SPECIES"))
+
+
+    @patch('ConnectionPool.connect')
     def test_change_schema(self, mock_connect):
         """ Test changing the schema """
         mock_connect.return_value = MagicMock()
         self.database.change_schema("test.json")
         mock_connect().run_query.assert_not_called()
     
-    @patch('SbmlDatabase.connect')  # Mock the connect function
+    @patch('ConnectionPool.connect')  # Mock the connect function
     def test_load_and_import_model(self, mock_connect):
         """ Test loading and importing a model into the database """
         mock_connect.return_value = MagicMock()
@@ -99,7 +184,7 @@ class TestSbmlDatabase(unittest.TestCase):
         mock_connect().run_query.assert_not_called()  # Verify connection was made
 
 
-    @patch('SbmlDatabase.connect')
+    @patch('ConnectionPool.connect')
     def test_import_models(self, mock_connect):
         """ Test importing multiple models """
         mock_connect.return_value = MagicMock()
@@ -108,7 +193,7 @@ class TestSbmlDatabase(unittest.TestCase):
         mock_connect().run_query.assert_not_called()  # Verify connection was made for multiple models
 
 
-    @patch('SbmlDatabase.connect')
+    @patch('ConnectionPool.connect')
     def test_check_model_exists(self, mock_connect):
         """ Test checking if a model exists """
         mock_connect.return_value = MagicMock()
@@ -118,5 +203,991 @@ class TestSbmlDatabase(unittest.TestCase):
         mock_connect().run_query.assert_not_called()
 
 
+
+class TestInMemorySbmlDatabase(unittest.TestCase):
+    """ The in memory backend must return the same results as the neo4j database above """
+
+    MODELS = ['BIOMD0000000001', 'BIOMD0000000002', 'BIOMD0000000004', 'BIOMD0000000005', 'BIOMD0000000006',
+              'BIOMD0000000007', 'BIOMD0000000008', 'BIOMD0000000009', 'BIOMD0000000010']
+
+    def setUp(self):
+        """ Load the same models as the neo4j database, without a server """
+        self.database = SbmlDatabase("localhost.ini", "biomodels", "Schemas/default_schema.json", backend="memory")
+        self.database.import_models(self.MODELS)
+
+    def test_find_all_models(self):
+        self.assertEqual(self.database.find_all_models(), self.MODELS)
+        self.assertEqual(list(self.database.iter_all_models(page_size=2)), self.MODELS)
+        with self.assertRaises(ValueError):
+            list(self.database.iter_all_models(page_size=0))
+
+    def test_findsimilar_models(self):
+        result = self.database.find_all_similar('BIOMD0000000001', MODEL_LIMIT=5, engine="cypher")
+        self.assertEqual(result, [('BIOMD0000000001', 100.0), ('BIOMD0000000002', 99.18), ('BIOMD0000000010', 40.0), ('BIOMD0000000005', 38.78), ('BIOMD0000000008', 38.78)])
+
+    def test_searches(self):
+        self.assertEqual(sorted(self.database.search_for_compound("C")), ['BIOMD0000000004', 'BIOMD0000000008'])
+        self.assertEqual(sorted(self.database.search_for_compartment("cell")), ['BIOMD0000000004', 'BIOMD0000000005', 'BIOMD0000000006'])
+        self.assertEqual(self.database.search_compound_in_compartment("C", "cell"), ['BIOMD0000000004'])
+
+    def test_searches_with_merged_model(self):
+        """ Matches in a merged model are reported by model name, like the neo4j searches above """
+        self.database.import_models(["BIOMD0000000003"])
+        self.database.merge_biomodels("BIOMD0000000003", "BIOMD0000000004")
+        self.database.delete_model("BIOMD0000000003")
+        self.assertEqual(sorted(self.database.search_for_compound("C")), ['BIOMD0000000003', 'BIOMD0000000004', 'BIOMD0000000008'])
+        self.assertEqual(sorted(self.database.search_for_compartment("cell")), ['BIOMD0000000003', 'BIOMD0000000004', 'BIOMD0000000005', 'BIOMD0000000006'])
+        self.assertEqual(sorted(self.database.search_compound_in_compartment("C", "cell")), ['BIOMD0000000003', 'BIOMD0000000004'])
+
+    def test_delete_and_check_model(self):
+        self.assertTrue(self.database.check_model_exists("BIOMD0000000004"))
+        self.database.delete_model("BIOMD0000000004")
+        self.assertFalse(self.database.check_model_exists("BIOMD0000000004"))
+
+    def test_merge_models(self):
+        tag = self.database.merge_biomodels("BIOMD0000000004", "BIOMD0000000005")
+        self.assertTrue(self.database.check_model_exists(tag))
+        self.assertNotIn(tag, [model for model, _ in self.database.find_all_similar("BIOMD0000000004")])
+
+
+class TestGraphDiff(unittest.TestCase):
+    """ Diffs are drawn without a server, from the records query_diff() would return """
+
+    RECORDS = [
+        ("BIOMD0000000001", "Model", "m", "Model 1", None, "HAS_COMPARTMENT", "Compartment", "c", "cell", None),
+        ("BIOMD0000000001", "Species", "A", "A", None, "IN_COMPARTMENT", "Compartment", "c", "cell", None),
+        ("BIOMD0000000002", "Model", "m", "Model 2", None, "HAS_COMPARTMENT", "Compartment", "c", "cell", None),
+        ("BIOMD0000000002", "Species", "B", "B", None, "IN_COMPARTMENT", "Compartment", "c", "cell", None),
+    ]
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder = folder.name
+        self.visualizer = GraphVisualizer(layout_cache=LayoutCache(folder=self.folder))
+
+    def test_diff(self):
+        with patch.object(GraphVisualizer, "connect_to_neo4j"), patch.object(GraphVisualizer, "query_diff", return_value=self.RECORDS):
+            diff = self.visualizer.diff("BIOMD0000000001", "BIOMD0000000002")
+        self.assertEqual(diff["nodes"]["shared"], [["Compartment", "c"], ["Model", "m"]])
+        self.assertEqual(diff["nodes"]["removed"], [["Species", "A"]])
+        self.assertEqual(diff["nodes"]["added"], [["Species", "B"]])
+        self.assertEqual(diff["summary"]["relationships_shared"], 1)
+
+    def test_render_same_diff_twice(self):
+        """ The second render uses the cached layout of the (label, id) nodes """
+        with patch.object(GraphVisualizer, "connect_to_neo4j"), patch.object(GraphVisualizer, "query_diff", return_value=self.RECORDS):
+            first_diff, first_image = self.visualizer.render_diff("BIOMD0000000001", "BIOMD0000000002")
+            second_diff, second_image = self.visualizer.render_diff("BIOMD0000000001", "BIOMD0000000002")
+        self.assertEqual(first_diff, second_diff)
+        self.assertTrue(second_image.startswith(b"\x89PNG"))
+
+
+class TestWLSimilarityEngine(unittest.TestCase):
+    """ Weisfeiler-Lehman engine on graphs returned by a mock connection """
+
+    def test_query_uses_tag_index(self):
+        connection = MagicMock()
+        connection.query.return_value = []
+        engine = WLSimilarityEngine(connection, labels=lambda: ["Model", "Species"])
+        engine.fetch_model_graph("BIOMD0000000001")
+        query = connection.query.call_args.args[0]
+        self.assertIn("MATCH (n:`Species` {tag: $tag})", query)
+        self.assertNotIn("BIOMD0000000001", query)
+        self.assertEqual(connection.query.call_args.kwargs["parameters"], {"tag": "BIOMD0000000001"})
+
+    def test_concurrent_vocabulary(self):
+        """ Features vectorised from several threads at once never share a column """
+        engine = WLSimilarityEngine(connection=None)
+        histograms = [Counter({f"{model}|{feature}": 1 for feature in range(200)}) for model in range(20)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            vectors = list(executor.map(engine.vectorise, histograms))
+        self.assertEqual(sorted(engine.vocabulary.values()), list(range(len(engine.vocabulary))))
+        columns = {column: feature for feature, column in engine.vocabulary.items()}
+        for histogram, (indices, _) in zip(histograms, vectors):
+            self.assertEqual({columns[column] for column in indices}, set(histogram))
+
+
+class TestModelManifest(unittest.TestCase):
+    """ Manifest of downloaded models, metadata responses come from a mock session """
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder = folder.name
+        with open(os.path.join(self.folder, "BIOMD0000000001.xml"), "wb") as model_file:
+            model_file.write(b"<sbml/>")
+        self.manifest = ModelManifest(self.folder, metadata_url="http://mirror/{model}", rate_limit=0)
+
+    def session(self, checksum, size=7):
+        response = MagicMock(status_code=200, headers={})
+        response.json.return_value = {"main": [{"name": "BIOMD0000000001.xml", "fileSize": str(size), "checksum": checksum}]}
+        session = MagicMock()
+        session.get.return_value = response
+        return session
+
+    def test_damaged(self):
+        self.assertFalse(self.manifest.is_damaged("BIOMD0000000001"))  # Adopted as it is
+        with open(os.path.join(self.folder, "BIOMD0000000001.xml"), "wb") as model_file:
+            model_file.write(b"<sbml>")
+        self.assertTrue(self.manifest.is_damaged("BIOMD0000000001"))
+        self.assertTrue(self.manifest.is_damaged("BIOMD0000000002"))
+
+    def test_revision_change(self):
+        """ A new upstream revision of the same size is detected """
+        self.manifest.record_download("BIOMD0000000001")
+        self.assertEqual(self.manifest.refresh(self.session("a1"), ["BIOMD0000000001"]), [])
+        self.assertEqual(self.manifest.refresh(self.session("a1"), ["BIOMD0000000001"]), [])
+        self.assertEqual(self.manifest.refresh(self.session("b2"), ["BIOMD0000000001"]), ["BIOMD0000000001"])
+        self.assertEqual(ModelManifest(self.folder).entries["BIOMD0000000001"]["upstream_revision"], "checksum:b2")
+
+    def test_size_change(self):
+        self.manifest.record_download("BIOMD0000000001")
+        self.assertEqual(self.manifest.refresh(self.session("a1", size=8), ["BIOMD0000000001"]), ["BIOMD0000000001"])
+
+
+class TestBiomodelsDownloader(unittest.TestCase):
+    """ Downloader behaviour that does not need the BioModels api """
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder = folder.name
+        self.downloader = BiomodelsDownloader(output_dir=self.folder, use_store=False)
+
+    def test_stale_identifiers_are_refreshed(self):
+        """ The cached list is used straight away and replaced by the refreshed list, even if the refresh finishes at once """
+        stale, fresh = ["BIOMD0000000001"], ["BIOMD0000000001", "BIOMD0000000002"]
+        with patch.object(self.downloader, "load_identifiers", return_value=(stale, 0)), \
+             patch.object(self.downloader, "refresh_available_models", side_effect=lambda: self.downloader.set_available_models(fresh)):
+            self.downloader.check_available_models()
+        self.assertEqual(self.downloader.curated_models, fresh)
+
+    def test_async_extract_checks_sbml(self):
+        """ The async downloader keeps only the SBML files of the model, without the folders of the archive """
+        downloader = AsyncBiomodelsDownloader(output_dir=self.folder, use_store=False)
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zip_file:
+            zip_file.writestr("files/BIOMD0000000001_url.xml", "<sbml><model id=\"BIOMD0000000001\"/></sbml>")
+            zip_file.writestr("BIOMD0000000001_notes.xml", "<notes/>")
+        archive.seek(0)
+        self.assertEqual(downloader.extract_xml(archive, "BIOMD0000000001"), ["BIOMD0000000001_url.xml"])
+        self.assertEqual(sorted(os.listdir(self.folder)), ["BIOMD0000000001_url.xml"])
+
+
+class TestModelStore(unittest.TestCase):
+    """ Compressed segment store of downloaded models """
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder = folder.name
+        self.store = ModelStore(self.folder, segment_size=2000)
+
+    def tearDown(self):
+        self.store.close()
+
+    def xml(self, model):
+        return f"<sbml><model id=\"{model}\">{random.Random(model).randbytes(400).hex()}</model></sbml>".encode()
+
+    def reopen(self, rebuild=False):
+        """ A new store on the same folder, as after a restart, optionally without its index """
+        self.store.close()
+        if rebuild:
+            os.remove(os.path.join(self.folder, "index.jsonl"))
+        self.store = ModelStore(self.folder, segment_size=2000)
+
+    def test_put_get_replace(self):
+        for i in range(10):
+            self.store.put(f"BIOMD{i:010d}", self.xml(i))
+        self.store.put("BIOMD0000000003", b"<sbml/>")
+        self.assertGreater(len(self.store.segment_numbers()), 1)
+        self.reopen()
+        self.assertEqual(len(self.store.models()), 10)
+        self.assertEqual(self.store.get("BIOMD0000000003"), b"<sbml/>")
+        self.assertEqual(self.store.get("BIOMD0000000004"), self.xml(4))
+        self.assertIsNone(self.store.get("BIOMD0000000011"))
+
+    def test_rebuild_after_delete(self):
+        """ A deleted model stays deleted when the index is rebuilt from the segments """
+        self.store.put("BIOMD0000000001", self.xml(1))
+        self.store.put("BIOMD0000000002", self.xml(2))
+        self.store.delete("BIOMD0000000001")
+        self.reopen(rebuild=True)
+        self.assertEqual(self.store.models(), {"BIOMD0000000002"})
+
+    def test_rebuild_skips_torn_record(self):
+        """ Records after a record cut short by a crash are still found """
+        self.store.put("BIOMD0000000001", self.xml(1))
+        path = self.store.segment_path(self.store.segment)
+        with open(path, "ab") as segment_file:
+            segment_file.write(ModelStore.HEADER.pack(ModelStore.MAGIC, 15, 400, 900) + b"BIOMD0000000002" + b"\x78\x9c")
+        self.store.put("BIOMD0000000003", self.xml(3))
+        self.reopen(rebuild=True)
+        self.assertEqual(self.store.models(), {"BIOMD0000000001", "BIOMD0000000003"})
+        self.assertEqual(self.store.get("BIOMD0000000003"), self.xml(3))
+
+    def test_compact(self):
+        for i in range(6):
+            self.store.put(f"BIOMD{i:010d}", self.xml(i))
+        self.store.put("BIOMD0000000001", self.xml(11))
+        self.store.delete("BIOMD0000000002")
+        self.store.compact()
+        self.reopen(rebuild=True)
+        self.assertEqual(len(self.store.models()), 5)
+        self.assertEqual(self.store.get("BIOMD0000000001"), self.xml(11))
+
+    def test_put_during_compact(self):
+        """ A model written while compaction runs is not lost with the old segments """
+        for i in range(6):
+            self.store.put(f"BIOMD{i:010d}", self.xml(i))
+
+        writer = threading.Thread(target=self.store.put, args=("BIOMD0000000010", self.xml(10)))
+        read = self.store.read
+
+        def read_and_put(entry):
+            if writer.ident is None:
+                writer.start()
+                writer.join(0.2)  # The put waits for the compaction to finish
+            return read(entry)
+
+        with patch.object(self.store, "read", side_effect=read_and_put):
+            self.store.compact()
+        writer.join()
+
+        self.reopen(rebuild=True)
+        self.assertEqual(len(self.store.models()), 7)
+        self.assertEqual(self.store.get("BIOMD0000000010"), self.xml(10))
+
+
+class TestSbmlDatabaseQueries(unittest.TestCase):
+    """ Queries sent by SbmlDatabaseQueries, checked on a mock connection """
+
+    def setUp(self):
+        self.connection = MagicMock()
+        self.connection.query.return_value = []
+        self.queries = SbmlDatabaseQueries(self.connection)
+
+    def test_tag_indexes_created_once(self):
+        labels = SbmlDatabase.schema_labels("Schemas/default_schema.json")
+        self.assertIn("Species", labels)
+        self.queries.ensure_tag_indexes(labels)
+        self.queries.ensure_tag_indexes(labels)
+        queries = [call.args[0] for call in self.connection.query.call_args_list]
+        self.assertEqual(len(queries), len(labels))
+        self.assertIn("CREATE INDEX tag_Species IF NOT EXISTS FOR (n:`Species`) ON (n.tag)", queries)
+
+    def test_models_page_parameters(self):
+        """ The last tag of a page is passed as a parameter, not pasted into the query """
+        self.queries.find_models_page(after='BIOMD0000000007" OR true //', page_size=2)
+        call = self.connection.query.call_args
+        self.assertIn("m.tag > $after", call.args[0])
+        self.assertNotIn("BIOMD0000000007", call.args[0])
+        self.assertEqual(call.kwargs["parameters"], {"after": 'BIOMD0000000007" OR true //'})
+
+    def test_invalid_page_size(self):
+        for page_size in (0, -1):
+            with self.assertRaises(ValueError):
+                list(self.queries.iter_all_models(page_size=page_size))
+        self.connection.query.assert_not_called()
+
+    def test_similar_ties_keep_candidate_order(self):
+        """ With concurrent reads, models with the same score are ranked in candidate order, not completion order """
+        models = ["BIOMD0000000001", "BIOMD0000000002", "BIOMD0000000003", "BIOMD0000000004"]
+        def compare_models(model_id, model):
+            time.sleep(0.05 * (len(models) - models.index(model)))  # The last candidate finishes first
+            return 0.5
+        self.queries.reader = ReadQueryExecutor(MagicMock(), threads=len(models))
+        self.addCleanup(self.queries.reader.shutdown)
+        with patch.object(self.queries, "similarity_candidates", return_value=models), \
+             patch.object(self.queries, "compare_models", side_effect=compare_models):
+            result = self.queries.find_all_similar("BIOMD0000000005", MODEL_LIMIT=3, engine="cypher")
+        self.assertEqual(result, [(model, 50.0) for model in models[:3]])
+
+
+class TestModelListModel(unittest.TestCase):
+    """ Rows of the GUI's model lists, without a view """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.workers = MagicMock()
+        self.list_model = ModelListModel(self.workers, page_size=2)
+
+    def rows(self):
+        return [tuple(row) for row in self.list_model.rows]
+
+    def test_update_ranking(self):
+        """ Rows stay sorted by score as a running top 3 changes """
+        top = TopK(3)
+        changes = []
+        for model, score in [("a", 10.0), ("b", 50.0), ("c", 30.0), ("d", 50.0), ("e", 5.0), ("f", 99.0)]:
+            kept, evicted = top.push(model, score)
+            if kept:
+                changes.append((model, score, evicted))
+        self.list_model.set_models([], scores=[])
+        self.list_model.update_ranking(changes)
+        self.assertEqual(self.rows(), top.best())
+        self.assertEqual(self.rows(), [("f", 99.0), ("b", 50.0), ("d", 50.0)])
+
+    def test_update_ranking_after_reset(self):
+        """ An evicted model that is no longer listed is ignored """
+        self.list_model.set_models(["x"], scores=[1.0])
+        self.list_model.update_ranking([("y", 2.0, "a")])
+        self.assertEqual(self.rows(), [("y", 2.0), ("x", 1.0)])
+
+    def test_pages(self):
+        fetch_page = MagicMock()
+        self.list_model.set_source(fetch_page)
+        self.assertEqual(self.workers.start.call_args.args, (fetch_page, None, 2))
+        self.list_model.add_page(["a", "b"])
+        self.assertTrue(self.list_model.canFetchMore())
+        self.list_model.fetchMore()
+        self.assertEqual(self.workers.start.call_args.args, (fetch_page, "b", 2))
+        self.list_model.add_page(["c"])
+        self.assertFalse(self.list_model.canFetchMore())
+        self.assertEqual([self.list_model.model_at(row) for row in range(self.list_model.rowCount())], ["a", "b", "c"])
+
+    def test_page_failed(self):
+        errors = []
+        self.list_model.error.connect(errors.append)
+        self.list_model.page_failed("connection refused")
+        self.assertEqual(errors, ["Failed to fetch models: connection refused"])
+        self.assertFalse(self.list_model.canFetchMore())
+
+
+class TestWorkerPool(unittest.TestCase):
+    """ Background tasks of the GUI, signals are delivered by processing events """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        self.pool = WorkerPool(threads=1)
+
+    def tearDown(self):
+        self.pool.cancel_all()
+        self.pool.wait()
+
+    def settle(self):
+        self.assertTrue(self.pool.wait(5000))
+        QCoreApplication.processEvents()
+
+    def test_result(self):
+        results, finished = [], []
+        self.pool.start(sum, [1, 2, 3], result=results.append, finished=lambda: finished.append(True))
+        self.settle()
+        self.assertEqual(results, [6])
+        self.assertEqual(finished, [True])
+        self.assertEqual(self.pool.workers, set())
+
+    def test_error_of_cancelled_task_is_not_reported(self):
+        errors = []
+        def fail():
+            raise RuntimeError("connection closed")
+        with self.assertLogs("biograph.workers", level="ERROR") as logs:
+            self.pool.start(fail, error=errors.append)
+            self.settle()
+            self.pool.start(fail, key="fail", error=errors.append)
+            self.pool.cancel("fail")
+            self.settle()
+        self.assertEqual(errors, ["connection closed"])
+        self.assertEqual(len(logs.records), 1)
+
+    def test_cancel_all_forgets_queued_tasks(self):
+        """ The single thread is busy, the queued tasks never run or emit finished """
+        release = threading.Event()
+        ran = []
+        running = self.pool.start(release.wait, 5)
+        queued = [self.pool.start(ran.append, i, key=i) for i in range(3)]
+        self.pool.cancel_all()
+        self.assertEqual(self.pool.workers, {running})
+        self.assertEqual(self.pool.keys, {})
+        release.set()
+        self.settle()
+        self.assertEqual(ran, [])
+        self.assertEqual(self.pool.workers, set())
+        self.assertTrue(all(worker.is_cancelled() for worker in queued))
+
+
+class TestQueryProfiler(unittest.TestCase):
+    """ Query statistics, without a database """
+
+    def setUp(self):
+        self.profiler = QueryProfiler(enabled=True, threshold=60, db_hits=True)
+
+    def test_template(self):
+        """ The same query for another model shares its template """
+        template, parameters = QueryProfiler.template('MATCH (n {tag: "BIOMD0000000001"}) // model\nRETURN n LIMIT 10')
+        self.assertEqual(template, "MATCH (n {tag: ?}) RETURN n LIMIT ?")
+        self.assertEqual(parameters, ['"BIOMD0000000001"', "10"])
+        self.assertEqual(QueryProfiler.template("MATCH (n {tag: 'BIOMD0000000002'}) RETURN n LIMIT 5")[0], template)
+
+    def test_report(self):
+        self.profiler.record("MATCH (n {tag: 'A'}) RETURN n", 1.0, 3)
+        self.profiler.record("MATCH (n {tag: 'B'}) RETURN n", 3.0, 1, db_hits=7)
+        self.profiler.record("MATCH (m:Model) RETURN m", 0.5, 10)
+        report = self.profiler.report()
+        self.assertEqual([entry["template"] for entry in report], ["MATCH (n {tag: ?}) RETURN n", "MATCH (m:Model) RETURN m"])
+        self.assertEqual((report[0]["count"], report[0]["total_time"], report[0]["mean_time"], report[0]["max_time"]), (2, 4.0, 2.0, 3.0))
+        self.assertEqual((report[0]["rows"], report[0]["db_hits"]), (4, 7))
+        self.profiler.reset()
+        self.assertEqual(self.profiler.report(), [])
+
+    def test_slow_query_log(self):
+        with tempfile.TemporaryDirectory() as folder:
+            profiler = QueryProfiler(enabled=True, threshold=0.5, log_file=os.path.join(folder, "slow.log"))
+            profiler.record("MATCH (n {tag: 'A'}) RETURN n", 0.1, 1)
+            profiler.record("MATCH (n {tag: 'B'}) RETURN n", 2.0, 1)
+            logger = profiler.slow_query_logger()
+            for handler in list(logger.handlers):
+                handler.close()
+                logger.removeHandler(handler)
+            with open(os.path.join(folder, "slow.log")) as f:
+                entries = [json.loads(line) for line in f]
+        self.assertEqual([entry["parameters"] for entry in entries], [["'B'"]])
+
+    def test_run_counts_db_hits(self):
+        """ Records are streamed, the query is recorded once all of them are read """
+        cursor = MagicMock()
+        cursor.__iter__.return_value = iter([1, 2])
+        cursor.summary.return_value = {"profile": {"dbHits": 4, "children": [{"dbHits": 3}, {"dbHits": 1, "children": []}]}}
+        graph = MagicMock()
+        graph.run.return_value = cursor
+        records = self.profiler.run(graph, "MATCH (n) RETURN n", {"tag": "A"})
+        self.assertEqual(self.profiler.report(), [])
+        self.assertEqual(list(records), [1, 2])
+        graph.run.assert_called_once_with("PROFILE MATCH (n) RETURN n", {"tag": "A"})
+        self.assertEqual((self.profiler.report()[0]["rows"], self.profiler.report()[0]["db_hits"]), (2, 8))
+
+    def test_wrap_connection(self):
+        connection = MagicMock()
+        connection.query.return_value = [{"n": 1}, {"n": 2}]
+        profiled = self.profiler.wrap_connection(connection)
+        self.assertEqual(profiled.query("MATCH (n {tag: $tag}) RETURN n", parameters={"tag": "A"}), [{"n": 1}, {"n": 2}])
+        connection.query.assert_called_once_with("MATCH (n {tag: $tag}) RETURN n", expect_data=True, parameters={"tag": "A"})
+        self.assertEqual(self.profiler.report()[0]["rows"], 2)
+
+    def test_disabled(self):
+        connection = MagicMock()
+        QueryProfiler(enabled=False).wrap_connection(connection).query("MATCH (n) RETURN n")
+        connection.query.assert_called_once()
+        self.assertEqual(self.profiler.report(), [])
+
+
+class TestConnectionPool(unittest.TestCase):
+    """ Shared connections, the server is mocked """
+
+    def setUp(self):
+        self.pool = Neo4jConnectionPool("localhost.ini")
+
+    def test_from_config(self):
+        """ One pool per configuration file """
+        with patch.dict(Neo4jConnectionPool.pools, clear=True):
+            pool = Neo4jConnectionPool.from_config("localhost.ini")
+            self.assertIs(Neo4jConnectionPool.from_config("localhost.ini"), pool)
+        self.assertEqual((pool.uri, pool.auth, pool.max_size), ("neo4j://localhost:7687", ("neo4j", "capstone"), 10))
+
+    @patch('ConnectionPool.connect')
+    def test_live_connection_reconnects(self, mock_connect):
+        """ An idle connection that fails the liveness check is replaced """
+        first, second = MagicMock(), MagicMock()
+        mock_connect.Connect.from_config.side_effect = [first, second]
+        self.assertIs(self.pool.live_connection(), first)
+        self.assertIs(self.pool.live_connection(), first)
+        first.query.side_effect = Exception("connection closed")
+        self.pool.last_used["connection"] -= self.pool.liveness_check + 1
+        self.assertIs(self.pool.live_connection(), second)
+        self.assertEqual(mock_connect.Connect.from_config.call_count, 2)
+
+    def test_parameters_are_run_on_the_driver(self):
+        """ neo4jsbml does not take parameters, parameterised queries go through the driver """
+        connection = PooledConnection(self.pool)
+        session = MagicMock()
+        session.run.return_value = [MagicMock(data=lambda: {"tag": "BIOMD0000000001"})]
+        with patch.object(self.pool, "live_connection") as live_connection, patch.object(self.pool, "driver") as driver:
+            driver.return_value.session.return_value.__enter__.return_value = session
+            records = connection.query("MATCH (m:Model {tag: $tag}) RETURN m.tag AS tag", parameters={"tag": "BIOMD0000000001"})
+            connection.query("MATCH (m:Model) RETURN m")
+        self.assertEqual(records, [{"tag": "BIOMD0000000001"}])
+        session.run.assert_called_once_with("MATCH (m:Model {tag: $tag}) RETURN m.tag AS tag", {"tag": "BIOMD0000000001"})
+        live_connection.return_value.query.assert_called_once_with("MATCH (m:Model) RETURN m", expect_data=True)
+
+
+class TestReadQueryExecutor(unittest.TestCase):
+    """ Concurrent reads, the driver is mocked """
+
+    def setUp(self):
+        self.pool = MagicMock(database="neo4j")
+        self.session = self.pool.driver.return_value.session.return_value.__enter__.return_value
+        self.executor = ReadQueryExecutor(self.pool, threads=4)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_query(self):
+        """ Reads run in READ access mode, with their parameters """
+        result = MagicMock()
+        result.__iter__.return_value = iter([MagicMock(data=lambda: {"tag": "A"}), MagicMock(data=lambda: {"tag": "B"})])
+        self.session.run.return_value = result
+        records = self.executor.query("MATCH (m:Model) WHERE m.tag > $after RETURN m.tag AS tag", parameters={"after": ""})
+        self.assertEqual(records, [{"tag": "A"}, {"tag": "B"}])
+        self.pool.driver.return_value.session.assert_called_once_with(database="neo4j", default_access_mode=neo4j.READ_ACCESS)
+        self.session.run.assert_called_once_with("MATCH (m:Model) WHERE m.tag > $after RETURN m.tag AS tag", {"after": ""})
+        self.assertIsNone(self.executor.query("MATCH (m:Model) RETURN m", expect_data=False))
+
+    def test_submit_and_map(self):
+        """ map keeps the input order, whichever read finishes first """
+        barrier = threading.Barrier(4, timeout=5)
+        def read(i):
+            barrier.wait()
+            return i * i
+        self.assertEqual(self.executor.map(read, range(4)), [0, 1, 4, 9])
+        self.assertEqual(self.executor.submit(sum, [1, 2, 3]).result(timeout=5), 6)
+
+
+class TestLayoutCache(unittest.TestCase):
+    """ Layouts stored in a temporary folder """
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder = folder.name
+        self.cache = LayoutCache(self.folder, max_entries=2)
+        self.graph = nx.DiGraph()
+        self.graph.add_edge(("Species", 1), ("Reaction", 2), type="reactant")
+        self.graph.add_edge(("Reaction", 2), ("Species", 3), type="product")
+        self.positions = {("Species", 1): (0.0, 1.0), ("Reaction", 2): (0.5, 0.5), ("Species", 3): (1.0, 0.0)}
+
+    def test_put_get(self):
+        """ Positions come back keyed by the nodes of the graph """
+        self.assertIsNone(self.cache.get("BIOMD0000000001", self.graph))
+        self.cache.put("BIOMD0000000001", self.graph, self.positions)
+        self.assertEqual(self.cache.get("BIOMD0000000001", self.graph), self.positions)
+        self.assertEqual(LayoutCache.structure_hash(self.graph.copy()), LayoutCache.structure_hash(self.graph))
+
+    def test_changed_model(self):
+        """ A changed model misses get(), seed() keeps the positions of the nodes it kept """
+        self.cache.put("BIOMD0000000001", self.graph, self.positions)
+        self.graph.add_edge(("Reaction", 2), ("Species", 4), type="product")
+        self.assertIsNone(self.cache.get("BIOMD0000000001", self.graph))
+        self.assertEqual(self.cache.seed("BIOMD0000000001", self.graph), self.positions)
+        self.assertIsNone(self.cache.seed("BIOMD0000000001", nx.DiGraph([(("Species", 5), ("Species", 6))])))
+
+    def test_evict(self):
+        """ The least recently used layout is removed first """
+        self.cache.put("a", self.graph, self.positions)
+        self.cache.put("b", self.graph, self.positions)
+        os.utime(self.cache.path("a"), (1000, 1000))
+        os.utime(self.cache.path("b"), (2000, 2000))
+        self.assertIsNotNone(self.cache.get("a", self.graph))
+        self.cache.put("c", self.graph, self.positions)
+        self.assertEqual(sorted(os.listdir(self.folder)), ["a.json", "c.json"])
+        self.assertTrue(self.cache.path("merged BIOMD1+BIOMD2").endswith("merged_BIOMD1_BIOMD2.json"))
+
+
+class TestGraphLayout(unittest.TestCase):
+    """ Layout and level of detail of large graphs """
+
+    def test_force_layout(self):
+        """ Every node is placed in [-1, 1], connected nodes end up closer than unconnected ones """
+        G = nx.disjoint_union(nx.complete_graph(30), nx.complete_graph(30))
+        G.add_edge(0, 30)
+        positions = force_layout(G, iterations=50)
+        self.assertEqual(set(positions), set(G.nodes()))
+        points = np.array([positions[node] for node in G.nodes()])
+        self.assertLessEqual(np.abs(points).max(), 1.0 + 1e-9)
+        within = np.mean([np.linalg.norm(positions[u] - positions[v]) for u, v in G.edges() if (u < 30) == (v < 30)])
+        between = np.mean([np.linalg.norm(positions[u] - positions[v]) for u in range(30) for v in range(30, 60)])
+        self.assertLess(within, between)
+        self.assertTrue(all(np.array_equal(positions[node], force_layout(G, iterations=50)[node]) for node in G.nodes()))
+
+    def test_force_layout_small_and_seeded(self):
+        self.assertEqual(force_layout(nx.Graph()), {})
+        self.assertEqual(list(force_layout(nx.Graph([("a", "a")]))), ["a"])
+        positions = force_layout(nx.path_graph(["a", "b", "c"]), pos={"a": (-50, 0), "b": (0, 0), "c": (50, 0)}, iterations=0)
+        self.assertLess(positions["a"][0], positions["b"][0])
+        self.assertLess(positions["b"][0], positions["c"][0])
+
+    def test_collapse_leaves(self):
+        """ Units and local parameters are counted on the node they hang from """
+        G = nx.DiGraph()
+        G.add_nodes_from([("s", {"label": "Species"}), ("r", {"label": "Reaction"}), ("ud", {"label": "UnitDefinition"}),
+                          ("u1", {"label": "Unit"}), ("u2", {"label": "Unit"}), ("p", {"label": "LocalParameter"})])
+        G.add_edges_from([("r", "s"), ("s", "ud"), ("ud", "u1"), ("ud", "u2"), ("r", "p")])
+        reduced = collapse_leaves(G)
+        self.assertEqual(set(reduced.nodes()), {"s", "r"})
+        self.assertEqual(dict(reduced.nodes(data="collapsed")), {"s": 3, "r": 1})
+        self.assertEqual(len(G), 6)
+
+
+class TestHtmlExport(unittest.TestCase):
+    """ Offline HTML view of a graph """
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder = folder.name
+        self.output = os.path.join(self.folder, "model.html")
+        self.graph = nx.DiGraph()
+        self.graph.add_node("s1", label="Species")
+        self.graph.add_node("r1", label="Reaction")
+        self.graph.add_edge("r1", "s1", type="product")
+        self.pos = {"s1": (-1.0, 0.5), "r1": (1.0, -1.0)}
+
+    def block(self, page, name):
+        return json.loads(re.search(f'<script id="{name}" type="application/json">(.*?)</script>', page, re.S).group(1))
+
+    def test_write_html(self):
+        """ Text from the model can not close the script elements, the page is written in one piece """
+        with open(self.output, "w") as html_file:
+            html_file.write("previous export")
+        properties = {"s1": {"name": "</script><script>alert(1)</script>"}}
+        self.assertEqual(write_html(self.graph, self.pos, self.output, title="<b>BIOMD1</b>", properties=properties), self.output)
+        self.assertEqual(os.listdir(self.folder), ["model.html"])
+        with open(self.output, encoding="utf-8") as html_file:
+            page = html_file.read()
+        self.assertNotIn("</script><script>alert", page)
+        self.assertEqual(page.count("</script>"), 3)
+        self.assertIn("<title>&lt;b&gt;BIOMD1&lt;/b&gt;</title>", page)
+        self.assertEqual(self.block(page, "properties"), [properties["s1"], {}])
+        # x and y share one scale, screen y grows downwards
+        graph = self.block(page, "graph")
+        self.assertEqual((graph["names"], graph["labels"], graph["label"]), (["s1", "r1"], ["Reaction", "Species"], [1, 0]))
+        self.assertEqual((graph["x"], graph["y"]), ([0, COORDINATE_RANGE], [COORDINATE_RANGE // 4, COORDINATE_RANGE]))
+        self.assertEqual((graph["source"], graph["target"], graph["types"]), ([1], [0], ["product"]))
+
+
+class TestTopK(unittest.TestCase):
+    """ Running top k of similarity scores """
+
+    def test_same_as_sorting(self):
+        """ Ties keep their arrival order, like a stable sort of the whole stream """
+        rng = random.Random(7)
+        stream = [(f"BIOMD{i:010}", float(rng.randint(0, 20))) for i in range(200)]
+        for k in (1, 5, 50, 200, 500):
+            top = TopK(k)
+            for model, score in stream:
+                top.push(model, score)
+            self.assertEqual(top.best(), sorted(stream, key=lambda x: x[1], reverse=True)[:k])
+            self.assertEqual(len(top), min(k, len(stream)))
+
+    def test_push(self):
+        top = TopK(2)
+        self.assertEqual(top.push("a", 1.0), (True, None))
+        self.assertEqual(top.push("b", 3.0), (True, None))
+        self.assertEqual(top.push("c", 1.0), (False, None))
+        self.assertEqual(top.push("d", 2.0), (True, "a"))
+        self.assertEqual(top.best(), [("b", 3.0), ("d", 2.0)])
+
+    def test_keep_all_or_none(self):
+        everything, nothing = TopK(), TopK(0)
+        for model, score in [("a", 1.0), ("b", 3.0), ("c", 2.0)]:
+            everything.push(model, score)
+            self.assertEqual(nothing.push(model, score), (False, None))
+        self.assertEqual(everything.best(), [("b", 3.0), ("c", 2.0), ("a", 1.0)])
+        self.assertEqual(nothing.best(), [])
+
+
+class TestBioGraphGUIStartup(unittest.TestCase):
+    """ The window opens before the database, background tasks go to a stubbed WorkerPool """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        with patch("bioGraphGUI.WorkerPool"):
+            self.window = BioGraphGUI()
+        self.addCleanup(self.window.close)
+        self.workers = self.window.workers
+
+    def started(self, key):
+        return [call for call in self.workers.start.call_args_list if call.kwargs.get("key") == key]
+
+    def test_requests_wait_for_database(self):
+        """ Requests made while connecting run once the database is open """
+        self.window.open_database()
+        self.window.changeSchema("default_schema")
+        self.assertEqual(len(self.window.pending_requests), 1)
+        self.assertEqual(self.started("schema"), [])
+        database = MagicMock()
+        self.window.database_opened((database, MagicMock()))
+        self.assertEqual(self.window.pending_requests, [])
+        self.assertIs(self.started("schema")[0].args[0], database.change_schema)
+        self.assertEqual(len(self.started("sync")), 1)
+
+    def test_database_failed(self):
+        """ Queued requests are dropped and reported, Reconnect opens the database again """
+        self.window.open_database()
+        self.window.changeSchema("default_schema")
+        self.window.database_failed("Connection refused")
+        self.assertEqual(self.window.pending_requests, [])
+        self.assertIn("changeSchema", self.window.statusBar().currentMessage())
+        self.assertIn("Connection refused", self.window.database_state.text())
+        self.assertFalse(self.window.reconnect_database.isHidden())
+        self.window.reconnect_database.click()
+        self.assertEqual(len(self.started("startup")), 2)
+        self.assertTrue(self.window.reconnect_database.isHidden())
+        self.assertEqual(self.window.database_state.text(), "Connecting to database...")
+
+
+class TestImportPipeline(unittest.TestCase):
+    """ Download, map and write stages, with a fake downloader and database """
+
+    def setUp(self):
+        self.downloader = MagicMock(download_results={})
+        self.downloader.batches.side_effect = lambda models: [models[i:i + 2] for i in range(0, len(models), 2)]
+        self.downloader.download_batch.side_effect = self.download_batch
+        self.downloader.download_and_extract.side_effect = self.download_and_extract
+        self.database = MagicMock()
+        self.database.model_file.side_effect = lambda model: nullcontext(model + ".xml")
+        self.database.map_model.side_effect = self.map_model
+        self.database.replace_models.side_effect = self.replace_models
+        self.written = []
+
+    def download_batch(self, batch):
+        if "BIOMD0000000006" in batch:
+            self.downloader.download_results["BIOMD0000000005"] = {"ok": True, "error": None}
+            raise ConnectionError("Connection reset")
+        for model in batch:
+            if model != "BIOMD0000000004":
+                self.downloader.download_results[model] = {"ok": True, "error": None}
+        return [model for model in batch if model == "BIOMD0000000004"]
+
+    def download_and_extract(self, model):
+        self.downloader.download_results[model] = {"ok": False, "error": "Status code: 404"}
+
+    def map_model(self, path_model, model):
+        if model == "BIOMD0000000002":
+            raise ValueError("Not an SBML file")
+        return "graph of " + model
+
+    def replace_models(self, batch):
+        if "BIOMD0000000003" in [tag for tag, _ in batch]:
+            raise RuntimeError("Write refused")
+        self.written += batch
+
+    def test_run(self):
+        """ Every model is imported or failed with its reason, a failing batch does not stop the others """
+        models = [f"BIOMD000000000{i}" for i in range(1, 7)]
+        progress = []
+        pipeline = ImportPipeline(self.downloader, self.database, download_workers=2, map_workers=2, queue_size=2,
+                                  write_batch=1, progress=lambda done, total: progress.append((done, total)))
+        with patch("builtins.print"):
+            imported = pipeline.run(models)
+        self.assertEqual(sorted(imported), ["BIOMD0000000001", "BIOMD0000000005"])
+        self.assertEqual(sorted(self.written), [("BIOMD0000000001", "graph of BIOMD0000000001"), ("BIOMD0000000005", "graph of BIOMD0000000005")])
+        report = pipeline.report()
+        self.assertEqual((report["total"], report["downloaded"], report["mapped"], report["imported"], report["failed"]), (6, 4, 3, 2, 4))
+        self.assertEqual(report["errors"], {"BIOMD0000000002": "Mapping failed: Not an SBML file",
+                                            "BIOMD0000000003": "Writing failed: Write refused",
+                                            "BIOMD0000000004": "Status code: 404",
+                                            "BIOMD0000000006": "Download failed: Connection reset"})
+        self.assertEqual(progress[-1], (2, 6))
+        self.downloader.record_downloads.assert_called_once_with(models)
+
+
+class TestReactionNetworkIndex(unittest.TestCase):
+    """ Reaction network index on a mock connection """
+
+    def setUp(self):
+        self.connection = MagicMock()
+        self.connection.query.return_value = [{"tag": "BIOMD0000000001", "reactant": "A", "reaction": "R1", "product": "B"},
+                                              {"tag": "BIOMD0000000001", "reactant": "B", "reaction": "R2", "product": "C"}]
+        self.index = ReactionNetworkIndex(self.connection)
+
+    def test_model_query_parameters(self):
+        """ The tag is passed as a parameter, not pasted into the query """
+        self.index.refresh('BIOMD0000000001" OR true //')
+        call = self.connection.query.call_args
+        self.assertIn("s.tag = $tag", call.args[0])
+        self.assertNotIn("BIOMD0000000001", call.args[0])
+        self.assertEqual(call.kwargs["parameters"], {"tag": 'BIOMD0000000001" OR true //'})
+
+    def test_ensure_all_after_changes(self):
+        """ Importing or deleting a model makes ensure_all() read the database again """
+        self.assertTrue(self.index.can_convert("BIOMD0000000001", "A", "C"))
+        self.index.ensure_all()
+        self.index.ensure_all()
+        self.assertEqual(self.connection.query.call_count, 2)
+        self.index.refresh("BIOMD0000000002")
+        self.index.ensure_all()
+        self.assertEqual(self.connection.query.call_count, 4)
+        self.index.drop("BIOMD0000000002")
+        self.index.ensure_all()
+        self.assertEqual(self.connection.query.call_count, 5)
+        self.assertEqual([step[1] for step in self.index.shortest_path("A", "C")], ["R1", "R2"])
+
+
+class TestDownloaderMirror(unittest.TestCase):
+    """ BiomodelsDownloader against the local BioModels mirror, serving the XML files of biomodels/ """
+
+    models = ["BIOMD0000000001", "BIOMD0000000002", "BIOMD0000000003"]
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder = folder.name
+
+    def mirror(self, **faults):
+        mirror = BiomodelsMirror(fixtures="biomodels", seed=1, **faults).start()
+        self.addCleanup(mirror.stop)
+        return mirror
+
+    def downloader(self, mirror, **kwargs):
+        with patch("config.DOWNLOAD_BACKOFF", 0):
+            return BiomodelsDownloader(base_url=mirror.base_url, meta_data_url=mirror.metadata_url, identifiers_url=mirror.identifiers_url,
+                                       output_dir=self.folder, use_store=False, **kwargs)
+
+    def test_retries_server_errors(self):
+        """ 503 answers are retried until the download succeeds """
+        mirror = self.mirror(error_rate=0.5)
+        downloader = self.downloader(mirror, retries=10)
+        for model in self.models:
+            self.assertTrue(downloader.download_and_extract(model), downloader.download_results[model])
+        self.assertGreater(mirror.statistics()["errors"], 0)
+        self.assertEqual(sorted(os.listdir(self.folder)), [model + ".xml" for model in self.models])
+
+    def test_waits_for_retry_after(self):
+        """ Throttled requests (429) are sent again after the Retry-After delay """
+        mirror = self.mirror(throttle=1)
+        downloader = self.downloader(mirror)
+        start = time.monotonic()
+        for model in self.models[:2]:
+            self.assertTrue(downloader.download_and_extract(model), downloader.download_results[model])
+        self.assertGreaterEqual(mirror.statistics()["throttled"], 1)
+        self.assertGreater(time.monotonic() - start, 0.5)
+
+    def test_gives_up_after_retries(self):
+        mirror = self.mirror(error_rate=1.0)
+        downloader = self.downloader(mirror, retries=2)
+        self.assertFalse(downloader.download_and_extract(self.models[0]))
+        self.assertEqual(downloader.download_results[self.models[0]]["status"], 503)
+        self.assertEqual(mirror.statistics()["errors"], 3)
+
+    def test_batch_falls_back_to_single_downloads(self):
+        """ Models missing from a batch are requested on their own """
+        mirror = self.mirror()
+        downloader = self.downloader(mirror, batch_size=2)
+        downloader.missing_damaged_models = self.models + ["BIOMD0000009999"]
+        results = downloader.run()
+        self.assertTrue(all(results[model]["ok"] for model in self.models))
+        self.assertEqual((results["BIOMD0000009999"]["ok"], results["BIOMD0000009999"]["status"]), (False, 404))
+        self.assertEqual(mirror.statistics()["download"], 3)
+
+    def test_failed_batch_is_downloaded_model_by_model(self):
+        """ With seed 1 and error_rate 0.5 only the first request fails: the batch, its models then download on their own """
+        mirror = self.mirror(error_rate=0.5)
+        downloader = self.downloader(mirror, batch_size=2, retries=0)
+        downloader.missing_damaged_models = self.models[:2]
+        results = downloader.run()
+        self.assertTrue(all(outcome["ok"] for outcome in results.values()))
+        self.assertEqual((mirror.statistics()["errors"], mirror.statistics()["download"]), (1, 2))
+
+    def test_mirror_endpoints(self):
+        """ Identifiers, metadata with ETag / 304 and downloads of unknown models """
+        mirror = self.mirror(replicate=2)
+        models = requests.get(mirror.identifiers_url).json()["models"]
+        fixtures = sorted(name[:-4] for name in os.listdir("biomodels") if name.endswith(".xml"))
+        self.assertEqual(models, fixtures + ["BIOMD9000000000", "BIOMD9000000001"])
+        response = requests.get(mirror.metadata_url.format(model=self.models[0]))
+        with open(os.path.join("biomodels", self.models[0] + ".xml"), "rb") as xml_file:
+            self.assertEqual(response.json()["main"][0]["checksum"], hashlib.sha256(xml_file.read()).hexdigest())
+        again = requests.get(mirror.metadata_url.format(model=self.models[0]), headers={"If-None-Match": response.headers["ETag"]})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(requests.get(mirror.base_url, params={"models": "BIOMD0000009999"}).status_code, 404)
+
+    def test_verify_models(self):
+        """ A full sync downloads the missing models once, the next sync finds them up to date """
+        mirror = self.mirror()
+        downloader = self.downloader(mirror, batch_size=2)
+        with patch("builtins.print"):
+            self.assertEqual(downloader.verifiy_models(MODEL_LIMIT=3), self.models)
+            self.assertEqual(self.downloader(mirror).verifiy_models(MODEL_LIMIT=3), [])
+        self.assertEqual(mirror.statistics()["download"], 2)
+
+
+class TestGraphRenderer(unittest.TestCase):
+    """ Rendering to files, from the records query_subgraph() would return """
+
+    RECORDS = [
+        ("1", "Model1", None, "Model", "HAS_COMPARTMENT", "2", "cell", None, "Compartment"),
+        ("3", "A", None, "Species", "IN_COMPARTMENT", "2", "cell", None, "Compartment"),
+        ("4", "R1", None, "Reaction", "HAS_PRODUCT", "3", "A", None, "Species"),
+    ]
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder = folder.name
+        # Workers run on a thread here, so the database and the layout cache folder can be patched
+        self.renderer = GraphRenderer()
+        self.renderer.executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(self.renderer.close)
+        for patcher in (patch.object(GraphVisualizer, "connect_to_neo4j"),
+                        patch.object(GraphVisualizer, "query_subgraph", return_value=self.RECORDS),
+                        patch("visualize.LayoutCache", lambda: LayoutCache(folder=os.path.join(self.folder, "layouts")))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_submit(self):
+        output = os.path.join(self.folder, "BIOMD0000000001.svg")
+        self.assertEqual(self.renderer.submit("BIOMD0000000001", output=output, format="svg").result(timeout=60), output)
+        with open(output) as svg_file:
+            self.assertIn("<svg", svg_file.read())
+
+    def test_render_thumbnails(self):
+        """ Thumbnails already rendered are kept """
+        folder = os.path.join(self.folder, "thumbnails")
+        progress = []
+        thumbnails = self.renderer.render_thumbnails(["BIOMD0000000001"], folder=folder, progress=lambda done, total: progress.append(done))
+        with open(thumbnails["BIOMD0000000001"], "rb") as png_file:
+            self.assertTrue(png_file.read().startswith(b"\x89PNG"))
+        with patch.object(self.renderer, "submit") as submit:
+            self.assertEqual(self.renderer.render_thumbnails(["BIOMD0000000001"], folder=folder), thumbnails)
+        submit.assert_not_called()
+        self.assertEqual(progress, [1])
+
+
+class TestBioGraphGUIActions(unittest.TestCase):
+    """ Buttons of search results and model lists, the viewers are stubbed """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QApplication.instance() or QApplication([])
+
+    def setUp(self):
+        with patch("bioGraphGUI.WorkerPool"):
+            self.window = BioGraphGUI()
+        self.addCleanup(self.window.close)
+        for name in ("veiwGraph", "export_graph_html", "view_diff"):
+            patcher = patch.object(self.window, name)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def test_model_list_actions(self):
+        """ "View graph in browser" opens the same viewer everywhere, HTML export is its own action """
+        self.window.model_ID = "BIOMD0000000001"
+        self.window.model_list_action("view", "BIOMD0000000002")
+        self.window.model_list_action("html", "BIOMD0000000003")
+        self.window.model_list_action("diff", "BIOMD0000000004")
+        self.veiwGraph.assert_called_once_with("BIOMD0000000002")
+        self.export_graph_html.assert_called_once_with("BIOMD0000000003")
+        self.view_diff.assert_called_once_with("BIOMD0000000001", "BIOMD0000000004")
+        self.assertEqual([action for action, _ in self.window.model_list.itemDelegate().actions], ["view", "html"])
+
+    def test_search_result_buttons(self):
+        self.window.model_ID = "BIOMD0000000001"
+        buttons = {button.text(): button for button in self.window.file_display.findChildren(QPushButton)}
+        buttons["View graph in browser"].click()
+        buttons["Export HTML"].click()
+        self.veiwGraph.assert_called_once_with("BIOMD0000000001")
+        self.export_graph_html.assert_called_once_with("BIOMD0000000001")
+
+
 if __name__ == '__main__':
     unittest.main(argv=[''], exit=False)
@@ -1,102 +1,169 @@
-from py2neo import Graph
 import networkx as nx
 import matplotlib.pyplot as plt
 import matplotlib.colors as mcolors
 import random
-import configparser
+import io
+from QueryProfiler import query_profiler
+from ConnectionPool import Neo4jConnectionPool
+from LayoutCache import LayoutCache
+from GraphLayout import force_layout, collapse_leaves
+from HtmlExport import write_html
+import config
 
 class GraphVisualizer:
 
     """Visulizes a Graph in a matplotlib pyplot from a neo4j database"""
 
-    def __init__(self):
+    def __init__(self, layout_cache=None):
         self.graph = None
+        self.labels = []
         self.G = nx.MultiDiGraph()
+        self.layout_cache = layout_cache if layout_cache is not None else LayoutCache()
 
     def connect_to_neo4j(self, config_file):
-        """Use configuration (.ini) file to extract connection arguments using configparser
-        and establish connection to database"""
+        """Use the shared connection pool of the configuration (.ini) file
+        -- the file is only parsed, and the connection only opened, the first time"""
 
-        config = configparser.ConfigParser()
-        config.read(config_file)
+        self.graph = Neo4jConnectionPool.from_config(config_file).graph()
+        self.labels = [record[0] for record in query_profiler.run(self.graph, "CALL db.labels()")]
 
-        protocol = config.get('connection', 'protocol')
-        url = config.get('connection', 'url')
-        port = config.get('connection', 'port')
-        username = config.get('database', 'user')
-        password = config.get('database', 'password')
-        uri = f"{protocol}://{url}:{port}"
+    def query_subgraph(self, model_id):
+        """
+        Query the relationships of a model
+            -- the source nodes are found through the tag index of each label
+            -- only the properties that are drawn are returned, not whole nodes
 
-        self.graph = Graph(uri, auth=(username, password))
+        returns: generator of records, streamed as they arrive
+            (source element id, source name, source metaid, source label, relationship type,
+             target element id, target name, target metaid, target label)
+        """
 
-    def query_subgraph(self, model_id):
-        """Query graph to return all relationships and nodes"""
+        # A label is needed to use the tag indexes created on import (SbmlDatabaseQueries.ensure_tag_indexes), every label is searched in one query
+        sources = " UNION ".join(f"MATCH (n:`{label}`) WHERE n.tag = $tag RETURN n" for label in self.labels) or "MATCH (n) WHERE n.tag = $tag RETURN n"
 
         query = f"""
+        CALL {{ {sources} }}
         MATCH (n)-[r]->(m)
-        WHERE n.tag = '{model_id}'
-        RETURN n, r, m
+        RETURN elementId(n), n.name, n.metaid, head(labels(n)), type(r),
+               elementId(m), m.name, m.metaid, head(labels(m))
+        """
+        return query_profiler.run(self.graph, query, {"tag": model_id})
+
+    def query_properties(self):
+        """Properties of every node of the current graph, by element id -> {node: {property: value}}"""
+
+        nodes = {data["element_id"]: node for node, data in self.G.nodes(data=True) if "element_id" in data}
+        query = """
+        MATCH (n) WHERE elementId(n) IN $ids
+        RETURN elementId(n), properties(n)
         """
-        return self.graph.run(query)
+        return {nodes[element_id]: node_properties for element_id, node_properties in query_profiler.run(self.graph, query, {"ids": list(nodes)})}
 
     @staticmethod
     def is_noisy(name):
         """Use other property of graph if name is unlegable"""
         return len(name) > 20 or not name.isalnum()
 
+    @classmethod
+    def display_name(cls, name, metaid):
+        """Name drawn for a node, None if it has neither a name nor a metaid"""
+        if name and not cls.is_noisy(name):
+            return name
+        return metaid or name
+
     def build_graph(self, result):
-        """Create a new graph for visualization using relationships and nodes from query"""
+        """Create a new graph for visualization from the records of query_subgraph(), one record at a time"""
         self.G.clear()
 
         # connect new nodes with edges 
-        for record in result:
-            try:
-                source = record['n']
-                target = record['m']
-                relationship = record['r']
+        for source_id, source_name, source_metaid, source_label, relationship_type, target_id, target_name, target_metaid, target_label in result:
+            source = self.display_name(source_name, source_metaid)
+            target = self.display_name(target_name, target_metaid)
+            if source is None or target is None: # Do not add Empty nodes
+                continue
+
+            self.G.add_edge(source, target, type=relationship_type)
 
-                source_name = source['name'] if not self.is_noisy(source['name']) else source["metaid"]
-                target_name = target['name'] if not self.is_noisy(target['name']) else target["metaid"]
+            # Labels decide what is folded away when a large graph is drawn
+            if "label" not in self.G.nodes[source]:
+                self.G.add_node(source, label=source_label, element_id=source_id)
+            if "label" not in self.G.nodes[target]:
+                self.G.add_node(target, label=target_label, element_id=target_id)
+
+    def compute_layout(self, graph=None):
+        """
+        Node positions of a graph (the current graph by default)
+            -- reused from the layout cache when the model has not changed since it was last drawn
+            -- after a change, the nodes the model kept start from their cached positions, so fewer iterations are needed
+            -- graphs above LARGE_GRAPH_THRESHOLD nodes use the vectorised GraphLayout.force_layout
+        """
 
-                self.G.add_edge(source_name, target_name, type=type(relationship).__name__)
-            
-            except ValueError as e: # Do not add Empty nodes
-                pass
+        graph = self.G if graph is None else graph
+        structure_hash = self.layout_cache.structure_hash(graph)
+        pos = self.layout_cache.get(self.model_id, graph, structure_hash)
+        if pos is not None:
+            return pos
+
+        seed = self.layout_cache.seed(self.model_id, graph)
+        if len(graph) > config.LARGE_GRAPH_THRESHOLD:
+            pos = force_layout(graph, pos=seed, iterations=config.LAYOUT_SEED_ITERATIONS if seed else config.LARGE_LAYOUT_ITERATIONS)
+        elif seed is None:
+            pos = nx.spring_layout(graph, k=0.5, seed=42)
+        else:
+            pos = nx.spring_layout(graph, k=0.5, pos=seed, iterations=config.LAYOUT_SEED_ITERATIONS, seed=42)
+
+        self.layout_cache.put(self.model_id, graph, pos, structure_hash)
+        return pos
+
+    def level_of_detail(self):
+        """
+        Graph to draw: large graphs have their unit and local parameter leaves folded into the nodes they belong to
+        """
+        if len(self.G) > config.LARGE_GRAPH_THRESHOLD:
+            return collapse_leaves(self.G)
+        return self.G
 
     def draw_and_style_graph(self):
-        """Draw graphs and add styling to graph and make more neat"""
+        """Draw graphs and add styling to graph and make more neat
+        -- large graphs are drawn with level of detail: folded leaves, smaller nodes, no arrows and no labels above the thresholds"""
+
+        graph = self.level_of_detail()
+        large = len(graph) > config.LARGE_GRAPH_THRESHOLD
 
         plt.figure(figsize=(15, 8))
-        pos = nx.spring_layout(self.G, k=0.5, seed=42)
-        node_sizes = [self.G.degree(node) * 300 for node in self.G.nodes()]
+        pos = self.compute_layout(graph)
+        scale = 20 if large else 300
+        node_sizes = [(graph.degree(node) + graph.nodes[node].get("collapsed", 0)) * scale for node in graph.nodes()]
         node_colors = list(mcolors.TABLEAU_COLORS.values())
-        node_color_map = {node: random.choice(node_colors) for node in self.G.nodes()}
+        node_color_map = {node: random.choice(node_colors) for node in graph.nodes()}
         edge_colors = mcolors.to_rgba("gray", alpha=0.5)
-        edge_labels = nx.get_edge_attributes(self.G, 'type')
         
         # Draw nodes
-        nx.draw_networkx_nodes(self.G, pos,
+        nx.draw_networkx_nodes(graph, pos,
                                node_size=node_sizes,
-                               node_color=[node_color_map[node] for node in self.G.nodes()],
+                               node_color=[node_color_map[node] for node in graph.nodes()],
                                edgecolors="black",
-                               linewidths=2,
+                               linewidths=0.5 if large else 2,
                                alpha=0.85)
 
         # Draw relationships 
-        nx.draw_networkx_edges(self.G, pos,
-                               width=1,
+        nx.draw_networkx_edges(graph, pos,
+                               width=0.3 if large else 1,
                                alpha=0.6,
                                edge_color=edge_colors,
-                               arrows=True,
-                               arrowsize=20)
+                               arrows=not large,
+                               **({} if large else {"arrowsize": 20}))
 
-        # Draw Labels of nodes and relationships
-        nx.draw_networkx_labels(self.G, pos,
-                                font_size=8,
-                                font_color="black",
-                                font_weight="bold")
+        # Draw Labels of nodes and relationships, only while they are still readable
+        if len(graph) <= config.LOD_LABEL_THRESHOLD:
+            nx.draw_networkx_labels(graph, pos,
+                                    font_size=8,
+                                    font_color="black",
+                                    font_weight="bold")
 
-        nx.draw_networkx_edge_labels(self.G, pos, edge_labels=edge_labels, font_size=6)
+        if graph.number_of_edges() <= config.LOD_EDGE_LABEL_THRESHOLD:
+            edge_labels = nx.get_edge_attributes(graph, 'type')
+            nx.draw_networkx_edge_labels(graph, pos, edge_labels=edge_labels, font_size=6)
 
         # Create plot and set plot parameters
         plt.gca().set_facecolor((0.95, 0.95, 1))
@@ -123,6 +190,185 @@ class GraphVisualizer:
         self.draw_and_style_graph()
         plt.show()
 
+    def render(self, model_id, output=None, format="png", dpi=100, config_file="localhost.ini"):
+        """
+        Draw a graph to an image without showing it, so it can run in a background process or on a server
+
+        parameters:
+            output: path of the image file, None to return the image as bytes
+            format: "png" or "svg"
+
+        returns: output path, or the image bytes
+        """
+
+        self.model_id = model_id
+        self.connect_to_neo4j(config_file)
+        result = self.query_subgraph(model_id)
+        self.build_graph(result)
+        self.draw_and_style_graph()
+        return self.save_figure(output, format, dpi)
+
+    @staticmethod
+    def save_figure(output, format, dpi):
+        """Save and close the current figure -> output path, or the image bytes if output is None"""
+
+        figure = plt.gcf()
+        try:
+            if output is None:
+                buffer = io.BytesIO()
+                figure.savefig(buffer, format=format, dpi=dpi)
+                return buffer.getvalue()
+
+            figure.savefig(output, format=format, dpi=dpi)
+            return output
+        finally:
+            plt.close(figure)
+
+    def query_diff(self, model_id1, model_id2):
+        """
+        Query the relationships of two models in one query, through the tag indexes
+
+        returns: generator of records
+            (tag, source label, source id, source name, source metaid, relationship type,
+             target label, target id, target name, target metaid)
+        """
+
+        sources = " UNION ".join(f"MATCH (n:`{label}`) WHERE n.tag IN $tags RETURN n" for label in self.labels) or "MATCH (n) WHERE n.tag IN $tags RETURN n"
+
+        query = f"""
+        CALL {{ {sources} }}
+        MATCH (n)-[r]->(m)
+        RETURN n.tag, head(labels(n)), n.id, n.name, n.metaid, type(r),
+               head(labels(m)), m.id, m.name, m.metaid
+        """
+        return query_profiler.run(self.graph, query, {"tags": [model_id1, model_id2]})
+
+    def build_diff(self, result, model_id1, model_id2):
+        """
+        Combine two models into one graph, matching nodes by (label, id) and relationships by (source, type, target)
+            -- every node and relationship gets a "status": "shared", "removed" (only in model 1) or "added" (only in model 2)
+
+        returns: dict -> machine readable diff
+            {"models": [model 1, model 2],
+             "nodes": {"shared": [[label, id], ...], "removed": [...], "added": [...]},
+             "relationships": {"shared": [[source label, source id, type, target label, target id], ...], "removed": [...], "added": [...]},
+             "summary": {"nodes_shared": int, ..., "relationships_added": int}}
+        """
+
+        self.G.clear()
+        nodes = {model_id1: set(), model_id2: set()}
+        relationships = {model_id1: set(), model_id2: set()}
+        names = {}
+
+        for tag, source_label, source_id, source_name, source_metaid, relationship_type, target_label, target_id, target_name, target_metaid in result:
+            # Nodes without an id are matched on their metaid or name
+            source = (source_label, source_id or source_metaid or source_name)
+            target = (target_label, target_id or target_metaid or target_name)
+            if source[1] is None or target[1] is None: # Do not add Empty nodes
+                continue
+
+            names.setdefault(source, self.display_name(source_name, source_metaid) or source[1])
+            names.setdefault(target, self.display_name(target_name, target_metaid) or target[1])
+            nodes[tag].update((source, target))
+            relationships[tag].add((source, relationship_type, target))
+
+        def split(first, second):
+            return {"shared": first & second, "removed": first - second, "added": second - first}
+
+        node_status = split(nodes[model_id1], nodes[model_id2])
+        relationship_status = split(relationships[model_id1], relationships[model_id2])
+
+        for status, keys in node_status.items():
+            for key in keys:
+                self.G.add_node(key, label=key[0], name=names[key], status=status)
+        for status, keys in relationship_status.items():
+            for source, relationship_type, target in keys:
+                self.G.add_edge(source, target, type=relationship_type, status=status)
+
+        return {
+            "models": [model_id1, model_id2],
+            "nodes": {status: sorted([label, node_id] for label, node_id in keys) for status, keys in node_status.items()},
+            "relationships": {status: sorted([source[0], source[1], relationship_type, target[0], target[1]] for source, relationship_type, target in keys)
+                              for status, keys in relationship_status.items()},
+            "summary": {**{f"nodes_{status}": len(keys) for status, keys in node_status.items()},
+                        **{f"relationships_{status}": len(keys) for status, keys in relationship_status.items()}},
+        }
+
+    def draw_diff(self):
+        """Draw the combined graph of build_diff(), coloured by status, both models share one layout"""
+
+        colors = {"shared": "tab:gray", "removed": "tab:red", "added": "tab:green"}
+        large = len(self.G) > config.LARGE_GRAPH_THRESHOLD
+
+        plt.figure(figsize=(15, 8))
+        pos = self.compute_layout()
+
+        for status, color in colors.items():
+            nodes = [node for node, node_status in self.G.nodes(data="status") if node_status == status]
+            edges = [(u, v) for u, v, edge_status in self.G.edges(data="status") if edge_status == status]
+            nx.draw_networkx_nodes(self.G, pos, nodelist=nodes, node_size=30 if large else 300, node_color=color,
+                                   edgecolors="black", linewidths=0.5 if large else 1, alpha=0.85, label=f"{status} ({len(nodes)})")
+            nx.draw_networkx_edges(self.G, pos, edgelist=edges, width=0.3 if large else 1, alpha=0.6, edge_color=color,
+                                   arrows=not large, **({} if large else {"arrowsize": 15}))
+
+        if len(self.G) <= config.LOD_LABEL_THRESHOLD:
+            nx.draw_networkx_labels(self.G, pos, labels=dict(self.G.nodes(data="name")), font_size=8, font_weight="bold")
+
+        plt.legend(loc="upper right")
+        plt.gca().set_facecolor((0.95, 0.95, 1))
+        plt.title(f"{self.model_id}", size=24, fontweight="bold")
+        plt.axis("off")
+        plt.tight_layout()
+
+    def diff(self, model_id1, model_id2, output=None, format="png", dpi=100, config_file="localhost.ini"):
+        """
+        Compare two models: the machine readable diff, and optionally an image of both models in one graph
+        (grey: in both, red: only in model 1, green: only in model 2)
+
+        parameters:
+            output: path of the image file, None to only compute the diff
+
+        returns: dict -> refer to build_diff()
+        """
+
+        self.model_id = f"{model_id1} vs {model_id2}"
+        self.connect_to_neo4j(config_file)
+        diff = self.build_diff(self.query_diff(model_id1, model_id2), model_id1, model_id2)
+
+        if output is not None:
+            self.draw_diff()
+            self.save_figure(output, format, dpi)
+
+        return diff
+
+    def render_diff(self, model_id1, model_id2, format="png", dpi=100, config_file="localhost.ini"):
+        """Like diff(), returns (diff, image bytes), used by GraphRenderer"""
+
+        diff = self.diff(model_id1, model_id2, config_file=config_file)
+        self.draw_diff()
+
+        return diff, self.save_figure(None, format, dpi)
+
+    def export_html(self, model_id, output=None, config_file="localhost.ini"):
+        """
+        Write a model (or merged model) as a single interactive HTML file, refer to HtmlExport.py
+            -- opens offline in any browser, with pan, zoom and node details on click
+            -- the layout is computed here and embedded, the browser does not lay out or query anything
+
+        parameters:
+            output: path of the HTML file, {model_id}.html by default
+
+        returns: output path
+        """
+
+        self.model_id = model_id
+        self.connect_to_neo4j(config_file)
+        result = self.query_subgraph(model_id)
+        self.build_graph(result)
+
+        pos = self.compute_layout()
+        return write_html(self.G, pos, output or f"{model_id}.html", title=f"Model: {model_id}", properties=self.query_properties())
+
 
 if __name__ == "__main__":
     # Example Usage with default config